@@ -5,7 +5,7 @@ from __future__ import annotations
 from collections.abc import Sequence
 from dataclasses import dataclass
 
-from lilbot.controller import LilbotController
+from lilbot.controller import ContextProvider, LilbotController
 from lilbot.memory.session import LilbotSession
 from lilbot.model.base import BaseModel
 from lilbot.tools.registry import ToolRegistry
@@ -34,15 +34,33 @@ class LilbotAgent:
         *,
         max_steps: int = 4,
         logger: StepLogger | None = None,
+        max_new_tokens: int | None = None,
+        max_run_seconds: float = 0.0,
+        max_run_tokens: int = 0,
+        context_provider: ContextProvider | None = None,
     ) -> None:
         self.controller = LilbotController(
             model=model,
             tool_registry=tool_registry,
             max_steps=max_steps,
             logger=logger,
+            max_new_tokens=max_new_tokens,
+            max_run_seconds=max_run_seconds,
+            max_run_tokens=max_run_tokens,
+            context_provider=context_provider,
         )
 
-    def answer(self, request: str, *, allowed_tools: Sequence[str] | None = None) -> AgentResult:
-        session = LilbotSession(user_query=request)
-        answer = self.controller.run(session, allowed_tools=allowed_tools)
+    def answer(
+        self,
+        request: str,
+        *,
+        allowed_tools: Sequence[str] | None = None,
+        retrieval_query: str | None = None,
+    ) -> AgentResult:
+        session = LilbotSession(user_query=request, retrieval_query=retrieval_query)
+        try:
+            answer = self.controller.run(session, allowed_tools=allowed_tools)
+        except BaseException:
+            session.close()
+            raise
         return AgentResult(answer=answer, session=session)
@@ -4,20 +4,32 @@ from __future__ import annotations
 
 import argparse
 from collections.abc import Sequence
+from dataclasses import replace
 from importlib import metadata
+import json
+import sqlite3
 import sys
+import time
 
-from lilbot.agent import LilbotAgent
+from lilbot.agent import AgentResult, LilbotAgent
 from lilbot.config import LilbotConfig
 from lilbot.model import build_model
+from lilbot.memory.chat import ChatMemory, build_model_summarizer
+from lilbot.memory.session import LilbotSession
+from lilbot.memory.store import SessionStore
 from lilbot.onboarding import (
     render_doctor_report,
     render_self_test_report,
     run_init_wizard,
     run_self_test,
 )
+from lilbot.retrieval.context import RetrievalContextProvider
+from lilbot.retrieval.repository import RepositoryIndex
+from lilbot.scheduler import SessionScheduler
 from lilbot.tools import build_default_tool_registry
+from lilbot.tools.repo import DEFAULT_CALL_DEPTH, RepoMapTool
 from lilbot.utils.logging import StepLogger
+from lilbot.utils.trace import append_trace_record, build_trace_record
 
 
 VALID_BACKENDS = ("hf",)
@@ -30,8 +42,6 @@ CHAT_MODEL_WORDS = {"/model"}
 CHAT_TOOLS_WORDS = {"/tools"}
 CHAT_EXIT_SLASH_WORDS = {"/exit", "/quit"}
 CHAT_CLEAR_SLASH_WORDS = {"/clear"}
-MAX_CHAT_HISTORY_TURNS = 3
-MAX_CHAT_CONTEXT_CHARS = 280
 
 
 def build_parser() -> argparse.ArgumentParser:
@@ -44,9 +54,12 @@ def build_parser() -> argparse.ArgumentParser:
             "  lilbot doctor\n"
             "  lilbot self-test\n"
             "  lilbot\n"
+            "  lilbot --resume 3f2a9c\n"
             "  lilbot \"why is my system slow?\"\n"
             "  lilbot repo summarize .\n"
-            "  lilbot logs analyze /var/log/syslog"
+            "  lilbot index update\n"
+            "  lilbot logs analyze /var/log/syslog\n"
+            "  lilbot batch requests.txt"
         ),
         formatter_class=argparse.RawDescriptionHelpFormatter,
     )
@@ -58,7 +71,7 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         "command",
         nargs="?",
-        help="A free-form query or a Lilbot subcommand such as init, doctor, self-test, repo, logs, or explain-command. Omit it to start interactive chat mode.",
+        help="A free-form query or a Lilbot subcommand such as init, doctor, self-test, repo, logs, batch, sessions, index, or explain-command. Omit it to start interactive chat mode.",
     )
     parser.add_argument(
         "--model",
@@ -103,6 +116,24 @@ def build_parser() -> argparse.ArgumentParser:
         default=None,
         help="Maximum controller iterations before Lilbot stops.",
     )
+    parser.add_argument(
+        "--max-run-seconds",
+        type=float,
+        default=None,
+        help="Wall-clock budget per request in seconds. Lilbot forces a final answer before it runs out. 0 disables it.",
+    )
+    parser.add_argument(
+        "--max-run-tokens",
+        type=int,
+        default=None,
+        help="Total prompt plus generated token budget per request. 0 disables it.",
+    )
+    parser.add_argument(
+        "--retrieval-tokens",
+        type=int,
+        default=None,
+        help="Attach up to this many tokens of retrieved repository context to the first prompt. 0 disables it.",
+    )
     parser.add_argument(
         "--workspace-root",
         default=None,
@@ -119,6 +150,18 @@ def build_parser() -> argparse.ArgumentParser:
         action="store_true",
         help="Enable step-by-step controller logging on stderr.",
     )
+    parser.add_argument(
+        "--trace",
+        metavar="PATH",
+        default=None,
+        help="Append a JSON Lines record with per-step prompts, token counts, and timings for each run.",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="SESSION_ID",
+        default=None,
+        help="Continue a saved interactive chat. Run `lilbot sessions` to list them.",
+    )
     return parser
 
 
@@ -135,20 +178,26 @@ def main(argv: Sequence[str] | None = None) -> None:
         temperature=args.temperature,
         quantize_4bit=args.quantize_4bit,
         max_steps=args.max_steps,
+        max_run_seconds=args.max_run_seconds,
+        max_run_tokens=args.max_run_tokens,
+        retrieval_context_tokens=args.retrieval_tokens,
         workspace_root=args.workspace_root,
         shell_timeout_seconds=args.shell_timeout,
         verbose=args.verbose,
+        trace_path=args.trace,
     )
 
     _emit_config_diagnostics(config)
     mode, payload = _resolve_mode(parser, args.command, extras)
+    if args.resume and mode != "interactive":
+        parser.error("--resume only applies to interactive chat mode")
 
     try:
         if mode == "query":
             print(_run_query(" ".join(payload), config))
             return
         if mode == "interactive":
-            _run_chat_loop(config)
+            _run_chat_loop(config, resume=args.resume)
             return
         if mode == "repo":
             print(_run_repo_command(payload, config))
@@ -159,6 +208,15 @@ def main(argv: Sequence[str] | None = None) -> None:
         if mode == "explain-command":
             print(_run_explain_command(payload, config))
             return
+        if mode == "batch":
+            print(_run_batch_command(payload, config))
+            return
+        if mode == "sessions":
+            print(_run_sessions_command(payload, config))
+            return
+        if mode == "index":
+            print(_run_index_command(payload, config))
+            return
         if mode == "doctor":
             print(_run_doctor_command(payload, config))
             return
@@ -183,9 +241,9 @@ def _resolve_mode(
     command: str | None,
     extras: list[str],
 ) -> tuple[str, list[str]]:
-    if command in {"repo", "logs", "explain-command", "doctor", "init", "self-test"}:
+    if command in {"repo", "logs", "explain-command", "batch", "sessions", "index", "doctor", "init", "self-test"}:
         if not extras:
-            if command in {"doctor", "init", "self-test"}:
+            if command in {"sessions", "doctor", "init", "self-test"}:
                 return command, []
             parser.error(f"{command} requires additional arguments")
         return command, extras
@@ -204,77 +262,165 @@ def _run_query(query: str, config: LilbotConfig) -> str:
         build_default_tool_registry(config),
         max_steps=config.max_steps,
         logger=StepLogger(enabled=config.verbose),
+        max_new_tokens=config.max_new_tokens,
+        max_run_seconds=config.max_run_seconds,
+        max_run_tokens=config.max_run_tokens,
+        context_provider=_build_context_provider(config),
     )
-    return agent.answer(query).answer
+    result = agent.answer(query)
+    with result.session:
+        _write_trace(config, result, mode="query", model=model)
+    return result.answer
+
 
+def _build_context_provider(config: LilbotConfig) -> RetrievalContextProvider | None:
+    if config.retrieval_context_tokens <= 0:
+        return None
+    return RetrievalContextProvider(config)
+
+
+def _run_chat_loop(config: LilbotConfig, *, resume: str | None = None) -> None:
+    store = _open_session_store(config, required=resume is not None)
+    chat_id: str | None = None
+    if resume is not None and store is not None:
+        chat = store.find_chat(resume)
+        if chat is None:
+            store.close()
+            raise RuntimeError(f"No saved chat session matches {resume!r}. Run `lilbot sessions` to list them.")
+        chat_id = chat.chat_id
 
-def _run_chat_loop(config: LilbotConfig) -> None:
     model = build_model(config)
     registry = build_default_tool_registry(config)
     _emit_model_diagnostics(model)
+    memory = ChatMemory(token_budget=config.chat_memory_tokens, summarizer=build_model_summarizer(model))
+    if chat_id is not None and store is not None:
+        memory = _restore_chat_memory(store, chat_id, memory)
     agent = LilbotAgent(
         model,
         registry,
         max_steps=config.max_steps,
         logger=StepLogger(enabled=config.verbose),
+        max_new_tokens=config.max_new_tokens,
+        max_run_seconds=config.max_run_seconds,
+        max_run_tokens=config.max_run_tokens,
+        context_provider=_build_context_provider(config),
     )
-    conversation: list[tuple[str, str]] = []
 
     _print_chat_banner(config, model, registry)
+    if chat_id is not None:
+        print(f"Resumed session {chat_id} after {memory.turn_count} turn(s).")
 
-    while True:
-        try:
-            raw_input_text = input("lilbot> ")
-        except EOFError:
-            print()
-            print("Leaving Lilbot.")
-            return
-        except KeyboardInterrupt:
-            print()
-            print("Leaving Lilbot.")
-            return
+    try:
+        while True:
+            try:
+                raw_input_text = input("lilbot> ")
+            except EOFError:
+                print()
+                print(_chat_exit_text(chat_id))
+                return
+            except KeyboardInterrupt:
+                print()
+                print(_chat_exit_text(chat_id))
+                return
+
+            user_message = raw_input_text.strip()
+            if not user_message:
+                continue
+
+            normalized = user_message.lower()
+            if normalized in CHAT_EXIT_WORDS or normalized in CHAT_EXIT_SLASH_WORDS:
+                print(_chat_exit_text(chat_id))
+                return
+            if normalized in CHAT_CLEAR_WORDS or normalized in CHAT_CLEAR_SLASH_WORDS:
+                memory.clear()
+                chat_id = None
+                print("Conversation cleared.")
+                continue
+            if normalized in CHAT_HELP_WORDS:
+                print(_chat_help_text())
+                continue
+            if normalized in CHAT_STATUS_WORDS:
+                print(_chat_status_text(config, model, registry, memory.turn_count))
+                if chat_id is not None:
+                    print(f"Session: {chat_id}")
+                continue
+            if normalized in CHAT_MODEL_WORDS:
+                print(_chat_model_text(config, model))
+                continue
+            if normalized in CHAT_TOOLS_WORDS:
+                print(_chat_tools_text(registry))
+                continue
+
+            request = memory.build_request(user_message)
+            try:
+                result = agent.answer(request, retrieval_query=user_message)
+            except RuntimeError as exc:
+                print(f"Error: {exc}", file=sys.stderr)
+                continue
+            with result.session:
+                _write_trace(config, result, mode="interactive", model=model)
+                print(result.answer)
+
+                memory.record_turn(user_message, result.session, answer=result.answer)
+                chat_id = _save_chat_turn(store, chat_id, config, user_message, result, memory)
+    finally:
+        if store is not None:
+            store.close()
+
+
+def _open_session_store(config: LilbotConfig, *, required: bool) -> SessionStore | None:
+    try:
+        return SessionStore(config.session_store_path)
+    except RuntimeError as exc:
+        if required:
+            raise
+        print(f"Warning: chat sessions will not be saved. {exc}", file=sys.stderr)
+        return None
 
-        user_message = raw_input_text.strip()
-        if not user_message:
-            continue
 
-        normalized = user_message.lower()
-        if normalized in CHAT_EXIT_WORDS or normalized in CHAT_EXIT_SLASH_WORDS:
-            print("Leaving Lilbot.")
-            return
-        if normalized in CHAT_CLEAR_WORDS or normalized in CHAT_CLEAR_SLASH_WORDS:
-            conversation.clear()
-            print("Conversation cleared.")
-            continue
-        if normalized in CHAT_HELP_WORDS:
-            print(_chat_help_text())
-            continue
-        if normalized in CHAT_STATUS_WORDS:
-            print(_chat_status_text(config, model, registry, conversation))
-            continue
-        if normalized in CHAT_MODEL_WORDS:
-            print(_chat_model_text(config, model))
-            continue
-        if normalized in CHAT_TOOLS_WORDS:
-            print(_chat_tools_text(registry))
-            continue
-
-        request = _build_chat_request(user_message, conversation)
-        try:
-            answer = agent.answer(request).answer
-        except RuntimeError as exc:
-            print(f"Error: {exc}", file=sys.stderr)
-            continue
-
-        print(answer)
-        conversation.append((user_message, answer))
-        if len(conversation) > MAX_CHAT_HISTORY_TURNS:
-            conversation[:] = conversation[-MAX_CHAT_HISTORY_TURNS:]
+def _save_chat_turn(
+    store: SessionStore | None,
+    chat_id: str | None,
+    config: LilbotConfig,
+    user_message: str,
+    result: AgentResult,
+    memory: ChatMemory,
+) -> str | None:
+    if store is None:
+        return chat_id
+    try:
+        if chat_id is None:
+            chat_id = store.create_chat(workspace_root=config.workspace_root)
+        store.append_turn(
+            chat_id,
+            user_message=user_message,
+            session=result.session,
+            memory=memory.to_dict(),
+        )
+    except (RuntimeError, sqlite3.Error) as exc:
+        print(f"Warning: could not save this turn: {exc}", file=sys.stderr)
+    return chat_id
+
+
+def _restore_chat_memory(store: SessionStore, chat_id: str, memory: ChatMemory) -> ChatMemory:
+    snapshot = store.load_memory(chat_id)
+    if snapshot is None:
+        return memory
+    return ChatMemory.from_dict(snapshot, token_budget=memory.token_budget, summarizer=memory.summarizer)
+
+
+def _chat_exit_text(chat_id: str | None) -> str:
+    if chat_id is None:
+        return "Leaving Lilbot."
+    return f"Leaving Lilbot. Resume with: lilbot --resume {chat_id}"
 
 
 def _run_repo_command(parts: list[str], config: LilbotConfig) -> str:
     parser = argparse.ArgumentParser(prog="lilbot repo")
-    parser.add_argument("action", choices=("summarize", "trace-function"))
+    parser.add_argument(
+        "action",
+        choices=("summarize", "map", "grep", "trace-function", "callers", "callees", "search"),
+    )
     parsed, remainder = parser.parse_known_args(parts)
     registry = build_default_tool_registry(config)
 
@@ -284,6 +430,53 @@ def _run_repo_command(parts: list[str], config: LilbotConfig) -> str:
         summarize_args = summarize_parser.parse_args(remainder)
         return registry.execute("summarize_repo", {"path": summarize_args.path})
 
+    if parsed.action == "map":
+        map_parser = argparse.ArgumentParser(prog="lilbot repo map")
+        map_parser.add_argument("path", nargs="?", default=".")
+        map_parser.add_argument("--tokens", type=int, default=config.repo_map_tokens)
+        map_args = map_parser.parse_args(remainder)
+        tool = RepoMapTool(replace(config, repo_map_tokens=max(1, map_args.tokens)))
+        return tool.execute(path=map_args.path)
+
+    if parsed.action == "grep":
+        grep_parser = argparse.ArgumentParser(prog="lilbot repo grep")
+        grep_parser.add_argument("pattern")
+        grep_parser.add_argument("path", nargs="?", default=".")
+        grep_parser.add_argument("--glob", default="")
+        grep_parser.add_argument("--limit", type=int, default=config.repo_reference_limit)
+        grep_args = grep_parser.parse_args(remainder)
+        return registry.execute(
+            "grep_workspace",
+            {"pattern": grep_args.pattern, "path": grep_args.path, "glob": grep_args.glob, "limit": grep_args.limit},
+        )
+
+    if parsed.action == "search":
+        search_parser = argparse.ArgumentParser(prog="lilbot repo search")
+        search_parser.add_argument("query")
+        search_parser.add_argument("path", nargs="?", default=".")
+        search_parser.add_argument("--limit", type=int, default=5)
+        search_args = search_parser.parse_args(remainder)
+        return registry.execute(
+            "search_repo",
+            {"query": search_args.query, "path": search_args.path, "limit": search_args.limit},
+        )
+
+    if parsed.action in {"callers", "callees"}:
+        calls_parser = argparse.ArgumentParser(prog=f"lilbot repo {parsed.action}")
+        calls_parser.add_argument("name")
+        calls_parser.add_argument("path", nargs="?", default=".")
+        calls_parser.add_argument("--depth", type=int, default=DEFAULT_CALL_DEPTH)
+        calls_args = calls_parser.parse_args(remainder)
+        return registry.execute(
+            "trace_calls",
+            {
+                "name": calls_args.name,
+                "direction": parsed.action,
+                "depth": calls_args.depth,
+                "path": calls_args.path,
+            },
+        )
+
     trace_parser = argparse.ArgumentParser(prog="lilbot repo trace-function")
     trace_parser.add_argument("name")
     trace_parser.add_argument("path", nargs="?", default=".")
@@ -321,8 +514,203 @@ def _run_explain_command(parts: list[str], config: LilbotConfig) -> str:
         build_default_tool_registry(config),
         max_steps=max(1, min(config.max_steps, 2)),
         logger=StepLogger(enabled=config.verbose),
+        max_new_tokens=config.max_new_tokens,
+        max_run_seconds=config.max_run_seconds,
+        max_run_tokens=config.max_run_tokens,
     )
-    return agent.answer(prompt, allowed_tools=[]).answer
+    result = agent.answer(prompt, allowed_tools=[])
+    with result.session:
+        _write_trace(config, result, mode="explain-command", model=model)
+    return result.answer
+
+
+def _run_batch_command(parts: list[str], config: LilbotConfig) -> str:
+    parser = argparse.ArgumentParser(prog="lilbot batch")
+    parser.add_argument("path", help="File with one request per line, or - for stdin.")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=config.max_batch_size,
+        help="Maximum number of sequences decoded together.",
+    )
+    parsed = parser.parse_args(parts)
+    requests = _read_batch_requests(parsed.path)
+    if not requests:
+        parser.error("batch requires at least one non-empty request line")
+
+    model = build_model(config)
+    _emit_model_diagnostics(model)
+    sessions = [LilbotSession(user_query=request) for request in requests]
+    with SessionScheduler(
+        model,
+        build_default_tool_registry(config),
+        max_steps=config.max_steps,
+        max_batch_size=parsed.batch_size,
+        max_new_tokens=config.max_new_tokens,
+        max_run_seconds=config.max_run_seconds,
+        max_run_tokens=config.max_run_tokens,
+        context_provider=_build_context_provider(config),
+    ) as scheduler:
+        futures = [scheduler.submit(session) for session in sessions]
+        answers: list[str] = []
+        for future in futures:
+            try:
+                answers.append(future.result())
+            except Exception as exc:
+                # One failed request must not abort the rest of the batch.
+                answers.append(f"Error: {exc}")
+
+    for session in sessions:
+        with session:
+            if config.trace_path is not None:
+                append_trace_record(
+                    config.trace_path,
+                    build_trace_record(session, mode="batch", model=model),
+                )
+    print(scheduler.metrics.render(), file=sys.stderr)
+
+    blocks = [
+        f"[{index}] {request}\n{answer}"
+        for index, (request, answer) in enumerate(zip(requests, answers), start=1)
+    ]
+    return "\n\n".join(blocks)
+
+
+def _read_batch_requests(path: str) -> list[str]:
+    try:
+        if path == "-":
+            lines = sys.stdin.read().splitlines()
+        else:
+            with open(path, "r", encoding="utf-8") as handle:
+                lines = handle.read().splitlines()
+    except OSError as exc:
+        raise RuntimeError(f"Could not read batch requests from {path}: {exc}") from exc
+    return [line.strip() for line in lines if line.strip() and not line.lstrip().startswith("#")]
+
+
+def _run_sessions_command(parts: list[str], config: LilbotConfig) -> str:
+    parser = argparse.ArgumentParser(prog="lilbot sessions", add_help=False)
+    parser.add_argument("action", nargs="?", choices=("list", "show"), default="list")
+    parser.add_argument("session_id", nargs="?")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--turn", type=int)
+    parser.add_argument("--step", type=int)
+    args = parser.parse_args(parts)
+
+    if args.action == "show":
+        if not args.session_id:
+            parser.error("sessions show requires a session id")
+        if args.step is not None and args.turn is None:
+            parser.error("--step requires --turn")
+        with SessionStore(config.session_store_path) as store:
+            return _show_saved_session(store, args.session_id, limit=args.limit, turn=args.turn, step=args.step)
+
+    with SessionStore(config.session_store_path) as store:
+        chats = store.list_chats(limit=args.limit)
+    if not chats:
+        return "No saved chat sessions."
+    lines = ["Saved chat sessions (most recent first):"]
+    for chat in chats:
+        updated = time.strftime("%Y-%m-%d %H:%M", time.localtime(chat.updated_at))
+        title = chat.title or "(no turns yet)"
+        lines.append(f"- {chat.chat_id}  {updated}  {chat.turn_count} turn(s)  {title}")
+    lines.append("Resume one with: lilbot --resume <id>")
+    lines.append("Inspect one with: lilbot sessions show <id>")
+    return "\n".join(lines)
+
+
+def _show_saved_session(
+    store: SessionStore,
+    session_id: str,
+    *,
+    limit: int,
+    turn: int | None,
+    step: int | None,
+) -> str:
+    """Render saved turns and their steps; observations are only read for ``--step``."""
+
+    chat = store.find_chat(session_id)
+    if chat is None:
+        raise RuntimeError(f"No saved chat session matches {session_id!r}. Run `lilbot sessions` to list them.")
+    if turn is not None and not 1 <= turn <= chat.turn_count:
+        raise RuntimeError(f"Session {chat.chat_id} has {chat.turn_count} turn(s); there is no turn {turn}.")
+
+    if step is not None:
+        saved = store.load_session(chat.chat_id, turn - 1)
+        for saved_step in saved.steps:
+            if saved_step.number == step:
+                observation = saved_step.observation
+                if observation is None:
+                    return f"Step {step} of turn {turn} has no saved observation."
+                return observation
+        raise RuntimeError(f"Turn {turn} of session {chat.chat_id} has no step {step}.")
+
+    turns = store.recent_turns(chat.chat_id, limit=chat.turn_count if turn is not None else limit)
+    if turn is not None:
+        turns = [saved_turn for saved_turn in turns if saved_turn.index == turn - 1]
+    lines = [f"Session {chat.chat_id} in {chat.workspace_root} ({chat.turn_count} turn(s)):"]
+    for saved_turn in turns:
+        lines.append(f"- turn {saved_turn.index + 1}: {saved_turn.user_message}")
+        saved = store.load_session(chat.chat_id, saved_turn.index)
+        for saved_step in saved.steps:
+            if saved_step.action_name is None:
+                action = "error" if saved_step.error else "final"
+            else:
+                action = f"{saved_step.action_name} {json.dumps(saved_step.action_args, sort_keys=True)}"
+            detail = f"  step {saved_step.number}: {action}"
+            if saved_step.observation_length:
+                detail += f" -> {saved_step.observation_length} chars"
+            lines.append(detail)
+        lines.append(f"  answer: {saved_turn.answer or '(none)'}")
+    lines.append("Print a saved observation with: lilbot sessions show <id> --turn <n> --step <n>")
+    return "\n".join(lines)
+
+
+def _run_index_command(parts: list[str], config: LilbotConfig) -> str:
+    parser = argparse.ArgumentParser(prog="lilbot index")
+    parser.add_argument("action", choices=("status", "update", "rebuild"))
+    args = parser.parse_args(parts)
+
+    index = RepositoryIndex(config)
+    try:
+        if args.action == "status":
+            status = index.status()
+            if status.vector_chunks is not None:
+                vectors = str(status.vector_chunks)
+            else:
+                vectors = f"disabled ({index.embedding_error or 'no embedding model configured'})"
+            changes = status.changes
+            return "\n".join(
+                [
+                    f"Index for {config.display_path(config.workspace_root)} ({status.source} fingerprints):",
+                    f"- location: {status.directory}",
+                    f"- files: {status.files}",
+                    f"- chunks: {status.chunks}",
+                    f"- vector_chunks: {vectors}",
+                    f"- pending: {len(changes.added)} added, {len(changes.updated)} updated, "
+                    f"{len(changes.removed)} removed",
+                    f"- scanned in {status.seconds:.2f}s",
+                ]
+            )
+
+        result = index.rebuild() if args.action == "rebuild" else index.refresh()
+    finally:
+        index.close()
+
+    verb = "rebuilt" if args.action == "rebuild" else "updated"
+    changes = result.changes
+    lines = [
+        f"Index {verb} in {result.seconds:.2f}s ({result.source} fingerprints):",
+        f"- added: {len(changes.added)}",
+        f"- updated: {len(changes.updated)}",
+        f"- removed: {len(changes.removed)}",
+        f"- unchanged: {changes.unchanged}",
+        f"- files: {result.files}",
+        f"- chunks: {result.chunks}",
+    ]
+    if index.embedding_error:
+        lines.append(f"- note: lexical index only ({index.embedding_error})")
+    return "\n".join(lines)
 
 
 def _run_doctor_command(parts: list[str], config: LilbotConfig) -> str:
@@ -344,6 +732,15 @@ def _run_self_test_command(parts: list[str], config: LilbotConfig) -> tuple[str,
     return render_self_test_report(result), result.exit_code
 
 
+def _write_trace(config: LilbotConfig, result: AgentResult, *, mode: str, model: object) -> None:
+    if config.trace_path is None:
+        return
+    append_trace_record(
+        config.trace_path,
+        build_trace_record(result.session, mode=mode, model=model),
+    )
+
+
 def _emit_config_diagnostics(config: LilbotConfig) -> None:
     if config.user_config_error:
         print(
@@ -362,7 +759,7 @@ def _emit_model_diagnostics(model: object) -> None:
 
 def _print_chat_banner(config: LilbotConfig, model: object, registry: object) -> None:
     print("Lilbot interactive mode")
-    print(_chat_status_text(config, model, registry, []))
+    print(_chat_status_text(config, model, registry, 0))
     print("Commands: /help /status /model /tools /clear /exit")
     print("Type a request and press Enter.")
 
@@ -375,7 +772,7 @@ def _chat_help_text() -> str:
             "- /status: show the active model, device, and workspace",
             "- /model: show model runtime details",
             "- /tools: list available tools",
-            "- /clear: reset chat context",
+            "- /clear: reset chat context and start a new saved session",
             "- /exit: leave Lilbot",
         ]
     )
@@ -385,7 +782,7 @@ def _chat_status_text(
     config: LilbotConfig,
     model: object,
     registry: object,
-    conversation: Sequence[tuple[str, str]],
+    turn_count: int,
 ) -> str:
     return "\n".join(
         [
@@ -394,7 +791,7 @@ def _chat_status_text(
             f"Workspace: {config.workspace_root}",
             f"Config: {config.user_config_path}",
             f"Tools: {len(getattr(registry, 'names', lambda: [])())}",
-            f"Conversation turns: {len(conversation)}",
+            f"Conversation turns: {turn_count}",
         ]
     )
 
@@ -439,29 +836,3 @@ def _package_version() -> str:
         return metadata.version("lilbot")
     except metadata.PackageNotFoundError:
         return "0+unknown"
-
-
-def _build_chat_request(
-    user_message: str,
-    conversation: Sequence[tuple[str, str]],
-) -> str:
-    if not conversation:
-        return user_message
-
-    lines = [
-        "Interactive session context:",
-        "Previous turns are provided for continuity. Focus on the latest user message.",
-    ]
-    for index, (prior_user, prior_answer) in enumerate(conversation[-MAX_CHAT_HISTORY_TURNS:], start=1):
-        lines.append(f"Turn {index} user: {_truncate_chat_context(prior_user)}")
-        lines.append(f"Turn {index} lilbot: {_truncate_chat_context(prior_answer)}")
-    lines.append("Latest user message:")
-    lines.append(user_message)
-    return "\n".join(lines)
-
-
-def _truncate_chat_context(text: str) -> str:
-    rendered = " ".join(str(text).split())
-    if len(rendered) <= MAX_CHAT_CONTEXT_CHARS:
-        return rendered
-    return rendered[:MAX_CHAT_CONTEXT_CHARS].rstrip() + " ..."
@@ -2,7 +2,8 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import hashlib
 import json
 import os
 from pathlib import Path
@@ -27,6 +28,10 @@ MODEL_WEIGHT_INDEXES = ("model.safetensors.index.json", "pytorch_model.bin.index
 TOKENIZER_FILES = ("tokenizer.json", "tokenizer.model", "tokenizer_config.json")
 DEFAULT_USER_CONFIG_FILENAME = "config.json"
 USER_CONFIG_ENV_VAR = "LILBOT_CONFIG_PATH"
+CACHE_DIR_ENV_VAR = "LILBOT_CACHE_DIR"
+SESSION_STORE_FILENAME = "sessions.sqlite3"
+EMBEDDING_CACHE_FILENAME = "embeddings.sqlite3"
+INDEX_DIRNAME = "index"
 
 
 def _coerce_positive_int(value: int | str | None, default: int) -> int:
@@ -37,6 +42,14 @@ def _coerce_positive_int(value: int | str | None, default: int) -> int:
     return parsed if parsed > 0 else default
 
 
+def _coerce_non_negative_int(value: int | str | None, default: int) -> int:
+    try:
+        parsed = int(value) if value is not None else default
+    except (TypeError, ValueError):
+        return default
+    return parsed if parsed >= 0 else default
+
+
 def _coerce_non_negative_float(value: float | str | None, default: float) -> float:
     try:
         parsed = float(value) if value is not None else default
@@ -113,6 +126,18 @@ def default_user_config_path() -> Path:
     return base_root / "lilbot" / DEFAULT_USER_CONFIG_FILENAME
 
 
+def default_user_cache_dir() -> Path:
+    """Return the per-user Lilbot cache directory for sessions and indexes."""
+
+    override = os.getenv(CACHE_DIR_ENV_VAR)
+    if override:
+        return Path(override).expanduser()
+
+    xdg_root = os.getenv("XDG_CACHE_HOME")
+    base_root = Path(xdg_root).expanduser() if xdg_root else Path.home() / ".cache"
+    return base_root / "lilbot"
+
+
 def read_user_config_file(path: str | Path | None = None) -> UserConfigFile:
     """Read the persistent Lilbot config file if it exists."""
 
@@ -182,6 +207,15 @@ class LilbotConfig:
     temperature: float
     quantize_4bit: bool
     max_steps: int
+    max_run_seconds: float
+    max_run_tokens: int
+    max_batch_size: int
+    chat_memory_tokens: int
+    embedding_model: str | None
+    embedding_batch_size: int
+    retrieval_context_tokens: int
+    retrieval_top_k: int
+    retrieval_refresh_seconds: float
     workspace_root: Path
     verbose: bool
     shell_timeout_seconds: int
@@ -190,11 +224,14 @@ class LilbotConfig:
     directory_entry_limit: int
     repo_file_limit: int
     repo_reference_limit: int
+    repo_map_tokens: int
     log_tail_lines: int
     log_sample_chars: int
     user_config_path: Path
     user_config_loaded: bool = False
     user_config_error: str | None = None
+    trace_path: Path | None = None
+    cache_dir: Path = field(default_factory=default_user_cache_dir)
     allowed_log_roots: tuple[Path, ...] = DEFAULT_ALLOWED_LOG_ROOTS
     ignored_directories: frozenset[str] = DEFAULT_IGNORED_DIRECTORIES
 
@@ -209,9 +246,13 @@ class LilbotConfig:
         temperature: float | None = None,
         quantize_4bit: bool | None = None,
         max_steps: int | None = None,
+        max_run_seconds: float | None = None,
+        max_run_tokens: int | None = None,
+        retrieval_context_tokens: int | None = None,
         workspace_root: str | None = None,
         shell_timeout_seconds: int | None = None,
         verbose: bool = False,
+        trace_path: str | None = None,
     ) -> "LilbotConfig":
         user_config = read_user_config_file()
         stored_values = user_config.values
@@ -229,6 +270,7 @@ class LilbotConfig:
             or _coerce_text(stored_values.get("model"))
             or discover_default_model()
         )
+        trace_text = _coerce_text(trace_path) or _coerce_text(os.getenv("LILBOT_TRACE_PATH"))
         return cls(
             backend=(
                 _coerce_text(backend)
@@ -267,6 +309,54 @@ class LilbotConfig:
                 else os.getenv("LILBOT_MAX_STEPS", stored_values.get("max_steps")),
                 4,
             ),
+            max_run_seconds=_coerce_non_negative_float(
+                max_run_seconds
+                if max_run_seconds is not None
+                else os.getenv("LILBOT_MAX_RUN_SECONDS", stored_values.get("max_run_seconds")),
+                0.0,
+            ),
+            max_run_tokens=_coerce_non_negative_int(
+                max_run_tokens
+                if max_run_tokens is not None
+                else os.getenv("LILBOT_MAX_RUN_TOKENS", stored_values.get("max_run_tokens")),
+                0,
+            ),
+            max_batch_size=_coerce_positive_int(
+                os.getenv("LILBOT_MAX_BATCH_SIZE", stored_values.get("max_batch_size")),
+                8,
+            ),
+            chat_memory_tokens=_coerce_positive_int(
+                os.getenv("LILBOT_CHAT_MEMORY_TOKENS", stored_values.get("chat_memory_tokens")),
+                768,
+            ),
+            embedding_model=(
+                _coerce_text(os.getenv("LILBOT_EMBEDDING_MODEL"))
+                or _coerce_text(stored_values.get("embedding_model"))
+            ),
+            embedding_batch_size=_coerce_positive_int(
+                os.getenv("LILBOT_EMBEDDING_BATCH_SIZE", stored_values.get("embedding_batch_size")),
+                64,
+            ),
+            retrieval_context_tokens=_coerce_non_negative_int(
+                retrieval_context_tokens
+                if retrieval_context_tokens is not None
+                else os.getenv(
+                    "LILBOT_RETRIEVAL_CONTEXT_TOKENS",
+                    stored_values.get("retrieval_context_tokens"),
+                ),
+                0,
+            ),
+            retrieval_top_k=_coerce_positive_int(
+                os.getenv("LILBOT_RETRIEVAL_TOP_K", stored_values.get("retrieval_top_k")),
+                6,
+            ),
+            retrieval_refresh_seconds=_coerce_non_negative_float(
+                os.getenv(
+                    "LILBOT_RETRIEVAL_REFRESH_SECONDS",
+                    stored_values.get("retrieval_refresh_seconds"),
+                ),
+                30.0,
+            ),
             workspace_root=resolved_root,
             verbose=bool(verbose),
             shell_timeout_seconds=_coerce_positive_int(
@@ -295,6 +385,10 @@ class LilbotConfig:
                 os.getenv("LILBOT_REPO_REFERENCE_LIMIT", stored_values.get("repo_reference_limit")),
                 20,
             ),
+            repo_map_tokens=_coerce_positive_int(
+                os.getenv("LILBOT_REPO_MAP_TOKENS", stored_values.get("repo_map_tokens")),
+                1024,
+            ),
             log_tail_lines=_coerce_positive_int(
                 os.getenv("LILBOT_LOG_TAIL_LINES", stored_values.get("log_tail_lines")),
                 400,
@@ -306,8 +400,23 @@ class LilbotConfig:
             user_config_path=user_config.path,
             user_config_loaded=user_config.exists and user_config.error is None,
             user_config_error=user_config.error,
+            trace_path=Path(trace_text).expanduser() if trace_text else None,
+            cache_dir=default_user_cache_dir(),
         )
 
+    @property
+    def session_store_path(self) -> Path:
+        return self.cache_dir / SESSION_STORE_FILENAME
+
+    @property
+    def embedding_cache_path(self) -> Path:
+        return self.cache_dir / EMBEDDING_CACHE_FILENAME
+
+    @property
+    def index_dir(self) -> Path:
+        digest = hashlib.sha1(str(self.workspace_root).encode("utf-8")).hexdigest()[:12]
+        return self.cache_dir / INDEX_DIRNAME / f"{self.workspace_root.name or 'root'}-{digest}"
+
     def resolve_workspace_path(self, path: str | Path, *, must_exist: bool = False) -> Path:
         candidate = Path(path).expanduser()
         if not candidate.is_absolute():
@@ -351,9 +460,15 @@ class LilbotConfig:
             "temperature": self.temperature,
             "quantize_4bit": self.quantize_4bit,
             "max_steps": self.max_steps,
+            "max_run_seconds": self.max_run_seconds,
+            "max_run_tokens": self.max_run_tokens,
             "workspace_root": str(self.workspace_root),
             "shell_timeout_seconds": self.shell_timeout_seconds,
         }
         if self.model:
             values["model"] = self.model
+        if self.embedding_model:
+            values["embedding_model"] = self.embedding_model
+        if self.retrieval_context_tokens:
+            values["retrieval_context_tokens"] = self.retrieval_context_tokens
         return values
@@ -2,16 +2,23 @@
 
 from __future__ import annotations
 
-from collections.abc import Sequence
-from dataclasses import dataclass
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
 import json
 import re
+import time
 from typing import Any
 
 from lilbot.memory.session import LilbotSession, SessionStep
 from lilbot.model.base import BaseModel
-from lilbot.prompts import build_controller_prompt
+from lilbot.prompts import (
+    assemble_controller_prompt,
+    build_prompt_head,
+    compacted_token_savings,
+)
+from lilbot.tools.base import ToolResult
 from lilbot.tools.registry import ToolRegistry
+from lilbot.utils.formatting import estimate_tokens, summarize_observation
 from lilbot.utils.logging import StepLogger
 
 
@@ -32,6 +39,9 @@ LABELED_PROCESS_PATTERN = re.compile(
 PLAIN_PROCESS_PATTERN = re.compile(
     r"^(?P<pid>\d+)\s+(?P<command>\S+)\s+(?P<cpu>[\d.]+)\s+(?P<mem>[\d.]+)$"
 )
+MIN_STEP_NEW_TOKENS = 32
+
+ContextProvider = Callable[[str], str | None]
 
 
 @dataclass(frozen=True)
@@ -45,6 +55,42 @@ class ParsedReply:
     raw: str
 
 
+@dataclass
+class RunBudget:
+    """Wall-clock and token limits for a single controller run.
+
+    A limit of zero means unlimited.
+    """
+
+    max_seconds: float = 0.0
+    max_tokens: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    tokens_used: int = 0
+
+    def remaining_seconds(self) -> float | None:
+        if self.max_seconds <= 0:
+            return None
+        return self.max_seconds - (time.perf_counter() - self.started_at)
+
+    def remaining_tokens(self) -> int | None:
+        if self.max_tokens <= 0:
+            return None
+        return self.max_tokens - self.tokens_used
+
+
+@dataclass(frozen=True)
+class StepPlan:
+    """Budget decision made before a controller step."""
+
+    max_new_tokens: int | None
+    final_reason: str | None = None
+    stop_reason: str | None = None
+
+    @property
+    def final_only(self) -> bool:
+        return self.final_reason is not None
+
+
 class LilbotController:
     """Keep the LLM in a reasoning role while Python controls execution."""
 
@@ -55,35 +101,76 @@ class LilbotController:
         tool_registry: ToolRegistry,
         max_steps: int = 4,
         logger: StepLogger | None = None,
+        max_new_tokens: int | None = None,
+        max_run_seconds: float = 0.0,
+        max_run_tokens: int = 0,
+        context_provider: ContextProvider | None = None,
     ) -> None:
         self.model = model
         self.tool_registry = tool_registry
         self.max_steps = max(1, int(max_steps))
         self.logger = logger or StepLogger(enabled=False)
+        configured_new_tokens = max_new_tokens or getattr(model, "max_new_tokens", None)
+        self.max_new_tokens = int(configured_new_tokens) if configured_new_tokens else None
+        self.max_run_seconds = max(0.0, float(max_run_seconds))
+        self.max_run_tokens = max(0, int(max_run_tokens))
+        self.context_provider = context_provider
 
     def run(
         self,
         session: LilbotSession,
         *,
         allowed_tools: Sequence[str] | None = None,
+    ) -> str:
+        budget = RunBudget(max_seconds=self.max_run_seconds, max_tokens=self.max_run_tokens)
+        try:
+            return self._run(session, budget, allowed_tools=allowed_tools)
+        finally:
+            session.total_seconds = time.perf_counter() - budget.started_at
+
+    def _run(
+        self,
+        session: LilbotSession,
+        budget: RunBudget,
+        *,
+        allowed_tools: Sequence[str] | None,
     ) -> str:
         seen_tool_calls: set[tuple[str, str]] = set()
         allowed_tool_set = set(allowed_tools) if allowed_tools is not None else None
+        # Retrieve once, before the first step, so the context stays in every prompt head of the run.
+        if self.context_provider is not None and session.retrieved_context is None and allowed_tools != []:
+            session.retrieved_context = self._retrieve_context(session)
 
         for step_number in range(1, self.max_steps + 1):
-            prompt = build_controller_prompt(
-                user_query=session.user_query,
-                tool_registry=self.tool_registry,
-                session=session,
-                allowed_tools=allowed_tools,
+            final_only = step_number == self.max_steps
+            head = self._prompt_head(session, allowed_tools, final_only=final_only)
+            prompt = assemble_controller_prompt(head, session.steps, final_only=final_only)
+            plan = self._plan_step(
+                session,
+                budget,
+                prompt,
+                final_reason="the step limit was reached" if final_only else None,
+            )
+            if plan.stop_reason is not None:
+                return self._finish_without_model(session, plan.stop_reason)
+            if plan.final_only and not final_only:
+                head = self._prompt_head(session, allowed_tools, final_only=True)
+                prompt = assemble_controller_prompt(head, session.steps, final_only=True)
+
+            step = SessionStep(
+                number=step_number,
+                prompt_head=session.intern_prompt_head(head),
+                final_only=plan.final_only,
+                prompt_tokens_saved=compacted_token_savings(session),
             )
-            step = SessionStep(number=step_number, prompt=prompt)
             session.steps.append(step)
 
             self.logger.step(step_number)
-            raw = self.model.generate(prompt).strip()
+            raw = self._generate(prompt, step, max_new_tokens=plan.max_new_tokens)
+            budget.tokens_used += _step_token_usage(step, prompt, raw)
             step.raw_model_output = raw
             self.logger.raw(raw)
+            self.logger.timing(_format_generation_timing(step))
 
             parsed = parse_model_response(raw)
             step.thought = parsed.thought
@@ -95,6 +182,10 @@ class LilbotController:
                 self.logger.final(session.final_answer)
                 return session.final_answer
 
+            if plan.final_reason is not None:
+                step.error = "The model did not return FINAL during the synthesis step."
+                return self._finish_without_model(session, plan.final_reason)
+
             if not parsed.action_name:
                 session.final_answer = (
                     "The model returned malformed output. Expected either "
@@ -126,13 +217,16 @@ class LilbotController:
                     )
                 else:
                     seen_tool_calls.add(signature)
-                    try:
-                        observation = self.tool_registry.execute(parsed.action_name, parsed.action_args)
-                    except Exception as exc:
-                        observation = f"Tool error from {parsed.action_name}: {exc}"
+                    observation = self._execute_tool(parsed.action_name, parsed.action_args, step)
+                    step.compact_observation = self.tool_registry.compact(
+                        parsed.action_name,
+                        observation,
+                    )
 
-            step.observation = observation
+            session.store_observation(step, observation)
             self.logger.observation(observation)
+            if step.tool_seconds is not None:
+                self.logger.timing(_format_tool_timing(step))
 
             auto_answer = _maybe_finalize_from_observations(session)
             if auto_answer is not None:
@@ -140,19 +234,127 @@ class LilbotController:
                 self.logger.final(session.final_answer)
                 return session.final_answer
 
-        last_observation = session.steps[-1].observation if session.steps else None
-        if last_observation:
-            session.final_answer = (
-                "Lilbot hit the maximum step limit before producing a FINAL answer.\n"
-                f"Last observation:\n{last_observation}"
-            )
-        else:
-            session.final_answer = (
-                "Lilbot hit the maximum step limit before producing a FINAL answer."
+        return self._finish_without_model(session, "the step limit was reached")
+
+    def _prompt_head(
+        self,
+        session: LilbotSession,
+        allowed_tools: Sequence[str] | None,
+        *,
+        final_only: bool,
+    ) -> str:
+        return build_prompt_head(
+            user_query=session.user_query,
+            tool_registry=self.tool_registry,
+            allowed_tools=allowed_tools,
+            final_only=final_only,
+            has_history=bool(session.steps),
+            retrieved_context=session.retrieved_context,
+        )
+
+    def _plan_step(
+        self,
+        session: LilbotSession,
+        budget: RunBudget,
+        prompt: str,
+        *,
+        final_reason: str | None,
+    ) -> StepPlan:
+        """Size the next generation to the remaining budget.
+
+        Switches to a final synthesis step when another tool round trip would
+        not fit, and stops outright when not even a short answer would.
+        """
+
+        prompt_estimate = estimate_tokens(prompt)
+        allowance = self.max_new_tokens
+        remaining_seconds = budget.remaining_seconds()
+        remaining_tokens = budget.remaining_tokens()
+
+        if remaining_seconds is not None and remaining_seconds <= 0:
+            return StepPlan(None, stop_reason="the wall-clock budget was spent")
+
+        if remaining_tokens is not None:
+            token_room = remaining_tokens - prompt_estimate
+            if token_room < MIN_STEP_NEW_TOKENS:
+                return StepPlan(None, stop_reason="the token budget was spent")
+            allowance = token_room if allowance is None else min(allowance, token_room)
+
+        decode_rate = _decode_tokens_per_second(session)
+        if remaining_seconds is not None and decode_rate is not None:
+            prefill_estimate = _average(step.prefill_seconds for step in session.steps) or 0.0
+            time_room = int((remaining_seconds - prefill_estimate) * decode_rate)
+            if time_room < MIN_STEP_NEW_TOKENS:
+                return StepPlan(None, stop_reason="the wall-clock budget was spent")
+            allowance = time_room if allowance is None else min(allowance, time_room)
+
+        if final_reason is None:
+            step_tokens = prompt_estimate + (self.max_new_tokens or MIN_STEP_NEW_TOKENS)
+            if remaining_tokens is not None and remaining_tokens < 2 * step_tokens:
+                final_reason = "the token budget was nearly spent"
+            step_seconds = _average(
+                (step.generation_seconds or 0.0) + (step.tool_seconds or 0.0)
+                for step in session.steps
             )
-        self.logger.error(session.final_answer)
+            if (
+                remaining_seconds is not None
+                and step_seconds is not None
+                and remaining_seconds < 2 * step_seconds
+            ):
+                final_reason = "the wall-clock budget was nearly spent"
+
+        return StepPlan(allowance, final_reason=final_reason)
+
+    def _finish_without_model(self, session: LilbotSession, reason: str) -> str:
+        auto_answer = _maybe_finalize_from_observations(session)
+        session.final_answer = auto_answer or _summarize_existing_observations(session, reason)
+        self.logger.error(f"Stopped because {reason}.")
+        self.logger.final(session.final_answer)
         return session.final_answer
 
+    def _generate(
+        self,
+        prompt: str,
+        step: SessionStep,
+        *,
+        max_new_tokens: int | None = None,
+    ) -> str:
+        self.model.last_generation = None
+        started_at = time.perf_counter()
+        if max_new_tokens is not None and (
+            self.max_new_tokens is None or max_new_tokens < self.max_new_tokens
+        ):
+            raw = self.model.generate(prompt, max_new_tokens=max_new_tokens).strip()
+        else:
+            raw = self.model.generate(prompt).strip()
+        step.generation_seconds = time.perf_counter() - started_at
+
+        stats = self.model.last_generation
+        if stats is not None:
+            step.prompt_tokens = stats.prompt_tokens
+            step.generated_tokens = stats.generated_tokens
+            step.prefill_seconds = stats.prefill_seconds
+            step.decode_seconds = stats.decode_seconds
+        return raw
+
+    def _retrieve_context(self, session: LilbotSession) -> str | None:
+        # Retrieved context is optional; the run continues without it if the provider fails.
+        try:
+            return self.context_provider(session.retrieval_query or session.user_query)
+        except Exception as exc:
+            self.logger.error(f"Retrieved context unavailable: {exc}")
+            return None
+
+    def _execute_tool(self, name: str, arguments: dict[str, Any], step: SessionStep) -> str:
+        started_at = time.perf_counter()
+        try:
+            result = self.tool_registry.run(name, arguments)
+        except Exception as exc:
+            result = ToolResult(f"Tool error from {name}: {exc}")
+        step.tool_seconds = time.perf_counter() - started_at
+        step.tool_cache_hit = result.cache_hit
+        return result.text
+
 
 def parse_model_response(raw_response: str) -> ParsedReply:
     """Parse the text-only controller protocol used by Lilbot."""
@@ -223,6 +425,72 @@ def _parse_args_block(text: str) -> dict[str, Any] | None:
     return parsed
 
 
+def _step_token_usage(step: SessionStep, prompt: str, raw: str) -> int:
+    prompt_tokens = step.prompt_tokens if step.prompt_tokens is not None else estimate_tokens(prompt)
+    generated_tokens = (
+        step.generated_tokens if step.generated_tokens is not None else estimate_tokens(raw)
+    )
+    return prompt_tokens + generated_tokens
+
+
+def _decode_tokens_per_second(session: LilbotSession) -> float | None:
+    generated = 0
+    seconds = 0.0
+    for step in session.steps:
+        if step.generated_tokens and step.decode_seconds:
+            generated += step.generated_tokens
+            seconds += step.decode_seconds
+    if generated <= 0 or seconds <= 0.0:
+        return None
+    return generated / seconds
+
+
+def _average(values: object) -> float | None:
+    present = [float(value) for value in values if value is not None]
+    return sum(present) / len(present) if present else None
+
+
+def _summarize_existing_observations(session: LilbotSession, reason: str) -> str:
+    observed = [step for step in session.steps if step.action_name and step.observation_length]
+    lines = [f"Lilbot stopped before the model produced a FINAL answer because {reason}."]
+    if not observed:
+        lines.append("No tool observations were gathered.")
+        return "\n".join(lines)
+
+    lines.append("Observations gathered so far:")
+    for step in observed:
+        headline = summarize_observation(step.compact_observation or step.observation or "")
+        lines.append(f"- step {step.number} {step.action_name}: {headline}")
+    lines.append(f"Last observation:\n{observed[-1].observation}")
+    return "\n".join(lines)
+
+
+def _format_generation_timing(step: SessionStep) -> str:
+    parts = [f"generation={_format_seconds(step.generation_seconds)}"]
+    if step.prefill_seconds is not None:
+        parts.append(f"prefill={_format_seconds(step.prefill_seconds)}")
+    if step.decode_seconds is not None:
+        parts.append(f"decode={_format_seconds(step.decode_seconds)}")
+    if step.prompt_tokens is not None:
+        parts.append(f"prompt_tokens={step.prompt_tokens}")
+    if step.generated_tokens is not None:
+        parts.append(f"generated_tokens={step.generated_tokens}")
+    if step.prompt_tokens_saved:
+        parts.append(f"prompt_tokens_saved={step.prompt_tokens_saved}")
+    return " ".join(parts)
+
+
+def _format_tool_timing(step: SessionStep) -> str:
+    rendered = f"tool={_format_seconds(step.tool_seconds)}"
+    if step.tool_cache_hit:
+        rendered += " tool_cache_hit=yes"
+    return rendered
+
+
+def _format_seconds(value: float | None) -> str:
+    return "n/a" if value is None else f"{value:.3f}s"
+
+
 def _normalize_model_output(raw_response: str) -> str:
     text = str(raw_response or "").strip()
     if not text:
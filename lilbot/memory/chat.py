@@ -0,0 +1,223 @@
+"""Rolling chat memory for interactive Lilbot sessions.
+
+Each finished turn is folded in deterministically. The latest turns are kept
+nearly verbatim. Tool results become keyed facts, where a repeated call
+replaces the older entry. When the memory grows past its token budget, the
+oldest turns collapse into one-line summary entries, then old facts are
+dropped. The model is only asked to condense the summary section when that
+section alone outgrows its share of the budget.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass, field
+import json
+from typing import Any
+
+from lilbot.memory.session import LilbotSession
+from lilbot.utils.formatting import estimate_tokens
+
+
+DEFAULT_CHAT_MEMORY_TOKENS = 768
+RECENT_MESSAGE_CHARS = 400
+RECENT_ANSWER_CHARS = 1200
+SUMMARY_MESSAGE_CHARS = 120
+SUMMARY_ANSWER_CHARS = 200
+FACT_CHARS = 320
+MIN_RECENT_TURNS = 1
+SUMMARY_BUDGET_SHARE = 0.35
+
+Summarizer = Callable[[str], str]
+
+
+@dataclass
+class ChatTurnMemory:
+    """A recent turn kept close to verbatim."""
+
+    number: int
+    user_message: str
+    answer: str
+
+
+@dataclass
+class ChatMemory:
+    """Token-bounded running memory of an interactive chat."""
+
+    token_budget: int = DEFAULT_CHAT_MEMORY_TOKENS
+    summary: list[str] = field(default_factory=list)
+    facts: dict[str, str] = field(default_factory=dict)
+    recent: list[ChatTurnMemory] = field(default_factory=list)
+    turn_count: int = 0
+    summarizer: Summarizer | None = field(default=None, repr=False, compare=False)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.summary or self.facts or self.recent)
+
+    def clear(self) -> None:
+        self.summary.clear()
+        self.facts.clear()
+        self.recent.clear()
+        self.turn_count = 0
+
+    def record_turn(
+        self,
+        user_message: str,
+        session: LilbotSession | None = None,
+        *,
+        answer: str | None = None,
+    ) -> None:
+        """Fold one finished turn into memory and re-fit the token budget."""
+
+        self.turn_count += 1
+        final_answer = answer if answer is not None else (session.final_answer if session else "") or ""
+        self.recent.append(
+            ChatTurnMemory(
+                number=self.turn_count,
+                user_message=_clip(user_message, RECENT_MESSAGE_CHARS),
+                answer=_clip(final_answer, RECENT_ANSWER_CHARS),
+            )
+        )
+        if session is not None:
+            for step in session.steps:
+                if not step.action_name or step.error:
+                    continue
+                digest = step.compact_observation
+                if digest is None and step.observation_length <= FACT_CHARS * 4:
+                    digest = step.observation
+                if not digest:
+                    continue
+                key = _fact_key(step.action_name, step.action_args)
+                # Re-inserting moves the newest result for a repeated call to the end.
+                self.facts.pop(key, None)
+                self.facts[key] = _clip(digest, FACT_CHARS)
+        self._fit_budget()
+
+    def render(self) -> str:
+        """Return the memory block that precedes the latest user message."""
+
+        if self.is_empty:
+            return ""
+        lines = [
+            "Interactive session context:",
+            "Earlier turns are summarized for continuity. Focus on the latest user message.",
+        ]
+        if self.summary:
+            lines.append("Summary of earlier turns:")
+            lines.extend(f"- {entry}" for entry in self.summary)
+        if self.facts:
+            lines.append("Known results from earlier tool calls (reuse them instead of re-running the tool):")
+            lines.extend(f"- {key}: {value}" for key, value in self.facts.items())
+        if self.recent:
+            lines.append("Recent turns:")
+            for turn in self.recent:
+                lines.append(f"Turn {turn.number} user: {turn.user_message}")
+                lines.append(f"Turn {turn.number} lilbot: {turn.answer}")
+        return "\n".join(lines)
+
+    def build_request(self, user_message: str) -> str:
+        context = self.render()
+        if not context:
+            return user_message
+        return f"{context}\nLatest user message:\n{user_message}"
+
+    def estimated_tokens(self) -> int:
+        return estimate_tokens(self.render())
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "token_budget": self.token_budget,
+            "summary": list(self.summary),
+            "facts": [[key, value] for key, value in self.facts.items()],
+            "recent": [[turn.number, turn.user_message, turn.answer] for turn in self.recent],
+            "turn_count": self.turn_count,
+        }
+
+    @classmethod
+    def from_dict(
+        cls,
+        data: dict[str, Any],
+        *,
+        token_budget: int | None = None,
+        summarizer: Summarizer | None = None,
+    ) -> "ChatMemory":
+        memory = cls(
+            token_budget=int(token_budget or data.get("token_budget") or DEFAULT_CHAT_MEMORY_TOKENS),
+            summary=[str(entry) for entry in data.get("summary") or []],
+            facts={str(key): str(value) for key, value in data.get("facts") or []},
+            recent=[
+                ChatTurnMemory(number=int(number), user_message=str(message), answer=str(answer))
+                for number, message, answer in data.get("recent") or []
+            ],
+            turn_count=int(data.get("turn_count") or 0),
+            summarizer=summarizer,
+        )
+        memory._fit_budget()
+        return memory
+
+    def _fit_budget(self) -> None:
+        while self.estimated_tokens() > self.token_budget and len(self.recent) > MIN_RECENT_TURNS:
+            self.summary.append(_summarize_turn(self.recent.pop(0)))
+        self._compact_summary()
+        while self.estimated_tokens() > self.token_budget and self.facts:
+            del self.facts[next(iter(self.facts))]
+        while self.estimated_tokens() > self.token_budget and self.summary:
+            self.summary.pop(0)
+        if self.estimated_tokens() > self.token_budget and self.recent:
+            turn = self.recent[-1]
+            overflow_chars = (self.estimated_tokens() - self.token_budget) * 4
+            turn.answer = _clip(turn.answer, max(SUMMARY_ANSWER_CHARS, len(turn.answer) - overflow_chars))
+
+    def _compact_summary(self) -> None:
+        summary_budget = int(self.token_budget * SUMMARY_BUDGET_SHARE)
+        if self.summarizer is None or len(self.summary) < 2:
+            return
+        if estimate_tokens("\n".join(self.summary)) <= summary_budget:
+            return
+        try:
+            condensed = self.summarizer("\n".join(f"- {entry}" for entry in self.summary))
+        except Exception:
+            return
+        entries = [line.strip().lstrip("-*").strip() for line in condensed.splitlines()]
+        entries = [entry for entry in entries if entry]
+        if entries and estimate_tokens("\n".join(entries)) < estimate_tokens("\n".join(self.summary)):
+            self.summary = entries
+
+
+def build_model_summarizer(model: Any) -> Summarizer:
+    """Return a summarizer that asks the local model to condense summary notes."""
+
+    def summarize(notes: str) -> str:
+        prompt = (
+            "Condense these notes from earlier turns of a terminal assistant chat into at most 5 short "
+            "bullet points. Keep file paths, names, numbers, and conclusions. Output only the bullets.\n"
+            f"{notes}\n"
+            "Bullets:\n"
+        )
+        return model.generate(prompt)
+
+    return summarize
+
+
+def _summarize_turn(turn: ChatTurnMemory) -> str:
+    return (
+        f"Turn {turn.number}: user asked {_clip(turn.user_message, SUMMARY_MESSAGE_CHARS)!r}; "
+        f"Lilbot answered: {_clip(turn.answer, SUMMARY_ANSWER_CHARS)}"
+    )
+
+
+def _fact_key(action_name: str, action_args: dict[str, Any]) -> str:
+    if not action_args:
+        return f"{action_name}()"
+    rendered = ", ".join(
+        f"{key}={json.dumps(value, sort_keys=True)}" for key, value in sorted(action_args.items())
+    )
+    return f"{action_name}({rendered})"
+
+
+def _clip(text: str, limit: int) -> str:
+    rendered = " ".join(str(text).split())
+    if len(rendered) <= limit:
+        return rendered
+    return rendered[: max(0, limit - 4)].rstrip() + " ..."
@@ -1,23 +1,133 @@
-"""In-memory session state for a single Lilbot run."""
+"""In-memory session state for a single Lilbot run.
+
+Steps are slotted records. Prompts are not copied per step: each step points
+at an interned prompt head (system prompt, tools, and request) and the rest of
+the prompt is rebuilt on demand from the earlier steps with
+``lilbot.prompts.rebuild_step_prompt``. Large observations are spilled to a
+per-session temporary directory.
+"""
 
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import Any
+from pathlib import Path
+import sys
+import tempfile
+from typing import Any, Protocol
 
 
-@dataclass
+SPILL_THRESHOLD_CHARS = 4096
+
+
+class TextRef(Protocol):
+    """Lazily loaded text that only its length is known for up front."""
+
+    length: int
+
+    def read(self) -> str:
+        ...
+
+
+@dataclass(frozen=True, slots=True)
+class SpilledText:
+    """Reference to text stored outside the Python heap."""
+
+    path: Path
+    length: int
+
+    def read(self) -> str:
+        return self.path.read_text(encoding="utf-8")
+
+
+@dataclass(slots=True)
 class SessionStep:
     """A single controller step and its artifacts."""
 
     number: int
-    prompt: str
+    prompt_head: int = 0
+    final_only: bool = False
     raw_model_output: str = ""
     thought: str | None = None
     action_name: str | None = None
     action_args: dict[str, Any] = field(default_factory=dict)
-    observation: str | None = None
+    observation_ref: str | TextRef | None = None
+    compact_observation: str | None = None
     error: str | None = None
+    prompt_tokens_saved: int = 0
+    prompt_tokens: int | None = None
+    generated_tokens: int | None = None
+    prefill_seconds: float | None = None
+    decode_seconds: float | None = None
+    generation_seconds: float | None = None
+    tool_seconds: float | None = None
+    tool_cache_hit: bool = False
+
+    @property
+    def observation(self) -> str | None:
+        reference = self.observation_ref
+        if reference is None or isinstance(reference, str):
+            return reference
+        return reference.read()
+
+    @observation.setter
+    def observation(self, value: str | None) -> None:
+        self.observation_ref = value
+
+    @property
+    def observation_length(self) -> int:
+        reference = self.observation_ref
+        if reference is None:
+            return 0
+        if isinstance(reference, str):
+            return len(reference)
+        return reference.length
+
+    def to_trace_record(self) -> dict[str, Any]:
+        """Return a JSON-serializable record of this step for trace export."""
+
+        return {
+            "number": self.number,
+            "prompt_head": self.prompt_head,
+            "final_only": self.final_only,
+            "raw_model_output": self.raw_model_output,
+            "thought": self.thought,
+            "action_name": self.action_name,
+            "action_args": dict(self.action_args),
+            "observation": self.observation,
+            "compact_observation": self.compact_observation,
+            "error": self.error,
+            "prompt_tokens_saved": self.prompt_tokens_saved,
+            "prompt_tokens": self.prompt_tokens,
+            "generated_tokens": self.generated_tokens,
+            "prefill_seconds": self.prefill_seconds,
+            "decode_seconds": self.decode_seconds,
+            "generation_seconds": self.generation_seconds,
+            "tool_seconds": self.tool_seconds,
+            "tool_cache_hit": self.tool_cache_hit,
+        }
+
+    @classmethod
+    def from_trace_record(cls, record: dict[str, Any]) -> "SessionStep":
+        return cls(
+            number=int(record["number"]),
+            prompt_head=int(record.get("prompt_head", 0)),
+            final_only=bool(record.get("final_only", False)),
+            raw_model_output=record.get("raw_model_output") or "",
+            thought=record.get("thought"),
+            action_name=record.get("action_name"),
+            action_args=dict(record.get("action_args") or {}),
+            observation_ref=record.get("observation"),
+            compact_observation=record.get("compact_observation"),
+            error=record.get("error"),
+            prompt_tokens_saved=int(record.get("prompt_tokens_saved") or 0),
+            prompt_tokens=record.get("prompt_tokens"),
+            generated_tokens=record.get("generated_tokens"),
+            prefill_seconds=record.get("prefill_seconds"),
+            decode_seconds=record.get("decode_seconds"),
+            generation_seconds=record.get("generation_seconds"),
+            tool_seconds=record.get("tool_seconds"),
+            tool_cache_hit=bool(record.get("tool_cache_hit", False)),
+        )
 
 
 @dataclass
@@ -27,7 +137,88 @@ class LilbotSession:
     user_query: str
     steps: list[SessionStep] = field(default_factory=list)
     final_answer: str | None = None
+    total_seconds: float | None = None
+    prompt_heads: list[str] = field(default_factory=list)
+    retrieval_query: str | None = None
+    retrieved_context: str | None = None
+    spill_threshold_chars: int = SPILL_THRESHOLD_CHARS
+    _head_ids: dict[str, int] = field(default_factory=dict, repr=False, compare=False)
+    _spill_dir: tempfile.TemporaryDirectory | None = field(default=None, repr=False, compare=False)
 
     @property
     def actions_taken(self) -> list[str]:
         return [step.action_name for step in self.steps if step.action_name]
+
+    def intern_prompt_head(self, head: str) -> int:
+        """Store a prompt head once and return its id for SessionStep.prompt_head."""
+
+        existing = self._head_ids.get(head)
+        if existing is not None:
+            return existing
+        head_id = len(self.prompt_heads)
+        # Identical heads across sessions (same tools, same request) share one object.
+        self.prompt_heads.append(sys.intern(head))
+        self._head_ids[self.prompt_heads[head_id]] = head_id
+        return head_id
+
+    def store_observation(self, step: SessionStep, observation: str) -> None:
+        """Attach an observation, spilling it to disk when it is large."""
+
+        if len(observation) < self.spill_threshold_chars:
+            step.observation_ref = observation
+            return
+        try:
+            if self._spill_dir is None:
+                self._spill_dir = tempfile.TemporaryDirectory(prefix="lilbot-session-")
+            path = Path(self._spill_dir.name) / f"step-{step.number}.txt"
+            path.write_text(observation, encoding="utf-8")
+        except OSError:
+            step.observation_ref = observation
+            return
+        step.observation_ref = SpilledText(path=path, length=len(observation))
+
+    def __enter__(self) -> "LilbotSession":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Delete spilled observations. Spilled steps become unreadable afterwards."""
+
+        if self._spill_dir is not None:
+            self._spill_dir.cleanup()
+            self._spill_dir = None
+
+    def to_trace_record(self) -> dict[str, Any]:
+        """Return a JSON-serializable record of the full run for trace export."""
+
+        return {
+            "user_query": self.user_query,
+            "final_answer": self.final_answer,
+            "total_seconds": self.total_seconds,
+            "prompt_tokens": _sum_optional(step.prompt_tokens for step in self.steps),
+            "generated_tokens": _sum_optional(step.generated_tokens for step in self.steps),
+            "prompt_tokens_saved": sum(step.prompt_tokens_saved for step in self.steps),
+            "prompt_heads": list(self.prompt_heads),
+            "steps": [step.to_trace_record() for step in self.steps],
+        }
+
+    @classmethod
+    def from_trace_record(cls, record: dict[str, Any]) -> "LilbotSession":
+        """Rebuild a session from ``to_trace_record`` output."""
+
+        session = cls(
+            user_query=str(record.get("user_query", "")),
+            final_answer=record.get("final_answer"),
+            total_seconds=record.get("total_seconds"),
+        )
+        for head in record.get("prompt_heads") or []:
+            session.intern_prompt_head(str(head))
+        session.steps = [SessionStep.from_trace_record(step) for step in record.get("steps") or []]
+        return session
+
+
+def _sum_optional(values: Any) -> int | None:
+    present = [value for value in values if value is not None]
+    return sum(present) if present else None
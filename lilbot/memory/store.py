@@ -0,0 +1,348 @@
+"""SQLite-backed persistence for Lilbot chat sessions.
+
+A chat is a sequence of turns; each turn is one controller run with its steps.
+Observations live in their own table and are only read when a step's
+``observation`` is accessed, so resuming a long chat loads turn summaries and
+step metadata without pulling every tool output into memory.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import hashlib
+import json
+from pathlib import Path
+import sqlite3
+import time
+from typing import Any
+import uuid
+
+from lilbot.memory.session import LilbotSession, SessionStep
+
+
+SCHEMA_VERSION = 1
+CHAT_TITLE_CHARS = 60
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    id TEXT PRIMARY KEY,
+    workspace_root TEXT NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    memory TEXT
+);
+CREATE TABLE IF NOT EXISTS prompt_heads (
+    id INTEGER PRIMARY KEY,
+    digest TEXT NOT NULL UNIQUE,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS observations (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS turns (
+    chat_id TEXT NOT NULL REFERENCES chats(id) ON DELETE CASCADE,
+    turn_index INTEGER NOT NULL,
+    user_message TEXT NOT NULL,
+    request TEXT NOT NULL,
+    answer TEXT,
+    total_seconds REAL,
+    prompt_head_ids TEXT NOT NULL DEFAULT '[]',
+    created_at REAL NOT NULL,
+    PRIMARY KEY (chat_id, turn_index)
+);
+CREATE TABLE IF NOT EXISTS steps (
+    chat_id TEXT NOT NULL,
+    turn_index INTEGER NOT NULL,
+    number INTEGER NOT NULL,
+    record TEXT NOT NULL,
+    observation_id INTEGER REFERENCES observations(id),
+    observation_length INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (chat_id, turn_index, number),
+    FOREIGN KEY (chat_id, turn_index) REFERENCES turns(chat_id, turn_index) ON DELETE CASCADE
+);
+"""
+
+
+@dataclass(frozen=True)
+class ChatRecord:
+    """Summary of one saved chat."""
+
+    chat_id: str
+    workspace_root: str
+    title: str
+    created_at: float
+    updated_at: float
+    turn_count: int
+
+
+@dataclass(frozen=True)
+class ChatTurn:
+    """One saved user message and Lilbot's answer, without its steps."""
+
+    index: int
+    user_message: str
+    answer: str
+    step_count: int
+
+
+@dataclass(frozen=True, slots=True)
+class StoredText:
+    """Reference to an observation kept in the session store."""
+
+    store: "SessionStore" = field(repr=False, compare=False)
+    observation_id: int
+    length: int
+
+    def read(self) -> str:
+        return self.store.read_observation(self.observation_id)
+
+
+class SessionStore:
+    """Persistent chat sessions in a single SQLite file."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path).expanduser()
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(self.path))
+            self._connection.execute("PRAGMA foreign_keys = ON")
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+            if version > SCHEMA_VERSION:
+                self._connection.close()
+                raise RuntimeError(
+                    f"The Lilbot session store at {self.path} was written by a newer Lilbot version."
+                )
+            with self._connection:
+                self._connection.executescript(_SCHEMA)
+                self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        except (OSError, sqlite3.Error) as exc:
+            raise RuntimeError(f"Could not open the Lilbot session store at {self.path}: {exc}") from exc
+
+    def __enter__(self) -> "SessionStore":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def create_chat(self, *, workspace_root: str | Path) -> str:
+        """Create an empty chat and return its id."""
+
+        chat_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._connection:
+            self._connection.execute(
+                "INSERT INTO chats (id, workspace_root, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (chat_id, str(workspace_root), now, now),
+            )
+        return chat_id
+
+    def find_chat(self, chat_id: str) -> ChatRecord | None:
+        """Return the chat with this id, or the only chat whose id starts with it."""
+
+        prefix = chat_id.strip()
+        if not prefix:
+            return None
+        rows = self._connection.execute(
+            _CHAT_SUMMARY_QUERY + " WHERE chats.id = ? OR chats.id LIKE ? ESCAPE '\\' GROUP BY chats.id",
+            (prefix, _escape_like(prefix) + "%"),
+        ).fetchall()
+        exact = [row for row in rows if row[0] == prefix]
+        if exact:
+            return _chat_record(exact[0])
+        if len(rows) > 1:
+            raise RuntimeError(f"Session id {prefix!r} is ambiguous; use more characters.")
+        return _chat_record(rows[0]) if rows else None
+
+    def list_chats(self, *, limit: int = 20) -> list[ChatRecord]:
+        """Return the most recently updated chats first."""
+
+        rows = self._connection.execute(
+            _CHAT_SUMMARY_QUERY + " GROUP BY chats.id ORDER BY chats.updated_at DESC LIMIT ?",
+            (max(1, int(limit)),),
+        ).fetchall()
+        return [_chat_record(row) for row in rows]
+
+    def append_turn(
+        self,
+        chat_id: str,
+        *,
+        user_message: str,
+        session: LilbotSession,
+        memory: dict[str, Any] | None = None,
+    ) -> int:
+        """Persist one finished controller run as the next turn of a chat.
+
+        ``memory`` is the chat's rolling memory snapshot after this turn. It is
+        written in the same transaction as the turn, so a resume never sees a
+        turn log and a memory snapshot that disagree.
+        """
+
+        now = time.time()
+        with self._connection:
+            turn_index = self._connection.execute(
+                "SELECT COALESCE(MAX(turn_index) + 1, 0) FROM turns WHERE chat_id = ?",
+                (chat_id,),
+            ).fetchone()[0]
+            head_ids = [self._store_prompt_head(head) for head in session.prompt_heads]
+            self._connection.execute(
+                "INSERT INTO turns (chat_id, turn_index, user_message, request, answer, total_seconds, "
+                "prompt_head_ids, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    chat_id,
+                    turn_index,
+                    user_message,
+                    session.user_query,
+                    session.final_answer,
+                    session.total_seconds,
+                    json.dumps(head_ids),
+                    now,
+                ),
+            )
+            for step in session.steps:
+                observation = step.observation
+                observation_id = None
+                if observation is not None:
+                    observation_id = self._connection.execute(
+                        "INSERT INTO observations (text) VALUES (?)",
+                        (observation,),
+                    ).lastrowid
+                record = step.to_trace_record()
+                record.pop("observation", None)
+                self._connection.execute(
+                    "INSERT INTO steps (chat_id, turn_index, number, record, observation_id, "
+                    "observation_length) VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        chat_id,
+                        turn_index,
+                        step.number,
+                        json.dumps(record),
+                        observation_id,
+                        len(observation) if observation is not None else 0,
+                    ),
+                )
+            self._connection.execute(
+                "UPDATE chats SET updated_at = ?, "
+                "title = CASE WHEN title = '' THEN ? ELSE title END WHERE id = ?",
+                (now, _chat_title(user_message), chat_id),
+            )
+            if memory is not None:
+                self._connection.execute(
+                    "UPDATE chats SET memory = ? WHERE id = ?",
+                    (json.dumps(memory), chat_id),
+                )
+        return turn_index
+
+    def recent_turns(self, chat_id: str, *, limit: int) -> list[ChatTurn]:
+        """Return the last ``limit`` turns of a chat, oldest first, without loading steps."""
+
+        rows = self._connection.execute(
+            "SELECT turns.turn_index, turns.user_message, COALESCE(turns.answer, ''), "
+            "(SELECT COUNT(*) FROM steps WHERE steps.chat_id = turns.chat_id "
+            "AND steps.turn_index = turns.turn_index) "
+            "FROM turns WHERE chat_id = ? ORDER BY turn_index DESC LIMIT ?",
+            (chat_id, max(0, int(limit))),
+        ).fetchall()
+        return [
+            ChatTurn(index=row[0], user_message=row[1], answer=row[2], step_count=row[3])
+            for row in reversed(rows)
+        ]
+
+    def load_session(self, chat_id: str, turn_index: int) -> LilbotSession:
+        """Rebuild one turn's session. Observations are read lazily from the store."""
+
+        turn = self._connection.execute(
+            "SELECT request, answer, total_seconds, prompt_head_ids FROM turns "
+            "WHERE chat_id = ? AND turn_index = ?",
+            (chat_id, turn_index),
+        ).fetchone()
+        if turn is None:
+            raise RuntimeError(f"Session {chat_id} has no turn {turn_index}.")
+        session = LilbotSession(user_query=turn[0], final_answer=turn[1], total_seconds=turn[2])
+        for head_id in json.loads(turn[3]):
+            row = self._connection.execute(
+                "SELECT text FROM prompt_heads WHERE id = ?",
+                (head_id,),
+            ).fetchone()
+            session.intern_prompt_head(row[0] if row else "")
+
+        rows = self._connection.execute(
+            "SELECT record, observation_id, observation_length FROM steps "
+            "WHERE chat_id = ? AND turn_index = ? ORDER BY number",
+            (chat_id, turn_index),
+        )
+        for record_text, observation_id, observation_length in rows:
+            step = SessionStep.from_trace_record(json.loads(record_text))
+            if observation_id is not None:
+                step.observation_ref = StoredText(
+                    store=self,
+                    observation_id=observation_id,
+                    length=observation_length,
+                )
+            session.steps.append(step)
+        return session
+
+    def load_memory(self, chat_id: str) -> dict[str, Any] | None:
+        row = self._connection.execute(
+            "SELECT memory FROM chats WHERE id = ?",
+            (chat_id,),
+        ).fetchone()
+        if row is None or not row[0]:
+            return None
+        try:
+            value = json.loads(row[0])
+        except json.JSONDecodeError:
+            return None
+        return value if isinstance(value, dict) else None
+
+    def read_observation(self, observation_id: int) -> str:
+        row = self._connection.execute(
+            "SELECT text FROM observations WHERE id = ?",
+            (observation_id,),
+        ).fetchone()
+        if row is None:
+            raise RuntimeError(f"Observation {observation_id} is missing from the session store.")
+        return row[0]
+
+    def _store_prompt_head(self, head: str) -> int:
+        digest = hashlib.sha256(head.encode("utf-8")).hexdigest()
+        self._connection.execute(
+            "INSERT OR IGNORE INTO prompt_heads (digest, text) VALUES (?, ?)",
+            (digest, head),
+        )
+        return self._connection.execute(
+            "SELECT id FROM prompt_heads WHERE digest = ?",
+            (digest,),
+        ).fetchone()[0]
+
+
+_CHAT_SUMMARY_QUERY = (
+    "SELECT chats.id, chats.workspace_root, chats.title, chats.created_at, chats.updated_at, "
+    "COUNT(turns.turn_index) FROM chats LEFT JOIN turns ON turns.chat_id = chats.id"
+)
+
+
+def _chat_record(row: tuple) -> ChatRecord:
+    return ChatRecord(
+        chat_id=row[0],
+        workspace_root=row[1],
+        title=row[2],
+        created_at=row[3],
+        updated_at=row[4],
+        turn_count=row[5],
+    )
+
+
+def _chat_title(user_message: str) -> str:
+    rendered = " ".join(user_message.split())
+    if len(rendered) <= CHAT_TITLE_CHARS:
+        return rendered
+    return rendered[:CHAT_TITLE_CHARS].rstrip() + " ..."
+
+
+def _escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
@@ -3,7 +3,7 @@
 from __future__ import annotations
 
 from lilbot.config import LilbotConfig
-from lilbot.model.base import BaseModel
+from lilbot.model.base import BaseModel, DecodeState, GenerationStats, IncrementalModel
 from lilbot.model.hf_model import HuggingFaceLocalModel
 
 
@@ -21,4 +21,11 @@ def build_model(config: LilbotConfig) -> BaseModel:
     raise RuntimeError(f"Unsupported backend: {config.backend}")
 
 
-__all__ = ["BaseModel", "HuggingFaceLocalModel", "build_model"]
+__all__ = [
+    "BaseModel",
+    "DecodeState",
+    "GenerationStats",
+    "HuggingFaceLocalModel",
+    "IncrementalModel",
+    "build_model",
+]
@@ -3,13 +3,68 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+
+
+@dataclass(frozen=True)
+class GenerationStats:
+    """Token counts and timings recorded for a single generate call."""
+
+    prompt_tokens: int | None = None
+    generated_tokens: int | None = None
+    prefill_seconds: float | None = None
+    decode_seconds: float | None = None
+
+
+@dataclass
+class DecodeState:
+    """One in-flight sequence for backends that decode a token at a time."""
+
+    prompt_tokens: int
+    max_new_tokens: int
+    token_ids: list[int] = field(default_factory=list)
+    finished: bool = False
+    prefill_seconds: float | None = None
+    backend_state: object = None
+
+    @property
+    def generated_tokens(self) -> int:
+        return len(self.token_ids)
 
 
 class BaseModel(ABC):
     """Small backend abstraction used by the controller."""
 
     runtime_summary: str = ""
+    last_generation: GenerationStats | None = None
+
+    @abstractmethod
+    def generate(self, prompt: str, *, max_new_tokens: int | None = None) -> str:
+        """Generate a plain text response for the given prompt.
+
+        ``max_new_tokens`` lowers the backend's configured generation limit for
+        this call only. The controller passes it only when a run budget is active.
+        """
+
+    @property
+    def supports_incremental_decoding(self) -> bool:
+        """Whether the backend implements ``IncrementalModel`` and can be batched continuously."""
+
+        return isinstance(self, IncrementalModel)
+
+
+class IncrementalModel(BaseModel):
+    """Backend that prefills and decodes sequences a token at a time."""
+
+    @abstractmethod
+    def start_sequence(self, prompt: str, *, max_new_tokens: int | None = None) -> DecodeState:
+        """Prefill a prompt and return a state that ``decode_batch`` can advance."""
+
+    @abstractmethod
+    def decode_batch(self, states: Sequence[DecodeState]) -> None:
+        """Advance every unfinished state by one token in a single batched step."""
 
     @abstractmethod
-    def generate(self, prompt: str) -> str:
-        """Generate a plain text response for the given prompt."""
+    def finish_sequence(self, state: DecodeState) -> str:
+        """Decode a finished state into text and release its backend resources."""
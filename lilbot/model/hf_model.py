@@ -3,22 +3,50 @@
 from __future__ import annotations
 
 import os
+import time
 import warnings
 
 os.environ.setdefault("TRANSFORMERS_NO_TF", "1")
 os.environ.setdefault("USE_TF", "0")
 os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True")
 
-from lilbot.model.base import BaseModel
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from lilbot.model.base import DecodeState, GenerationStats, IncrementalModel
 
 
 DISABLED_TRANSFORMERS_OPTIONAL_PACKAGES = frozenset({"pandas", "pyarrow", "sklearn"})
+REPETITION_PENALTY = 1.05
+
+
+@dataclass
+class _CachedSequence:
+    """Per-sequence KV cache kept between batched decode steps.
+
+    ``cache`` holds the sequence's own cache only while it is outside a batch;
+    once it joins one, its rows live in the batch's shared cache.
+    """
+
+    prompt_ids: list[int]
+    cache: tuple[tuple[object, object], ...] | None
+    cache_length: int
 
 
-class HuggingFaceLocalModel(BaseModel):
+@dataclass
+class _DecodeBatch:
+    """KV cache shared by the sequences decoded together, left-padded to one length."""
+
+    states: list[DecodeState]
+    cache: tuple[tuple[object, object], ...]
+    attention_mask: object
+
+
+class HuggingFaceLocalModel(IncrementalModel):
     """Load a local Hugging Face causal LM directly in Python."""
 
     DEFAULT_MAX_INPUT_TOKENS = 4096
+    _batch: _DecodeBatch | None = None
 
     def __init__(
         self,
@@ -125,7 +153,7 @@ class HuggingFaceLocalModel(BaseModel):
         self.max_input_tokens = self._resolve_max_input_tokens()
         self.runtime_summary = self._runtime_summary()
 
-    def generate(self, prompt: str) -> str:
+    def generate(self, prompt: str, *, max_new_tokens: int | None = None) -> str:
         rendered_prompt = _render_prompt_with_chat_template(self.tokenizer, prompt)
         inputs = self.tokenizer(
             rendered_prompt,
@@ -135,34 +163,224 @@ class HuggingFaceLocalModel(BaseModel):
         ).to(self.device)
 
         generation_kwargs: dict[str, object] = {
-            "max_new_tokens": self.max_new_tokens,
+            "max_new_tokens": (
+                max(1, min(int(max_new_tokens), self.max_new_tokens))
+                if max_new_tokens is not None
+                else self.max_new_tokens
+            ),
             "do_sample": self.temperature > 0.0,
             "use_cache": True,
-            "repetition_penalty": 1.05,
+            "repetition_penalty": REPETITION_PENALTY,
             "pad_token_id": self.tokenizer.pad_token_id,
             "eos_token_id": self.tokenizer.eos_token_id,
         }
         if self.temperature > 0.0:
             generation_kwargs["temperature"] = self.temperature
 
+        prompt_tokens = int(inputs["input_ids"].shape[1])
+        first_token_timer = _build_first_token_timer(self.torch)
+        if first_token_timer is not None:
+            generation_kwargs["stopping_criteria"] = first_token_timer.as_list()
+
+        started_at = time.perf_counter()
         try:
             with self.torch.inference_mode():
                 outputs = self.model.generate(**inputs, **generation_kwargs)
         except RuntimeError as exc:
-            if "out of memory" in str(exc).lower() and self.device.type == "cuda":
-                self.torch.cuda.empty_cache()
-                raise RuntimeError(
-                    "The model ran out of GPU memory. Retry with --device cpu or use a smaller local checkpoint."
-                ) from exc
+            self._raise_for_cuda_oom(exc)
+            raise
+        finished_at = time.perf_counter()
+
+        generated_ids = outputs[0][prompt_tokens:]
+        self.last_generation = _generation_stats(
+            prompt_tokens=prompt_tokens,
+            generated_tokens=int(generated_ids.shape[0]),
+            started_at=started_at,
+            first_token_at=first_token_timer.first_token_at if first_token_timer else None,
+            finished_at=finished_at,
+        )
+        generated = self.tokenizer.decode(
+            generated_ids,
+            skip_special_tokens=True,
+            clean_up_tokenization_spaces=True,
+        ).strip()
+        return generated or "FINAL: (empty response)"
+
+    def start_sequence(self, prompt: str, *, max_new_tokens: int | None = None) -> DecodeState:
+        rendered_prompt = _render_prompt_with_chat_template(self.tokenizer, prompt)
+        inputs = self.tokenizer(
+            rendered_prompt,
+            return_tensors="pt",
+            truncation=True,
+            max_length=self.max_input_tokens,
+        ).to(self.device)
+        prompt_ids = [int(token) for token in inputs["input_ids"][0].tolist()]
+        limit = self.max_new_tokens
+        if max_new_tokens is not None:
+            limit = max(1, min(int(max_new_tokens), self.max_new_tokens))
+
+        started_at = time.perf_counter()
+        try:
+            with self.torch.inference_mode():
+                outputs = self.model(**inputs, use_cache=True)
+        except RuntimeError as exc:
+            self._raise_for_cuda_oom(exc)
+            raise
+
+        state = DecodeState(
+            prompt_tokens=len(prompt_ids),
+            max_new_tokens=limit,
+            backend_state=_CachedSequence(
+                prompt_ids=prompt_ids,
+                cache=_to_legacy_cache(outputs.past_key_values),
+                cache_length=len(prompt_ids),
+            ),
+        )
+        self._append_token(state, outputs.logits[0, -1, :])
+        state.prefill_seconds = time.perf_counter() - started_at
+        return state
+
+    def decode_batch(self, states: Sequence[DecodeState]) -> None:
+        active = [state for state in states if not state.finished]
+        if not active:
+            self._batch = None
+            return
+
+        torch = self.torch
+        batch = self._batch
+        if batch is None or not _same_states(batch.states, active):
+            batch = self._rebuild_batch(active)
+        lengths = [state.backend_state.cache_length for state in active]
+
+        attention_mask = torch.cat(
+            [batch.attention_mask, batch.attention_mask.new_ones((len(active), 1))],
+            dim=1,
+        )
+        input_ids = torch.tensor(
+            [[state.token_ids[-1]] for state in active],
+            dtype=torch.long,
+            device=self.device,
+        )
+        position_ids = torch.tensor([[length] for length in lengths], dtype=torch.long, device=self.device)
+
+        try:
+            with torch.inference_mode():
+                outputs = self.model(
+                    input_ids=input_ids,
+                    attention_mask=attention_mask,
+                    position_ids=position_ids,
+                    past_key_values=_from_legacy_cache(batch.cache),
+                    use_cache=True,
+                )
+        except RuntimeError as exc:
+            self._raise_for_cuda_oom(exc)
             raise
 
+        batch.cache = _to_legacy_cache(outputs.past_key_values)
+        batch.attention_mask = attention_mask
+        for row, state in enumerate(active):
+            state.backend_state.cache_length += 1
+            self._append_token(state, outputs.logits[row, -1, :])
+
+    def finish_sequence(self, state: DecodeState) -> str:
+        state.backend_state = None
+        if self._batch is not None and all(member.finished for member in self._batch.states):
+            self._batch = None
         generated = self.tokenizer.decode(
-            outputs[0][inputs["input_ids"].shape[1] :],
+            state.token_ids,
             skip_special_tokens=True,
             clean_up_tokenization_spaces=True,
         ).strip()
         return generated or "FINAL: (empty response)"
 
+    def _rebuild_batch(self, active: list[DecodeState]) -> _DecodeBatch:
+        # Sessions joined or left the batch. Only now is the shared cache taken
+        # apart: each unfinished member gets its own rows back, and the new set
+        # is left-padded to its longest cache, with the pad masked out.
+        torch = self.torch
+        previous = self._batch
+        self._batch = None
+        if previous is not None:
+            width = int(previous.attention_mask.shape[1])
+            for row, member in enumerate(previous.states):
+                sequence = member.backend_state
+                if sequence is None or member.finished:
+                    continue
+                pad = width - sequence.cache_length
+                sequence.cache = tuple(
+                    (
+                        key[row : row + 1, :, pad:, :].contiguous(),
+                        value[row : row + 1, :, pad:, :].contiguous(),
+                    )
+                    for key, value in previous.cache
+                )
+
+        sequences: list[_CachedSequence] = [state.backend_state for state in active]
+        width = max(sequence.cache_length for sequence in sequences)
+        cache = []
+        for layer_index in range(len(sequences[0].cache)):
+            keys = []
+            values = []
+            for sequence in sequences:
+                key, value = sequence.cache[layer_index]
+                pad = width - sequence.cache_length
+                if pad:
+                    key = torch.nn.functional.pad(key, (0, 0, pad, 0))
+                    value = torch.nn.functional.pad(value, (0, 0, pad, 0))
+                keys.append(key)
+                values.append(value)
+            cache.append((torch.cat(keys, dim=0), torch.cat(values, dim=0)))
+
+        attention_mask = torch.zeros((len(active), width), dtype=torch.long, device=self.device)
+        for row, sequence in enumerate(sequences):
+            attention_mask[row, width - sequence.cache_length :] = 1
+            sequence.cache = None
+        self._batch = _DecodeBatch(states=list(active), cache=tuple(cache), attention_mask=attention_mask)
+        return self._batch
+
+    def _append_token(self, state: DecodeState, logits: object) -> None:
+        sequence: _CachedSequence = state.backend_state
+        token = self._select_next_token(logits, [*sequence.prompt_ids, *state.token_ids])
+        state.token_ids.append(token)
+        if token in self._eos_token_ids() or state.generated_tokens >= state.max_new_tokens:
+            state.finished = True
+
+    def _select_next_token(self, logits: object, seen_ids: list[int]) -> int:
+        torch = self.torch
+        scores = logits.float().clone()
+        if seen_ids:
+            index = torch.tensor(sorted(set(seen_ids)), dtype=torch.long, device=scores.device)
+            seen_scores = scores[index]
+            scores[index] = torch.where(
+                seen_scores < 0,
+                seen_scores * REPETITION_PENALTY,
+                seen_scores / REPETITION_PENALTY,
+            )
+        if self.temperature > 0.0:
+            probabilities = torch.softmax(scores / self.temperature, dim=-1)
+            return int(torch.multinomial(probabilities, num_samples=1).item())
+        return int(torch.argmax(scores).item())
+
+    def _eos_token_ids(self) -> frozenset[int]:
+        candidates: list[object] = [
+            self.tokenizer.eos_token_id,
+            getattr(self.model.generation_config, "eos_token_id", None),
+        ]
+        ids: set[int] = set()
+        for candidate in candidates:
+            if isinstance(candidate, int):
+                ids.add(candidate)
+            elif isinstance(candidate, (list, tuple)):
+                ids.update(item for item in candidate if isinstance(item, int))
+        return frozenset(ids)
+
+    def _raise_for_cuda_oom(self, exc: RuntimeError) -> None:
+        if "out of memory" in str(exc).lower() and self.device.type == "cuda":
+            self.torch.cuda.empty_cache()
+            raise RuntimeError(
+                "The model ran out of GPU memory. Retry with --device cpu or use a smaller local checkpoint."
+            ) from exc
+
     def _build_quantization_config(self) -> object | None:
         if not self.quantize_4bit:
             return None
@@ -347,6 +565,77 @@ def _render_prompt_with_chat_template(tokenizer: object, prompt: str) -> str:
     return str(rendered) if rendered else text
 
 
+class _FirstTokenTimer:
+    """Stopping criterion that never stops but records when the first token lands."""
+
+    def __init__(self, torch_module: object, stopping_criteria_list: type) -> None:
+        self.torch = torch_module
+        self.stopping_criteria_list = stopping_criteria_list
+        self.first_token_at: float | None = None
+
+    def __call__(self, input_ids: object, scores: object, **kwargs: object) -> object:
+        del scores, kwargs
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        return self.torch.zeros(
+            input_ids.shape[0],
+            dtype=self.torch.bool,
+            device=input_ids.device,
+        )
+
+    def as_list(self) -> object:
+        return self.stopping_criteria_list([self])
+
+
+def _build_first_token_timer(torch_module: object) -> _FirstTokenTimer | None:
+    try:
+        from transformers import StoppingCriteriaList
+    except ImportError:
+        return None
+    return _FirstTokenTimer(torch_module, StoppingCriteriaList)
+
+
+def _generation_stats(
+    *,
+    prompt_tokens: int,
+    generated_tokens: int,
+    started_at: float,
+    first_token_at: float | None,
+    finished_at: float,
+) -> GenerationStats:
+    if first_token_at is None:
+        return GenerationStats(
+            prompt_tokens=prompt_tokens,
+            generated_tokens=generated_tokens,
+            decode_seconds=finished_at - started_at,
+        )
+    return GenerationStats(
+        prompt_tokens=prompt_tokens,
+        generated_tokens=generated_tokens,
+        prefill_seconds=first_token_at - started_at,
+        decode_seconds=finished_at - first_token_at,
+    )
+
+
+def _same_states(members: Sequence[DecodeState], states: Sequence[DecodeState]) -> bool:
+    return len(members) == len(states) and all(member is state for member, state in zip(members, states))
+
+
+def _to_legacy_cache(past_key_values: object) -> tuple[tuple[object, object], ...]:
+    to_legacy = getattr(past_key_values, "to_legacy_cache", None)
+    if callable(to_legacy):
+        return tuple(to_legacy())
+    return tuple(past_key_values)
+
+
+def _from_legacy_cache(cache: tuple[tuple[object, object], ...]) -> object:
+    try:
+        from transformers import DynamicCache
+    except ImportError:
+        return cache
+    return DynamicCache.from_legacy_cache(cache)
+
+
 def _disable_optional_transformers_packages(transformers_module: object) -> None:
     try:
         import_utils = transformers_module.utils.import_utils
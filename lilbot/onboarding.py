@@ -131,6 +131,8 @@ def render_doctor_report(config: LilbotConfig) -> str:
             f"- quantize_4bit: {'enabled' if config.quantize_4bit else 'disabled'}",
             f"- max_new_tokens: {config.max_new_tokens}",
             f"- max_steps: {config.max_steps}",
+            f"- run_budget: {_describe_run_budget(config)}",
+            f"- retrieval_context: {_describe_retrieval_context(config)}",
             f"- model: {config.model or '(not configured)'}",
             f"- model_status: {_describe_model_status(config.model)}",
         ]
@@ -257,6 +259,8 @@ def run_init_wizard(
         "temperature": config.temperature,
         "quantize_4bit": quantize_4bit,
         "max_steps": max_steps,
+        "max_run_seconds": config.max_run_seconds,
+        "max_run_tokens": config.max_run_tokens,
         "workspace_root": workspace_root,
         "shell_timeout_seconds": shell_timeout_seconds,
     }
@@ -533,6 +537,21 @@ def _describe_model_status(model_path: str | None) -> str:
     return "path does not exist"
 
 
+def _describe_run_budget(config: LilbotConfig) -> str:
+    limits: list[str] = []
+    if config.max_run_seconds > 0:
+        limits.append(f"{config.max_run_seconds:g}s wall clock")
+    if config.max_run_tokens > 0:
+        limits.append(f"{config.max_run_tokens} tokens")
+    return ", ".join(limits) if limits else "unlimited (bounded by max_steps)"
+
+
+def _describe_retrieval_context(config: LilbotConfig) -> str:
+    if config.retrieval_context_tokens <= 0:
+        return "disabled"
+    return f"up to {config.retrieval_top_k} chunks within {config.retrieval_context_tokens} tokens"
+
+
 def _package_diagnostics() -> tuple[list[str], dict[str, bool]]:
     package_names = ("torch", "transformers", "accelerate", "bitsandbytes")
     lines: list[str] = []
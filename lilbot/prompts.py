@@ -4,8 +4,9 @@ from __future__ import annotations
 
 from collections.abc import Sequence
 
-from lilbot.memory.session import LilbotSession
+from lilbot.memory.session import LilbotSession, SessionStep
 from lilbot.tools.registry import ToolRegistry
+from lilbot.utils.formatting import estimate_tokens, estimate_tokens_from_length
 
 
 SYSTEM_PROMPT = """You are Lilbot, a local-first AI command line assistant for developers and system administrators.
@@ -33,44 +34,107 @@ FINAL: <answer>
 """
 
 
-def build_controller_prompt(
+def build_prompt_head(
     *,
     user_query: str,
     tool_registry: ToolRegistry,
-    session: LilbotSession,
     allowed_tools: Sequence[str] | None = None,
+    final_only: bool = False,
+    has_history: bool = False,
+    retrieved_context: str | None = None,
 ) -> str:
-    tools_text = tool_registry.describe(allowed_tools)
-    if allowed_tools is not None and not allowed_tools:
+    """Render the part of the prompt that does not depend on the transcript."""
+
+    tools_text = tool_registry.describe([] if final_only else allowed_tools)
+    if final_only and has_history:
+        tool_guidance = (
+            "The step or time budget is nearly spent. Do not request more tools. "
+            "Answer now with THOUGHT/FINAL using the observations in the prior transcript."
+        )
+    elif final_only or (allowed_tools is not None and not allowed_tools):
         tool_guidance = "No tools are available for this request. Respond with FINAL."
     else:
         tool_guidance = "Use tools only when the answer depends on local machine state, files, logs, or repository contents."
 
-    if not session.steps:
-        history_block = "(no prior steps)"
-    else:
-        lines: list[str] = []
-        for step in session.steps:
-            lines.append(f"Step {step.number}:")
-            if step.thought:
-                lines.append(f"- thought: {step.thought}")
-            if step.action_name:
-                lines.append(f"- action: {step.action_name}")
-                lines.append(f"- args: {step.action_args}")
-            if step.observation:
-                lines.append(f"- observation: {step.observation}")
-            if step.error:
-                lines.append(f"- error: {step.error}")
-        history_block = "\n".join(lines)
+    sections = [
+        SYSTEM_PROMPT.strip(),
+        tool_guidance,
+        "Available tools:",
+        tools_text,
+    ]
+    if retrieved_context:
+        sections.append(retrieved_context)
+    sections.append(f"User request:\n{user_query}")
+    return "\n\n".join(sections)
+
+
+def assemble_controller_prompt(
+    head: str,
+    prior_steps: Sequence[SessionStep],
+    *,
+    final_only: bool = False,
+) -> str:
+    """Join a prompt head with the transcript rendered from earlier steps."""
 
     return "\n\n".join(
         [
-            SYSTEM_PROMPT.strip(),
-            tool_guidance,
-            "Available tools:",
-            tools_text,
-            f"User request:\n{user_query}",
-            f"Prior transcript:\n{history_block}",
-            "Respond with the next THOUGHT/ACTION/ARGS block or a THOUGHT/FINAL block.",
+            head,
+            f"Prior transcript:\n{_render_transcript(prior_steps)}",
+            (
+                "Respond with a THOUGHT/FINAL block."
+                if final_only
+                else "Respond with the next THOUGHT/ACTION/ARGS block or a THOUGHT/FINAL block."
+            ),
         ]
     )
+
+
+def rebuild_step_prompt(session: LilbotSession, step: SessionStep) -> str:
+    """Reconstruct the exact prompt a recorded step was generated from."""
+
+    index = next(position for position, candidate in enumerate(session.steps) if candidate is step)
+    return assemble_controller_prompt(
+        session.prompt_heads[step.prompt_head],
+        session.steps[:index],
+        final_only=step.final_only,
+    )
+
+
+def compacted_token_savings(session: LilbotSession) -> int:
+    """Estimate prompt tokens saved by rendering older observations compactly."""
+
+    return sum(
+        estimate_tokens_from_length(step.observation_length)
+        - estimate_tokens(step.compact_observation)
+        for step in session.steps[:-1]
+        if step.observation_length and step.compact_observation is not None
+    )
+
+
+def _render_transcript(steps: Sequence[SessionStep]) -> str:
+    if not steps:
+        return "(no prior steps)"
+
+    lines: list[str] = []
+    latest_index = len(steps) - 1
+    for index, step in enumerate(steps):
+        lines.append(f"Step {step.number}:")
+        if step.thought:
+            lines.append(f"- thought: {step.thought}")
+        if step.action_name:
+            lines.append(f"- action: {step.action_name}")
+            lines.append(f"- args: {step.action_args}")
+        observation = _transcript_observation(step, latest=index == latest_index)
+        if observation:
+            lines.append(f"- observation: {observation}")
+        if step.error:
+            lines.append(f"- error: {step.error}")
+    return "\n".join(lines)
+
+
+def _transcript_observation(step: SessionStep, *, latest: bool) -> str | None:
+    # The newest observation stays verbatim so the model can act on it;
+    # older ones fall back to the tool's compact rendering when available.
+    if not latest and step.compact_observation is not None:
+        return step.compact_observation
+    return step.observation
@@ -1 +1 @@
-"""Retrieval hooks for future Lilbot extensions."""
+"""Repository chunking, embeddings, and hybrid search indexes."""
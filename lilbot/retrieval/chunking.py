@@ -1,7 +1,280 @@
-"""Chunking helpers for future retrieval support.
+"""Streaming repository chunker for retrieval.
 
-TODO:
-- split large repositories into semantically useful chunks
-- chunk logs by time window or event boundary
-- add language-aware chunkers for code search
+Files are walked with ``iter_workspace_files`` and chunked one at a time, so
+memory stays bounded by the largest single chunk (and, for Python parsed with
+``ast``, by ``MAX_AST_FILE_BYTES``). Python is split at top-level functions and
+classes; oversized classes are split further by method. Log files are split
+into time windows by ``lilbot.retrieval.logs``. Everything else is split at
+blank lines once a chunk reaches a useful size. Each chunk carries a
+content hash so downstream caches can skip unchanged text.
 """
+
+from __future__ import annotations
+
+import ast
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+import hashlib
+from pathlib import Path
+
+from lilbot.config import LilbotConfig
+from lilbot.tools.filesystem import is_probably_text, iter_workspace_files
+
+
+DEFAULT_MAX_CHUNK_CHARS = 2400
+MIN_SPLIT_FRACTION = 0.5
+MAX_AST_FILE_BYTES = 1_000_000
+MAX_CHUNK_FILE_BYTES = 20_000_000
+MAX_LOG_FILE_BYTES = 512_000_000
+SKIPPED_CHUNK_SUFFIXES = {".safetensors", ".bin", ".pt", ".pth", ".ckpt", ".onnx", ".lock"}
+
+
+@dataclass(frozen=True, slots=True)
+class Chunk:
+    """A contiguous line range of one workspace file."""
+
+    path: str
+    start_line: int
+    end_line: int
+    kind: str
+    name: str | None
+    text: str
+    content_hash: str
+
+    @property
+    def chunk_id(self) -> str:
+        return f"{self.path}:{self.start_line}-{self.end_line}"
+
+    @property
+    def label(self) -> str:
+        if self.name:
+            return f"{self.chunk_id} ({self.kind} {self.name})"
+        return self.chunk_id
+
+
+def content_hash(text: str) -> str:
+    """Return the stable hash used to identify chunk text across runs."""
+
+    return hashlib.blake2b(text.encode("utf-8", errors="replace"), digest_size=16).hexdigest()
+
+
+def iter_repository_chunks(
+    config: LilbotConfig,
+    root: Path | None = None,
+    *,
+    max_chunk_chars: int = DEFAULT_MAX_CHUNK_CHARS,
+    limit: int | None = None,
+) -> Iterator[Chunk]:
+    """Lazily yield chunks for every text file under ``root``."""
+
+    base = root or config.workspace_root
+    for path in iter_workspace_files(config, base, limit=limit):
+        if path.suffix.lower() in SKIPPED_CHUNK_SUFFIXES:
+            continue
+        relative = _relative_path(config, path)
+        yield from chunk_file(path, relative, max_chunk_chars=max_chunk_chars)
+
+
+def chunk_file(
+    path: Path,
+    relative: str,
+    *,
+    max_chunk_chars: int = DEFAULT_MAX_CHUNK_CHARS,
+) -> Iterator[Chunk]:
+    """Yield chunks for one file, or nothing if it is binary, huge, or unreadable."""
+
+    try:
+        size = path.stat().st_size
+    except OSError:
+        return
+    # Log chunks stream with bounded memory, so logs may be much larger than other files.
+    from lilbot.retrieval.logs import is_log_file, iter_log_chunks
+
+    is_log = is_log_file(path)
+    max_bytes = MAX_LOG_FILE_BYTES if is_log else MAX_CHUNK_FILE_BYTES
+    if size == 0 or size > max_bytes or not is_probably_text(path):
+        return
+
+    if is_log:
+        try:
+            for log_chunk in iter_log_chunks(path, relative, max_chunk_chars=max_chunk_chars):
+                yield log_chunk.as_chunk()
+        except OSError:
+            return
+        return
+
+    if path.suffix.lower() == ".py" and size <= MAX_AST_FILE_BYTES:
+        try:
+            source = path.read_text(encoding="utf-8", errors="replace")
+        except OSError:
+            return
+        yield from chunk_python_source(source, relative, max_chunk_chars=max_chunk_chars)
+        return
+
+    try:
+        with path.open("r", encoding="utf-8", errors="replace") as handle:
+            yield from chunk_text_lines(handle, relative, max_chunk_chars=max_chunk_chars)
+    except OSError:
+        return
+
+
+def chunk_python_source(
+    source: str,
+    relative: str,
+    *,
+    max_chunk_chars: int = DEFAULT_MAX_CHUNK_CHARS,
+) -> Iterator[Chunk]:
+    """Split Python source at top-level definitions, falling back to text splitting."""
+
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        yield from chunk_text_lines(source.splitlines(keepends=True), relative, max_chunk_chars=max_chunk_chars)
+        return
+
+    lines = source.splitlines(keepends=True)
+    cursor = 1
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        start, end = _node_line_range(node)
+        if start > cursor:
+            yield from _chunk_line_range(lines, relative, cursor, start - 1, max_chunk_chars, kind="module")
+        yield from _chunk_definition(node, lines, relative, max_chunk_chars)
+        cursor = end + 1
+    if cursor <= len(lines):
+        yield from _chunk_line_range(lines, relative, cursor, len(lines), max_chunk_chars, kind="module")
+
+
+def chunk_text_lines(
+    lines: Iterable[str],
+    relative: str,
+    *,
+    max_chunk_chars: int = DEFAULT_MAX_CHUNK_CHARS,
+    start_line: int = 1,
+    kind: str = "block",
+    name: str | None = None,
+) -> Iterator[Chunk]:
+    """Split a stream of lines at blank lines once a chunk is large enough."""
+
+    buffer: list[str] = []
+    buffered_chars = 0
+    buffer_start = start_line
+    line_number = start_line - 1
+    min_split_chars = int(max_chunk_chars * MIN_SPLIT_FRACTION)
+
+    for line in lines:
+        line_number += 1
+        if len(line) > max_chunk_chars:
+            line = line[:max_chunk_chars] + "\n"
+        if buffer and buffered_chars + len(line) > max_chunk_chars:
+            yield _make_chunk(relative, buffer_start, line_number - 1, kind, name, buffer)
+            buffer, buffered_chars, buffer_start = [], 0, line_number
+        if not buffer and not line.strip():
+            buffer_start = line_number + 1
+            continue
+        buffer.append(line)
+        buffered_chars += len(line)
+        if not line.strip() and buffered_chars >= min_split_chars:
+            yield _make_chunk(relative, buffer_start, line_number, kind, name, buffer)
+            buffer, buffered_chars, buffer_start = [], 0, line_number + 1
+
+    if buffer:
+        yield _make_chunk(relative, buffer_start, line_number, kind, name, buffer)
+
+
+def _chunk_definition(
+    node: ast.FunctionDef | ast.AsyncFunctionDef | ast.ClassDef,
+    lines: list[str],
+    relative: str,
+    max_chunk_chars: int,
+) -> Iterator[Chunk]:
+    start, end = _node_line_range(node)
+    kind = "class" if isinstance(node, ast.ClassDef) else "function"
+    text_chars = sum(len(line) for line in lines[start - 1 : end])
+    if text_chars <= max_chunk_chars:
+        yield _make_chunk(relative, start, end, kind, node.name, lines[start - 1 : end])
+        return
+
+    if isinstance(node, ast.ClassDef):
+        methods = [
+            child
+            for child in node.body
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))
+        ]
+        if methods:
+            cursor = start
+            for method in methods:
+                method_start, method_end = _node_line_range(method)
+                if method_start > cursor:
+                    yield from _chunk_line_range(
+                        lines, relative, cursor, method_start - 1, max_chunk_chars, kind="class", name=node.name
+                    )
+                yield from _chunk_line_range(
+                    lines,
+                    relative,
+                    method_start,
+                    method_end,
+                    max_chunk_chars,
+                    kind="method",
+                    name=f"{node.name}.{method.name}",
+                )
+                cursor = method_end + 1
+            if cursor <= end:
+                yield from _chunk_line_range(lines, relative, cursor, end, max_chunk_chars, kind="class", name=node.name)
+            return
+
+    yield from _chunk_line_range(lines, relative, start, end, max_chunk_chars, kind=kind, name=node.name)
+
+
+def _chunk_line_range(
+    lines: list[str],
+    relative: str,
+    start: int,
+    end: int,
+    max_chunk_chars: int,
+    *,
+    kind: str,
+    name: str | None = None,
+) -> Iterator[Chunk]:
+    yield from chunk_text_lines(
+        lines[start - 1 : end],
+        relative,
+        max_chunk_chars=max_chunk_chars,
+        start_line=start,
+        kind=kind,
+        name=name,
+    )
+
+
+def _node_line_range(node: ast.stmt) -> tuple[int, int]:
+    decorators = getattr(node, "decorator_list", [])
+    start = min([node.lineno, *(decorator.lineno for decorator in decorators)])
+    return start, getattr(node, "end_lineno", None) or node.lineno
+
+
+def _make_chunk(
+    relative: str,
+    start: int,
+    end: int,
+    kind: str,
+    name: str | None,
+    lines: list[str],
+) -> Chunk:
+    text = "".join(lines).rstrip()
+    return Chunk(
+        path=relative,
+        start_line=start,
+        end_line=end,
+        kind=kind,
+        name=name,
+        text=text,
+        content_hash=content_hash(text),
+    )
+
+
+def _relative_path(config: LilbotConfig, path: Path) -> str:
+    try:
+        return path.relative_to(config.workspace_root).as_posix()
+    except ValueError:
+        return path.as_posix()
@@ -0,0 +1,132 @@
+"""Retrieved context for controller prompts.
+
+When ``retrieval_context_tokens`` is set, the controller asks a
+``RetrievalContextProvider`` for the request's best-matching chunks before
+the first step. Results are deduplicated (overlapping line ranges and
+identical text are dropped) and packed greedily into the token budget; the
+last snippet that does not fit is clipped to the remaining room rather than
+skipped, so the budget is used but never exceeded.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+import sqlite3
+import threading
+
+from lilbot.config import LilbotConfig
+from lilbot.retrieval.chunking import content_hash
+from lilbot.retrieval.embeddings import EmbeddingBackend
+from lilbot.retrieval.repository import RepositoryIndex, RetrievalResult, read_result_lines
+from lilbot.utils.formatting import estimate_tokens
+
+
+CONTEXT_HEADER = (
+    "Retrieved repository context (search results for the request; "
+    "verify with tools before relying on details it does not show):"
+)
+CANDIDATE_MULTIPLIER = 3
+MAX_CONTEXT_CHUNK_LINES = 80
+MIN_CLIPPED_CHUNK_TOKENS = 48
+
+
+class RetrievalContextProvider:
+    """Callable that returns packed retrieval context for a request, or None.
+
+    Each call opens the index on the calling thread, so one provider can be
+    shared by the batch scheduler's worker threads.
+    """
+
+    def __init__(self, config: LilbotConfig) -> None:
+        self.config = config
+        self.token_budget = config.retrieval_context_tokens
+        self.top_k = config.retrieval_top_k
+        self._lock = threading.Lock()
+        self._embedding_backend: EmbeddingBackend | None = None
+        self._use_vectors = True
+
+    def __call__(self, query: str) -> str | None:
+        if self.token_budget <= 0 or not query.strip():
+            return None
+        with self._lock:
+            index = RepositoryIndex(
+                self.config,
+                embedding_backend=self._embedding_backend,
+                use_vectors=self._use_vectors,
+            )
+            try:
+                results = index.search(query, k=self.top_k * CANDIDATE_MULTIPLIER)
+                # Keep the loaded model, or remember that it failed, for later calls.
+                self._embedding_backend = index.embedding_backend
+                self._use_vectors = self._embedding_backend is not None
+            except (RuntimeError, sqlite3.Error):
+                # A missing, locked, or corrupt index just means no retrieved context.
+                return None
+            finally:
+                index.close()
+        return pack_context(self.config, results, token_budget=self.token_budget, max_chunks=self.top_k)
+
+
+def pack_context(
+    config: LilbotConfig,
+    results: Sequence[RetrievalResult],
+    *,
+    token_budget: int,
+    max_chunks: int,
+) -> str | None:
+    """Render ranked results as one context block within ``token_budget`` tokens."""
+
+    used = estimate_tokens(CONTEXT_HEADER)
+    blocks: list[str] = []
+    seen_text: set[str] = set()
+    taken_ranges: dict[str, list[tuple[int, int]]] = {}
+    for result in results:
+        if len(blocks) >= max_chunks or used >= token_budget:
+            break
+        ranges = taken_ranges.setdefault(result.path, [])
+        if any(start <= result.end_line and result.start_line <= end for start, end in ranges):
+            continue
+        lines = read_result_lines(config, result, max_lines=MAX_CONTEXT_CHUNK_LINES)
+        while lines and not lines[-1].strip():
+            lines.pop()
+        if not lines:
+            continue
+        digest = content_hash("\n".join(lines))
+        if digest in seen_text:
+            continue
+
+        label = f"{result.kind} {result.name}" if result.name else result.kind
+        block = _render_block(result, lines, label)
+        cost = estimate_tokens(block) + 1
+        if used + cost > token_budget:
+            room = token_budget - used - estimate_tokens(_render_block(result, [], label)) - 1
+            if room < MIN_CLIPPED_CHUNK_TOKENS:
+                continue
+            lines = _clip_lines(lines, room)
+            block = _render_block(result, lines, label)
+            cost = estimate_tokens(block) + 1
+
+        blocks.append(block)
+        used += cost
+        seen_text.add(digest)
+        ranges.append((result.start_line, result.end_line))
+
+    if not blocks:
+        return None
+    return "\n".join([CONTEXT_HEADER, *blocks])
+
+
+def _render_block(result: RetrievalResult, lines: Sequence[str], label: str) -> str:
+    end_line = result.start_line + len(lines) - 1 if lines else result.end_line
+    return "\n".join([f"--- ./{result.path}:{result.start_line}-{end_line} ({label})", *lines])
+
+
+def _clip_lines(lines: Sequence[str], token_room: int) -> list[str]:
+    kept: list[str] = []
+    used = 0
+    for line in lines:
+        used += estimate_tokens(line + "\n")
+        if used > token_room:
+            break
+        kept.append(line)
+    return kept
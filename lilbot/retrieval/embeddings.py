@@ -1,7 +1,226 @@
-"""Embedding hooks for future retrieval support.
+"""Offline embedding backends and a content-hash vector cache.
 
-TODO:
-- support local embedding backends
-- keep embedding generation offline and optional
-- make retrieval pluggable instead of hard-wiring a vector database
+Embeddings come from a local sentence-embedding checkpoint loaded with
+``local_files_only=True``, the same way the chat model is loaded. Chunks are
+embedded in length-sorted padded batches on CPU and returned as L2-normalized
+float16 NumPy arrays. ``EmbeddingCache`` stores vectors in SQLite keyed by
+model and chunk content hash, so re-indexing unchanged text never reaches the
+model.
 """
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from collections.abc import Sequence
+from pathlib import Path
+import sqlite3
+from typing import Any
+
+from lilbot.config import LilbotConfig
+from lilbot.retrieval.chunking import Chunk, content_hash
+
+
+DEFAULT_EMBEDDING_BATCH_SIZE = 64
+DEFAULT_EMBEDDING_MAX_LENGTH = 256
+CACHE_LOOKUP_BATCH = 512
+
+
+def require_numpy() -> Any:
+    """Import NumPy or explain how to install the retrieval extra."""
+
+    try:
+        import numpy
+    except ImportError as exc:
+        raise RuntimeError(
+            "Retrieval needs NumPy. Install it with `python -m pip install numpy` "
+            "or `pip install -e \".[retrieval]\"`."
+        ) from exc
+    return numpy
+
+
+class EmbeddingBackend(ABC):
+    """Turns text into fixed-size normalized vectors."""
+
+    model_name: str = ""
+    dimension: int = 0
+
+    @abstractmethod
+    def embed_texts(self, texts: Sequence[str]) -> Any:
+        """Return a float16 array of shape ``(len(texts), dimension)``."""
+
+    def embed_query(self, text: str) -> Any:
+        return self.embed_texts([text])[0]
+
+
+class HuggingFaceEmbeddingBackend(EmbeddingBackend):
+    """Mean-pooled sentence embeddings from a local Hugging Face encoder."""
+
+    def __init__(
+        self,
+        model_name: str | None,
+        *,
+        batch_size: int = DEFAULT_EMBEDDING_BATCH_SIZE,
+        max_length: int = DEFAULT_EMBEDDING_MAX_LENGTH,
+    ) -> None:
+        if not model_name:
+            raise RuntimeError(
+                "No local embedding model is configured. Set `LILBOT_EMBEDDING_MODEL` "
+                "to a local sentence-embedding checkpoint."
+            )
+
+        self.numpy = require_numpy()
+        try:
+            import torch
+            from transformers import AutoModel, AutoTokenizer
+        except ImportError as exc:
+            raise RuntimeError(
+                "Local embedding dependencies are missing. Install them with "
+                "`python -m pip install torch transformers`."
+            ) from exc
+
+        self.torch = torch
+        self.model_name = model_name
+        self.batch_size = max(1, int(batch_size))
+        self.max_length = max(8, int(max_length))
+        try:
+            self.tokenizer = AutoTokenizer.from_pretrained(model_name, local_files_only=True, use_fast=True)
+            self.model = AutoModel.from_pretrained(model_name, local_files_only=True, low_cpu_mem_usage=True)
+        except Exception as exc:
+            raise RuntimeError(
+                f"Unable to load local embedding model '{model_name}'. "
+                "Lilbot requires a local checkpoint or a model already cached offline. "
+                f"Original error: {exc}"
+            ) from exc
+        self.model.to(torch.device("cpu"))
+        self.model.eval()
+        self.dimension = int(getattr(self.model.config, "hidden_size", 0) or 0)
+
+    def embed_texts(self, texts: Sequence[str]) -> Any:
+        np = self.numpy
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float16)
+
+        # Sorting by length keeps padding inside each batch small.
+        order = sorted(range(len(texts)), key=lambda index: len(texts[index]))
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float16)
+        for offset in range(0, len(order), self.batch_size):
+            batch_indexes = order[offset : offset + self.batch_size]
+            encoded = self.tokenizer(
+                [texts[index] for index in batch_indexes],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="pt",
+            )
+            with self.torch.inference_mode():
+                hidden = self.model(**encoded).last_hidden_state
+                mask = encoded["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1.0)
+                pooled = self.torch.nn.functional.normalize(pooled, p=2, dim=1)
+            vectors[batch_indexes] = pooled.float().numpy().astype(np.float16)
+        return vectors
+
+
+class EmbeddingCache:
+    """SQLite cache of float16 vectors keyed by model name and content hash."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.numpy = require_numpy()
+        self.path = Path(path).expanduser()
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(self.path))
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            with self._connection:
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS vectors ("
+                    "model TEXT NOT NULL, content_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                    "PRIMARY KEY (model, content_hash)) WITHOUT ROWID"
+                )
+        except (OSError, sqlite3.Error) as exc:
+            raise RuntimeError(f"Could not open the embedding cache at {self.path}: {exc}") from exc
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def get_many(self, model_name: str, hashes: Sequence[str]) -> dict[str, Any]:
+        np = self.numpy
+        found: dict[str, Any] = {}
+        unique = list(dict.fromkeys(hashes))
+        # Stay well under SQLite's bound-parameter limit.
+        for offset in range(0, len(unique), CACHE_LOOKUP_BATCH):
+            batch = unique[offset : offset + CACHE_LOOKUP_BATCH]
+            placeholders = ", ".join("?" for _ in batch)
+            rows = self._connection.execute(
+                f"SELECT content_hash, vector FROM vectors WHERE model = ? AND content_hash IN ({placeholders})",
+                (model_name, *batch),
+            )
+            for digest, blob in rows:
+                found[digest] = np.frombuffer(blob, dtype=np.float16)
+        return found
+
+    def put_many(self, model_name: str, vectors: dict[str, Any]) -> None:
+        np = self.numpy
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO vectors (model, content_hash, vector) VALUES (?, ?, ?)",
+                (
+                    (model_name, digest, np.asarray(vector, dtype=np.float16).tobytes())
+                    for digest, vector in vectors.items()
+                ),
+            )
+
+
+def embed_chunks(
+    backend: EmbeddingBackend,
+    chunks: Sequence[Chunk],
+    *,
+    cache: EmbeddingCache | None = None,
+) -> Any:
+    """Embed chunks, reusing cached vectors for text that has been seen before."""
+
+    np = require_numpy()
+    matrix = np.zeros((len(chunks), backend.dimension), dtype=np.float16)
+    if not chunks:
+        return matrix
+
+    hashes = [chunk.content_hash for chunk in chunks]
+    cached = cache.get_many(backend.model_name, hashes) if cache is not None else {}
+    missing: dict[str, str] = {}
+    for chunk in chunks:
+        if chunk.content_hash not in cached and chunk.content_hash not in missing:
+            missing[chunk.content_hash] = chunk.text
+
+    if missing:
+        fresh = backend.embed_texts(list(missing.values()))
+        computed = dict(zip(missing.keys(), fresh))
+        if cache is not None:
+            cache.put_many(backend.model_name, computed)
+        cached.update(computed)
+
+    for row, digest in enumerate(hashes):
+        matrix[row] = cached[digest]
+    return matrix
+
+
+def embed_query(backend: EmbeddingBackend, query: str, *, cache: EmbeddingCache | None = None) -> Any:
+    """Embed a search query, cached like chunk text."""
+
+    digest = "query:" + content_hash(query)
+    if cache is not None:
+        cached = cache.get_many(backend.model_name, [digest])
+        if digest in cached:
+            return cached[digest]
+    vector = backend.embed_query(query)
+    if cache is not None:
+        cache.put_many(backend.model_name, {digest: vector})
+    return vector
+
+
+def build_embedding_backend(config: LilbotConfig) -> EmbeddingBackend:
+    """Build the configured local embedding backend."""
+
+    return HuggingFaceEmbeddingBackend(
+        config.embedding_model,
+        batch_size=config.embedding_batch_size,
+    )
@@ -0,0 +1,111 @@
+"""Cheap change detection for the retrieval index.
+
+Inside a git work tree, tracked files are fingerprinted by the blob id already
+stored in the git index (``git ls-files -s``), so no file is read or hashed.
+Files git reports as modified or untracked fall back to an ``mtime+size``
+fingerprint, as does every file outside a git repository. Comparing these
+fingerprints with the ones stored in the index tells a refresh exactly which
+files to re-chunk.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Collection
+from dataclasses import dataclass
+import os
+from pathlib import Path
+
+from lilbot.config import LilbotConfig
+from lilbot.retrieval.chunking import SKIPPED_CHUNK_SUFFIXES
+from lilbot.tools.filesystem import in_ignored_directory, list_workspace_files
+from lilbot.utils.git import run_git
+
+
+GIT_SUBMODULE_MODE = "160000"
+
+
+@dataclass(frozen=True)
+class FingerprintScan:
+    """Fingerprints for every indexable workspace file, keyed by relative path."""
+
+    source: str
+    files: dict[str, str]
+
+
+def scan_workspace(
+    config: LilbotConfig,
+    *,
+    skipped_suffixes: Collection[str] = SKIPPED_CHUNK_SUFFIXES,
+) -> FingerprintScan:
+    """Fingerprint the workspace using git when possible, else a stat walk."""
+
+    files = _git_fingerprints(config, skipped_suffixes)
+    if files is not None:
+        return FingerprintScan(source="git", files=files)
+    return FingerprintScan(source="stat", files=_stat_fingerprints(config, skipped_suffixes))
+
+
+def stat_fingerprint(path: Path) -> str | None:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return f"stat:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def is_indexable_path(
+    config: LilbotConfig,
+    relative: str,
+    skipped_suffixes: Collection[str] = SKIPPED_CHUNK_SUFFIXES,
+) -> bool:
+    """Apply the workspace walker's directory and suffix filters to a relative path."""
+
+    directory, _, filename = relative.rpartition("/")
+    if in_ignored_directory(config, directory):
+        return False
+    # Checking the suffix on the string avoids building a Path per file.
+    return os.path.splitext(filename)[1].lower() not in skipped_suffixes
+
+
+def _stat_fingerprints(config: LilbotConfig, skipped_suffixes: Collection[str]) -> dict[str, str]:
+    # The walk already statted every file; reuse that instead of statting again.
+    return {
+        item.relative: f"stat:{item.mtime_ns}:{item.size}"
+        for item in list_workspace_files(config, config.workspace_root).files
+        # Checking the suffix on the string avoids building a Path per file.
+        if os.path.splitext(item.relative)[1].lower() not in skipped_suffixes
+    }
+
+
+def _git_fingerprints(config: LilbotConfig, skipped_suffixes: Collection[str]) -> dict[str, str] | None:
+    root = config.workspace_root
+    staged = run_git(root, "ls-files", "-s", "-z")
+    if staged is None:
+        return None
+    # Modified and untracked files have no trustworthy blob id; stat them instead.
+    dirty = run_git(root, "ls-files", "-z", "-m", "-o", "--exclude-standard")
+    if dirty is None:
+        return None
+
+    files: dict[str, str] = {}
+    for entry in staged.split("\0"):
+        if not entry:
+            continue
+        meta, _, relative = entry.partition("\t")
+        mode, blob, _stage = meta.split(" ", 2)
+        if mode == GIT_SUBMODULE_MODE or not is_indexable_path(config, relative, skipped_suffixes):
+            continue
+        # Conflicted files appear once per stage; any of the ids marks a change.
+        files[relative] = f"git:{blob}"
+
+    for relative in dirty.split("\0"):
+        if not relative or not is_indexable_path(config, relative, skipped_suffixes):
+            continue
+        fingerprint = stat_fingerprint(root / relative)
+        if fingerprint is None or not (root / relative).is_file():
+            # `ls-files -m` also lists tracked files deleted from the work tree.
+            files.pop(relative, None)
+            continue
+        files[relative] = fingerprint
+    return files
+
@@ -1,7 +1,310 @@
-"""Indexing hooks for future retrieval support.
+"""Memory-mapped vector index for repository chunks.
 
-TODO:
-- build a lightweight local index for repository chunks
-- support semantic retrieval over code, docs, and logs
-- keep the indexing layer optional so the core CLI stays simple
+An index directory holds:
+
+- ``vectors.f16``: a contiguous row-major float16 matrix, memory-mapped on open
+- ``tombstones.u8``: one byte per row, non-zero once the row is deleted
+- ``chunks.sqlite3``: the metadata table (path, line range, kind, name, hash)
+- ``index.json``: dimension, embedding model, and the committed row count
+
+Opening an index maps the files without reading them, so load time does not
+grow with the repository. Appends write new rows at the end and deletes only
+flip tombstone bytes; ``compact`` rewrites the files without dead rows.
 """
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+import json
+import os
+from pathlib import Path
+import sqlite3
+from typing import Any
+
+from lilbot.retrieval.chunking import Chunk
+from lilbot.retrieval.embeddings import require_numpy
+
+
+INDEX_FORMAT_VERSION = 1
+VECTORS_FILENAME = "vectors.f16"
+TOMBSTONES_FILENAME = "tombstones.u8"
+METADATA_FILENAME = "chunks.sqlite3"
+HEADER_FILENAME = "index.json"
+SEARCH_BLOCK_ROWS = 65536
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    """One scored chunk returned by an index search."""
+
+    row: int
+    score: float
+    path: str
+    start_line: int
+    end_line: int
+    kind: str
+    name: str | None
+    content_hash: str
+
+    @property
+    def chunk_id(self) -> str:
+        return f"{self.path}:{self.start_line}-{self.end_line}"
+
+
+class VectorIndex:
+    """Append-only float16 vector matrix with tombstone deletes."""
+
+    def __init__(self, directory: str | Path, *, dimension: int | None = None, model_name: str = "") -> None:
+        self.numpy = require_numpy()
+        self.directory = Path(directory).expanduser()
+        header_path = self.directory / HEADER_FILENAME
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            if header_path.exists():
+                header = json.loads(header_path.read_text(encoding="utf-8"))
+            else:
+                if not dimension:
+                    raise RuntimeError(f"No vector index exists at {self.directory}.")
+                header = {
+                    "version": INDEX_FORMAT_VERSION,
+                    "dimension": int(dimension),
+                    "model": model_name,
+                    "rows": 0,
+                }
+            self._metadata = sqlite3.connect(str(self.directory / METADATA_FILENAME))
+            with self._metadata:
+                self._metadata.execute(
+                    "CREATE TABLE IF NOT EXISTS chunks ("
+                    "row INTEGER PRIMARY KEY, path TEXT NOT NULL, start_line INTEGER NOT NULL, "
+                    "end_line INTEGER NOT NULL, kind TEXT NOT NULL, name TEXT, content_hash TEXT NOT NULL)"
+                )
+                self._metadata.execute("CREATE INDEX IF NOT EXISTS chunks_path ON chunks (path)")
+        except (OSError, ValueError, sqlite3.Error) as exc:
+            raise RuntimeError(f"Could not open the vector index at {self.directory}: {exc}") from exc
+
+        if int(header.get("version", 0)) != INDEX_FORMAT_VERSION:
+            raise RuntimeError(f"The vector index at {self.directory} uses an unsupported format; rebuild it.")
+        if dimension and int(header["dimension"]) != int(dimension):
+            raise RuntimeError(
+                f"The vector index at {self.directory} has dimension {header['dimension']}, "
+                f"not {dimension}; rebuild it."
+            )
+        self.dimension = int(header["dimension"])
+        self.model_name = str(header.get("model") or model_name)
+        self.rows = int(header.get("rows", 0))
+        self._write_header()
+        self._map_files()
+
+    def __enter__(self) -> "VectorIndex":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    @classmethod
+    def exists(cls, directory: str | Path) -> bool:
+        return (Path(directory).expanduser() / HEADER_FILENAME).exists()
+
+    @property
+    def live_rows(self) -> int:
+        return self.rows - int(self._tombstones.sum()) if self.rows else 0
+
+    def close(self) -> None:
+        self._matrix = None
+        self._tombstones = None
+        self._metadata.close()
+
+    def append(self, chunks: Sequence[Chunk], vectors: Any) -> list[int]:
+        """Add chunk vectors at the end of the matrix and return their row ids."""
+
+        np = self.numpy
+        matrix = np.ascontiguousarray(vectors, dtype=np.float16)
+        if matrix.ndim != 2 or matrix.shape != (len(chunks), self.dimension):
+            raise ValueError(
+                f"Expected vectors of shape ({len(chunks)}, {self.dimension}), got {tuple(matrix.shape)}."
+            )
+        if not chunks:
+            return []
+
+        first_row = self.rows
+        row_bytes = self.dimension * 2
+        self._matrix = None
+        self._tombstones = None
+        # Drop any rows a crashed writer left past the committed count.
+        with self._vectors_path.open("r+b" if self._vectors_path.exists() else "wb") as handle:
+            handle.truncate(first_row * row_bytes)
+            handle.seek(first_row * row_bytes)
+            handle.write(matrix.tobytes())
+        with self._tombstones_path.open("r+b" if self._tombstones_path.exists() else "wb") as handle:
+            handle.truncate(first_row)
+            handle.seek(first_row)
+            handle.write(bytes(len(chunks)))
+
+        rows = list(range(first_row, first_row + len(chunks)))
+        with self._metadata:
+            self._metadata.execute("DELETE FROM chunks WHERE row >= ?", (first_row,))
+            self._metadata.executemany(
+                "INSERT INTO chunks (row, path, start_line, end_line, kind, name, content_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (row, chunk.path, chunk.start_line, chunk.end_line, chunk.kind, chunk.name, chunk.content_hash)
+                    for row, chunk in zip(rows, chunks)
+                ),
+            )
+        self.rows = first_row + len(chunks)
+        self._write_header()
+        self._map_files()
+        return rows
+
+    def delete_paths(self, paths: Iterable[str]) -> int:
+        """Tombstone every row that belongs to one of ``paths``."""
+
+        rows: list[int] = []
+        for path in paths:
+            rows.extend(
+                row
+                for (row,) in self._metadata.execute("SELECT row FROM chunks WHERE path = ?", (path,))
+            )
+        return self.delete_rows(rows)
+
+    def delete_rows(self, rows: Iterable[int]) -> int:
+        targets = sorted({int(row) for row in rows if 0 <= int(row) < self.rows})
+        if not targets:
+            return 0
+        self._tombstones = None
+        with self._tombstones_path.open("r+b") as handle:
+            for row in targets:
+                handle.seek(row)
+                handle.write(b"\x01")
+        with self._metadata:
+            self._metadata.executemany("DELETE FROM chunks WHERE row = ?", ((row,) for row in targets))
+        self._map_files()
+        return len(targets)
+
+    def indexed_paths(self) -> set[str]:
+        return {path for (path,) in self._metadata.execute("SELECT DISTINCT path FROM chunks")}
+
+    def search(self, query_vector: Any, *, k: int = 10, path_prefix: str | None = None) -> list[SearchHit]:
+        """Return the ``k`` best live rows by inner product with the query."""
+
+        np = self.numpy
+        if not self.rows or k <= 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+        if query.shape[0] != self.dimension:
+            raise ValueError(f"Query has dimension {query.shape[0]}, index has {self.dimension}.")
+
+        scores = np.empty(self.rows, dtype=np.float32)
+        # float16 has no BLAS path, so score in float32 blocks to bound the temporary copy.
+        for start in range(0, self.rows, SEARCH_BLOCK_ROWS):
+            block = self._matrix[start : start + SEARCH_BLOCK_ROWS]
+            scores[start : start + len(block)] = block.astype(np.float32) @ query
+        scores[self._tombstones.astype(bool)] = -np.inf
+        prefix = (path_prefix or "").strip().strip("/")
+        if prefix and prefix != ".":
+            allowed = np.zeros(self.rows, dtype=bool)
+            for (row,) in self._metadata.execute(
+                "SELECT row FROM chunks WHERE path = ? OR substr(path, 1, ?) = ?",
+                (prefix, len(prefix) + 1, prefix + "/"),
+            ):
+                allowed[row] = True
+            scores[~allowed] = -np.inf
+
+        count = min(k, self.rows)
+        candidates = np.argpartition(-scores, count - 1)[:count]
+        ordered = candidates[np.argsort(-scores[candidates], kind="stable")]
+        rows = [int(row) for row in ordered if np.isfinite(scores[row])]
+        return self._hits(rows, scores)
+
+    def compact(self) -> None:
+        """Rewrite the index without tombstoned rows."""
+
+        np = self.numpy
+        live = np.flatnonzero(self._tombstones == 0) if self.rows else np.zeros(0, dtype=np.int64)
+        if len(live) == self.rows:
+            return
+        vectors = np.array(self._matrix[live]) if len(live) else np.zeros((0, self.dimension), dtype=np.float16)
+        records = {
+            row: record
+            for row, *record in self._metadata.execute(
+                "SELECT row, path, start_line, end_line, kind, name, content_hash FROM chunks"
+            )
+        }
+        self._matrix = None
+        self._tombstones = None
+        temporary = self._vectors_path.with_suffix(".tmp")
+        temporary.write_bytes(vectors.tobytes())
+        os.replace(temporary, self._vectors_path)
+        self._tombstones_path.write_bytes(bytes(len(live)))
+        with self._metadata:
+            self._metadata.execute("DELETE FROM chunks")
+            self._metadata.executemany(
+                "INSERT INTO chunks (row, path, start_line, end_line, kind, name, content_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((new_row, *records[int(old_row)]) for new_row, old_row in enumerate(live)),
+            )
+        self.rows = len(live)
+        self._write_header()
+        self._map_files()
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.directory / VECTORS_FILENAME
+
+    @property
+    def _tombstones_path(self) -> Path:
+        return self.directory / TOMBSTONES_FILENAME
+
+    def _hits(self, rows: list[int], scores: Any) -> list[SearchHit]:
+        if not rows:
+            return []
+        placeholders = ", ".join("?" for _ in rows)
+        records = {
+            row: record
+            for row, *record in self._metadata.execute(
+                "SELECT row, path, start_line, end_line, kind, name, content_hash "
+                f"FROM chunks WHERE row IN ({placeholders})",
+                rows,
+            )
+        }
+        hits = []
+        for row in rows:
+            record = records.get(row)
+            if record is None:
+                continue
+            path, start_line, end_line, kind, name, digest = record
+            hits.append(
+                SearchHit(
+                    row=row,
+                    score=float(scores[row]),
+                    path=path,
+                    start_line=start_line,
+                    end_line=end_line,
+                    kind=kind,
+                    name=name,
+                    content_hash=digest,
+                )
+            )
+        return hits
+
+    def _map_files(self) -> None:
+        np = self.numpy
+        if not self.rows:
+            self._matrix = np.zeros((0, self.dimension), dtype=np.float16)
+            self._tombstones = np.zeros(0, dtype=np.uint8)
+            return
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float16, mode="r", shape=(self.rows, self.dimension))
+        self._tombstones = np.memmap(self._tombstones_path, dtype=np.uint8, mode="r", shape=(self.rows,))
+
+    def _write_header(self) -> None:
+        header = {
+            "version": INDEX_FORMAT_VERSION,
+            "dimension": self.dimension,
+            "model": self.model_name,
+            "rows": self.rows,
+        }
+        path = self.directory / HEADER_FILENAME
+        temporary = path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(header), encoding="utf-8")
+        os.replace(temporary, path)
@@ -0,0 +1,322 @@
+"""Persistent BM25 index for exact identifier and text search.
+
+Documents are repository chunks. Text is split into identifier-aware terms:
+``parseHTTPResponse`` indexes as ``parsehttpresponse``, ``parse``, ``http``, and
+``response``, so both the exact symbol and its parts match. Postings live in
+SQLite keyed by integer term and document ids, and are replaced one file at a
+time, so keeping the index current costs work proportional to the change.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+import math
+from pathlib import Path
+import re
+import sqlite3
+
+from lilbot.retrieval.chunking import Chunk
+from lilbot.retrieval.index import SearchHit
+
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 64
+COMMON_TERM_FRACTION = 0.25
+COMMON_TERM_MIN_DOCS = 1000
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|[0-9]+")
+CAMEL_CASE_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    fingerprint TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL,
+    start_line INTEGER NOT NULL,
+    end_line INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT,
+    content_hash TEXT NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS docs_file ON docs (file_id);
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    term TEXT NOT NULL UNIQUE,
+    df INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term_id INTEGER NOT NULL,
+    doc_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term_id, doc_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+CREATE TABLE IF NOT EXISTS stats (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase identifier-aware terms."""
+
+    terms: list[str] = []
+    for match in IDENTIFIER_PATTERN.finditer(text):
+        word = match.group(0)
+        if "_" not in word and (word.islower() or word.isupper() or word.isdigit()):
+            # Plain words have no sub-tokens; skip the splitting work.
+            if MIN_TERM_LENGTH <= len(word) <= MAX_TERM_LENGTH:
+                terms.append(word.lower())
+            continue
+        parts = [part for part in word.split("_") if part]
+        pieces: list[str] = []
+        for part in parts:
+            pieces.extend(CAMEL_CASE_PATTERN.findall(part) or [part])
+        lowered = word.lower().strip("_")
+        if MIN_TERM_LENGTH <= len(lowered) <= MAX_TERM_LENGTH:
+            terms.append(lowered)
+        if len(pieces) > 1:
+            terms.extend(
+                piece.lower()
+                for piece in pieces
+                if MIN_TERM_LENGTH <= len(piece) <= MAX_TERM_LENGTH
+            )
+    return terms
+
+
+class LexicalIndex:
+    """BM25 postings for repository chunks, stored in one SQLite file."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path).expanduser()
+        self._bulk_depth = 0
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(self.path))
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            self._connection.execute("PRAGMA synchronous = NORMAL")
+            with self._connection:
+                self._connection.executescript(_SCHEMA)
+        except (OSError, sqlite3.Error) as exc:
+            raise RuntimeError(f"Could not open the lexical index at {self.path}: {exc}") from exc
+
+    def __enter__(self) -> "LexicalIndex":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    @contextmanager
+    def bulk(self) -> Iterator["LexicalIndex"]:
+        """Group many file updates into one transaction."""
+
+        self._bulk_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._bulk_depth -= 1
+            if not self._bulk_depth:
+                self._connection.rollback()
+            raise
+        self._bulk_depth -= 1
+        self._commit()
+
+    @property
+    def doc_count(self) -> int:
+        return self._stat("doc_count")
+
+    @property
+    def file_count(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def file_fingerprints(self) -> dict[str, str]:
+        return dict(self._connection.execute("SELECT path, fingerprint FROM files"))
+
+    def update_file(self, path: str, chunks: Iterable[Chunk], *, fingerprint: str = "") -> int:
+        """Replace every document for ``path`` with ``chunks``; return the new document count."""
+
+        self._delete_file_docs(path)
+        self._connection.execute(
+            "INSERT INTO files (path, fingerprint) VALUES (?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET fingerprint = excluded.fingerprint",
+            (path, fingerprint),
+        )
+        file_id = self._connection.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()[0]
+
+        added_docs = 0
+        added_length = 0
+        document_frequency: Counter[int] = Counter()
+        for chunk in chunks:
+            # The path and symbol name make file and definition names searchable.
+            counts = Counter(tokenize(f"{chunk.path} {chunk.name or ''}\n{chunk.text}"))
+            if not counts:
+                continue
+            length = sum(counts.values())
+            doc_id = self._connection.execute(
+                "INSERT INTO docs (file_id, start_line, end_line, kind, name, content_hash, length) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (file_id, chunk.start_line, chunk.end_line, chunk.kind, chunk.name, chunk.content_hash, length),
+            ).lastrowid
+            term_ids = self._term_ids(counts.keys())
+            self._connection.executemany(
+                "INSERT INTO postings (term_id, doc_id, tf) VALUES (?, ?, ?)",
+                ((term_ids[term], doc_id, tf) for term, tf in counts.items()),
+            )
+            document_frequency.update(term_ids.values())
+            added_docs += 1
+            added_length += length
+
+        self._connection.executemany(
+            "UPDATE terms SET df = df + ? WHERE id = ?",
+            ((count, term_id) for term_id, count in document_frequency.items()),
+        )
+
+        self._bump_stat("doc_count", added_docs)
+        self._bump_stat("total_length", added_length)
+        self._commit()
+        return added_docs
+
+    def remove_file(self, path: str) -> None:
+        self._delete_file_docs(path)
+        self._connection.execute("DELETE FROM files WHERE path = ?", (path,))
+        self._commit()
+
+    def search(self, query: str, *, k: int = 10, path_prefix: str | None = None) -> list[SearchHit]:
+        """Return the ``k`` best chunks for ``query`` by BM25 score."""
+
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        doc_count = self.doc_count
+        if not query_terms or not doc_count or k <= 0:
+            return []
+        average_length = max(1.0, self._stat("total_length") / doc_count)
+
+        placeholders = ", ".join("?" for _ in query_terms)
+        known = self._connection.execute(
+            f"SELECT id, df FROM terms WHERE term IN ({placeholders}) AND df > 0 ORDER BY df",
+            query_terms,
+        ).fetchall()
+        if not known:
+            return []
+        # Very common terms add little to BM25 but dominate the postings read; skip
+        # them whenever a rarer term can carry the query.
+        common_df = max(COMMON_TERM_MIN_DOCS, doc_count * COMMON_TERM_FRACTION)
+        rare = [(term_id, df) for term_id, df in known if df <= common_df]
+        selected = rare or known[:1]
+
+        scores: dict[int, float] = {}
+        for term_id, df in selected:
+            idf = math.log(1.0 + (doc_count - df + 0.5) / (df + 0.5))
+            for doc_id, tf, length in self._connection.execute(
+                "SELECT postings.doc_id, postings.tf, docs.length FROM postings "
+                "JOIN docs ON docs.id = postings.doc_id WHERE postings.term_id = ?",
+                (term_id,),
+            ):
+                norm = tf + BM25_K1 * (1.0 - BM25_B + BM25_B * length / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1.0) / norm
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        prefix = (path_prefix or "").strip().strip("/")
+        hits: list[SearchHit] = []
+        for offset in range(0, len(ranked), max(k, 32)):
+            window = ranked[offset : offset + max(k, 32)]
+            for hit in self._hits(window):
+                if prefix and prefix != "." and not (hit.path == prefix or hit.path.startswith(prefix + "/")):
+                    continue
+                hits.append(hit)
+                if len(hits) >= k:
+                    return hits
+        return hits
+
+    def _hits(self, ranked: list[tuple[int, float]]) -> list[SearchHit]:
+        placeholders = ", ".join("?" for _ in ranked)
+        records = {
+            doc_id: record
+            for doc_id, *record in self._connection.execute(
+                "SELECT docs.id, files.path, docs.start_line, docs.end_line, docs.kind, docs.name, "
+                f"docs.content_hash FROM docs JOIN files ON files.id = docs.file_id WHERE docs.id IN ({placeholders})",
+                [doc_id for doc_id, _ in ranked],
+            )
+        }
+        hits = []
+        for doc_id, score in ranked:
+            record = records.get(doc_id)
+            if record is None:
+                continue
+            path, start_line, end_line, kind, name, digest = record
+            hits.append(
+                SearchHit(
+                    row=doc_id,
+                    score=score,
+                    path=path,
+                    start_line=start_line,
+                    end_line=end_line,
+                    kind=kind,
+                    name=name,
+                    content_hash=digest,
+                )
+            )
+        return hits
+
+    def _delete_file_docs(self, path: str) -> None:
+        row = self._connection.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return
+        doc_rows = self._connection.execute(
+            "SELECT id, length FROM docs WHERE file_id = ?",
+            (row[0],),
+        ).fetchall()
+        for doc_id, _ in doc_rows:
+            self._connection.execute(
+                "UPDATE terms SET df = df - 1 WHERE id IN (SELECT term_id FROM postings WHERE doc_id = ?)",
+                (doc_id,),
+            )
+            self._connection.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+        self._connection.execute("DELETE FROM docs WHERE file_id = ?", (row[0],))
+        self._bump_stat("doc_count", -len(doc_rows))
+        self._bump_stat("total_length", -sum(length for _, length in doc_rows))
+
+    def _term_ids(self, terms: Iterable[str]) -> dict[str, int]:
+        wanted = list(terms)
+        self._connection.executemany(
+            "INSERT OR IGNORE INTO terms (term, df) VALUES (?, 0)",
+            ((term,) for term in wanted),
+        )
+        ids: dict[str, int] = {}
+        for offset in range(0, len(wanted), 500):
+            batch = wanted[offset : offset + 500]
+            placeholders = ", ".join("?" for _ in batch)
+            ids.update(
+                self._connection.execute(
+                    f"SELECT term, id FROM terms WHERE term IN ({placeholders})",
+                    batch,
+                )
+            )
+        return ids
+
+    def _stat(self, key: str) -> int:
+        row = self._connection.execute("SELECT value FROM stats WHERE key = ?", (key,)).fetchone()
+        return int(row[0]) if row else 0
+
+    def _bump_stat(self, key: str, delta: int) -> None:
+        if not delta:
+            return
+        self._connection.execute(
+            "INSERT INTO stats (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+            (key, delta),
+        )
+
+    def _commit(self) -> None:
+        if not self._bulk_depth:
+            self._connection.commit()
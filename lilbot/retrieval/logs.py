@@ -0,0 +1,289 @@
+"""Streaming time-window chunker for log files.
+
+Lines are grouped into events: a line with a ``TIMESTAMP_PREFIX_PATTERN``
+prefix starts an event, and lines without one (tracebacks, indented
+continuations, wrapped messages) stay with the event before them. Events are
+grouped into chunks that cover at most ``window_seconds`` of log time and stay
+near ``max_chunk_chars``; a chunk only breaks inside an event when that event
+alone is too large.
+
+Files are read as bytes one line at a time, so memory is bounded by one chunk.
+Every chunk records its byte range and first and last timestamp.
+``seek_log_time`` bisects on byte offsets to find where a time range starts,
+so a window in the middle of a huge log can be read without scanning from
+the top. The line number at that offset comes from the cached per-block
+newline counts ``read_file`` keeps (``lilbot.tools.filesystem.line_index``),
+so only the first seek into a given version of a file counts its lines.
+
+Syslog-style stamps carry no year, so they are dated with the year of the
+file's modification time. A log that spans a New Year is therefore
+mis-dated: its December lines are placed in the following year, after the
+January ones, and time-range reads across the boundary come out wrong.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import os
+from pathlib import Path
+import re
+from typing import BinaryIO
+
+from lilbot.retrieval.chunking import DEFAULT_MAX_CHUNK_CHARS, MIN_SPLIT_FRACTION, Chunk, content_hash
+from lilbot.tools.filesystem import line_index
+from lilbot.tools.logs import TIMESTAMP_PREFIX_PATTERN
+
+
+DEFAULT_LOG_WINDOW_SECONDS = 300
+LOG_FILE_PATTERN = re.compile(r"\.log(?:\.\d+)?$", re.IGNORECASE)
+CONTINUATION_PATTERN = re.compile(r"^(?:\s|Traceback \(|Caused by\b|During handling\b)")
+SEEK_LINEAR_BYTES = 64 * 1024
+MONTHS = {
+    name: number
+    for number, name in enumerate(
+        ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"),
+        start=1,
+    )
+}
+
+
+@dataclass(frozen=True, slots=True)
+class LogChunk:
+    """A run of whole log events with its line, byte, and time range."""
+
+    path: str
+    start_line: int
+    end_line: int
+    start_offset: int
+    end_offset: int
+    start_time: datetime | None
+    end_time: datetime | None
+    event_count: int
+    text: str
+    content_hash: str
+
+    @property
+    def time_label(self) -> str | None:
+        if self.start_time is None:
+            return None
+        start = self.start_time.strftime("%Y-%m-%d %H:%M:%S")
+        end_time = self.end_time or self.start_time
+        if end_time.date() == self.start_time.date():
+            return f"{start}..{end_time:%H:%M:%S}"
+        return f"{start}..{end_time:%Y-%m-%d %H:%M:%S}"
+
+    def as_chunk(self) -> Chunk:
+        return Chunk(
+            path=self.path,
+            start_line=self.start_line,
+            end_line=self.end_line,
+            kind="log",
+            name=self.time_label,
+            text=self.text,
+            content_hash=self.content_hash,
+        )
+
+
+def is_log_file(path: Path) -> bool:
+    return bool(LOG_FILE_PATTERN.search(path.name))
+
+
+def parse_log_timestamp(line: str, *, year: int | None = None) -> datetime | None:
+    """Parse the timestamp prefix of a log line, if it has one.
+
+    Syslog-style stamps carry no year; ``year`` fills it in (default: this year).
+    """
+
+    match = TIMESTAMP_PREFIX_PATTERN.match(line)
+    if match is None:
+        return None
+    stamp = match.group(0).strip()
+    # The pattern fixes every field's position, so slice instead of strptime (~10x faster).
+    try:
+        if stamp[0].isdigit():
+            fraction = stamp[20:].lstrip(".")
+            return datetime(
+                int(stamp[0:4]),
+                int(stamp[5:7]),
+                int(stamp[8:10]),
+                int(stamp[11:13]),
+                int(stamp[14:16]),
+                int(stamp[17:19]),
+                int(fraction[:6].ljust(6, "0")) if fraction else 0,
+            )
+        month_name, day, clock = stamp.split()
+        return datetime(
+            year or datetime.now().year,
+            MONTHS[month_name],
+            int(day),
+            int(clock[0:2]),
+            int(clock[3:5]),
+            int(clock[6:8]),
+        )
+    except (KeyError, ValueError):
+        return None
+
+
+def iter_log_chunks(
+    path: Path,
+    relative: str,
+    *,
+    window_seconds: float = DEFAULT_LOG_WINDOW_SECONDS,
+    max_chunk_chars: int = DEFAULT_MAX_CHUNK_CHARS,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> Iterator[LogChunk]:
+    """Stream time-window chunks from a log file, optionally limited to a time range.
+
+    Syslog stamps take the year of the file's modification time (see the
+    module docstring for what that means for logs spanning a New Year).
+    """
+
+    year = datetime.fromtimestamp(path.stat().st_mtime).year
+    with path.open("rb") as handle:
+        offset = seek_log_time(handle, since, year=year) if since is not None else 0
+        start_line = _line_number_at(path, handle, offset)
+        handle.seek(offset)
+        for chunk in chunk_log_lines(
+            handle,
+            relative,
+            window_seconds=window_seconds,
+            max_chunk_chars=max_chunk_chars,
+            start_offset=offset,
+            start_line=start_line,
+            year=year,
+        ):
+            if until is not None and chunk.start_time is not None and chunk.start_time > until:
+                return
+            yield chunk
+
+
+def chunk_log_lines(
+    lines: Iterable[bytes],
+    relative: str,
+    *,
+    window_seconds: float = DEFAULT_LOG_WINDOW_SECONDS,
+    max_chunk_chars: int = DEFAULT_MAX_CHUNK_CHARS,
+    start_offset: int = 0,
+    start_line: int = 1,
+    year: int | None = None,
+) -> Iterator[LogChunk]:
+    """Group raw log lines into event-aligned chunks."""
+
+    window = timedelta(seconds=window_seconds)
+    min_split_chars = int(max_chunk_chars * MIN_SPLIT_FRACTION)
+    buffer: list[str] = []
+    buffered_chars = 0
+    chunk_line = start_line
+    chunk_offset = start_offset
+    chunk_start: datetime | None = None
+    chunk_end: datetime | None = None
+    events = 0
+    seen_timestamp = False
+    line_number = start_line - 1
+    offset = start_offset
+
+    def flush() -> LogChunk:
+        text = "".join(buffer).rstrip()
+        return LogChunk(
+            path=relative,
+            start_line=chunk_line,
+            end_line=line_number,
+            start_offset=chunk_offset,
+            end_offset=offset,
+            start_time=chunk_start,
+            end_time=chunk_end,
+            event_count=events,
+            text=text,
+            content_hash=content_hash(text),
+        )
+
+    for raw in lines:
+        line = raw.decode("utf-8", errors="replace")
+        if len(line) > max_chunk_chars:
+            line = line[:max_chunk_chars] + "\n"
+        stamp = parse_log_timestamp(line, year=year)
+        starts_event = stamp is not None or (not seen_timestamp and not CONTINUATION_PATTERN.match(line))
+        seen_timestamp = seen_timestamp or stamp is not None
+
+        if buffer:
+            window_full = stamp is not None and chunk_start is not None and stamp - chunk_start >= window
+            if (starts_event and (window_full or buffered_chars >= min_split_chars)) or (
+                buffered_chars + len(line) > max_chunk_chars
+            ):
+                yield flush()
+                buffer, buffered_chars, events = [], 0, 0
+                chunk_line, chunk_offset = line_number + 1, offset
+                chunk_start = chunk_end = None
+
+        line_number += 1
+        offset += len(raw)
+        if not buffer and not line.strip():
+            chunk_line, chunk_offset = line_number + 1, offset
+            continue
+        buffer.append(line)
+        buffered_chars += len(line)
+        events += int(starts_event)
+        if stamp is not None:
+            chunk_start = chunk_start or stamp
+            chunk_end = stamp
+
+    if buffer:
+        yield flush()
+
+
+def seek_log_time(handle: BinaryIO, when: datetime, *, year: int | None = None) -> int:
+    """Return the byte offset of the first line stamped at or after ``when``.
+
+    Assumes timestamps are mostly ascending, as in appended logs; lines
+    without a stamp are skipped while probing, however many there are.
+    """
+
+    handle.seek(0, os.SEEK_END)
+    low, high = 0, handle.tell()
+    while high - low > SEEK_LINEAR_BYTES:
+        middle = (low + high) // 2
+        stamp = _first_timestamp_after(handle, middle, year=year)
+        if stamp is not None and stamp < when:
+            low = middle
+        else:
+            # No stamp between here and EOF means nothing later can match either.
+            high = middle
+
+    position = _align_to_line(handle, low)
+    handle.seek(position)
+    for raw in handle:
+        stamp = parse_log_timestamp(raw.decode("utf-8", errors="replace"), year=year)
+        if stamp is not None and stamp >= when:
+            return position
+        position += len(raw)
+    return position
+
+
+def _first_timestamp_after(handle: BinaryIO, offset: int, *, year: int | None) -> datetime | None:
+    handle.seek(_align_to_line(handle, offset))
+    for raw in handle:
+        stamp = parse_log_timestamp(raw.decode("utf-8", errors="replace"), year=year)
+        if stamp is not None:
+            return stamp
+    return None
+
+
+def _align_to_line(handle: BinaryIO, offset: int) -> int:
+    if offset <= 0:
+        return 0
+    handle.seek(offset - 1)
+    handle.readline()
+    return handle.tell()
+
+
+def _line_number_at(path: Path, handle: BinaryIO, offset: int) -> int:
+    """1-based number of the line starting at ``offset``; reads at most one index block."""
+
+    if offset <= 0:
+        return 1
+    block_start, newlines = line_index(path).block_start(offset)
+    handle.seek(block_start)
+    return newlines + handle.read(offset - block_start).count(b"\n") + 1
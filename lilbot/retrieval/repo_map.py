@@ -0,0 +1,220 @@
+"""Token-budgeted repository map behind ``repo_map``.
+
+The map lists workspace files with their top-level signatures (classes, the
+public methods on them, and public functions), most important file first, cut
+off once it reaches a token budget. Importance is PageRank over a reference
+graph read straight from the symbol index (``lilbot.retrieval.symbols``): a
+file that uses a name defined in another file links to it, weighted by how
+often it uses the name and split across every file defining it. Files many
+others lean on, directly or through other well-used files, rise to the top.
+
+A rendered map is stored in the symbol index under a hash of the
+fingerprints of every file it covered, so asking again for an unchanged tree
+costs one fingerprint scan and one lookup.
+"""
+
+from __future__ import annotations
+
+import ast
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+import hashlib
+import math
+from pathlib import Path
+import re
+
+from lilbot.config import LilbotConfig
+from lilbot.retrieval.symbols import SymbolIndex, normalize_prefix, under_prefix
+from lilbot.tools.function_scan import parse_python, read_source
+from lilbot.utils.formatting import estimate_tokens_from_length
+
+
+# Bump when ranking or rendering changes, so stored maps stop matching.
+REPO_MAP_VERSION = "1"
+RANK_DAMPING = 0.85
+RANK_ITERATIONS = 50
+RANK_TOLERANCE = 1e-6
+# Names defined in more files than this (``run``, ``main``...) say little about dependencies.
+REFERENCE_MAX_DEFINERS = 10
+PRIVATE_REFERENCE_WEIGHT = 0.1
+SIGNATURE_CHARS = 120
+_WRAPPED_OPEN = re.compile(r"([(\[])\s+")
+_WRAPPED_CLOSE = re.compile(r",?\s+([)\]])")
+
+
+@dataclass(frozen=True)
+class RepoMap:
+    """A rendered map and whether it was the stored copy."""
+
+    text: str
+    cached: bool
+
+
+def build_repo_map(config: LilbotConfig, index: SymbolIndex, root: Path, *, max_tokens: int) -> RepoMap:
+    """Render the map for ``root`` from an already refreshed ``index``, reusing a stored copy if current."""
+
+    prefix = normalize_prefix(root.relative_to(config.workspace_root).as_posix())
+    artifact = f"repo_map:{prefix}:{max_tokens}"
+    key = hashlib.sha1(f"{REPO_MAP_VERSION}\0{index.tree_key(path_prefix=prefix)}".encode("utf-8")).hexdigest()
+    cached = index.cached_artifact(artifact, key)
+    if cached is not None:
+        return RepoMap(cached, cached=True)
+
+    files = sorted(path for path in index.file_fingerprints() if under_prefix(path, prefix))
+    ranks = rank_files(files, reference_graph(index, prefix))
+    # Only files with definitions can contribute signatures; the rest are never read.
+    defining = index.defining_paths()
+    ordered = sorted((path for path in files if path in defining), key=lambda path: (-ranks[path], path))
+    rendered = _pack(config, index, root, ordered, len(files), max_tokens)
+    index.store_artifact(artifact, key, rendered)
+    return RepoMap(rendered, cached=False)
+
+
+def reference_graph(index: SymbolIndex, prefix: str = "") -> dict[str, dict[str, float]]:
+    """Edge weights from each referencing file to the files defining the names it uses."""
+
+    rows = [
+        row
+        for row in index.file_references(max_definers=REFERENCE_MAX_DEFINERS)
+        if under_prefix(row[0], prefix) and under_prefix(row[1], prefix)
+    ]
+    definers = Counter(name for name, _ in {(name, defining) for _, defining, name, _ in rows})
+    graph: dict[str, dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    for referencing, defining, name, line_count in rows:
+        weight = math.sqrt(line_count) / definers[name]
+        if name.startswith("_"):
+            weight *= PRIVATE_REFERENCE_WEIGHT
+        graph[referencing][defining] += weight
+    return {source: dict(targets) for source, targets in graph.items()}
+
+
+def rank_files(files: list[str], graph: dict[str, dict[str, float]]) -> dict[str, float]:
+    """Weighted PageRank over ``files``; rank held by files without links is spread evenly."""
+
+    if not files:
+        return {}
+    count = len(files)
+    known = set(files)
+    out_weights = {
+        source: total
+        for source, targets in graph.items()
+        if source in known and (total := sum(weight for target, weight in targets.items() if target in known)) > 0
+    }
+    linked = set(out_weights).union(
+        *({target for target in graph[source] if target in known} for source in out_weights)
+    )
+    # Files with no links in or out all hold the same rank, so they are tracked as one value.
+    isolated = count - len(linked)
+    isolated_rank = 1.0 / count
+    ranks = dict.fromkeys(linked, 1.0 / count)
+    for _ in range(RANK_ITERATIONS):
+        dangling = isolated * isolated_rank + sum(
+            rank for path, rank in ranks.items() if path not in out_weights
+        )
+        base = (1.0 - RANK_DAMPING) / count + RANK_DAMPING * dangling / count
+        updated = dict.fromkeys(linked, base)
+        for source, total in out_weights.items():
+            share = RANK_DAMPING * ranks[source] / total
+            for target, weight in graph[source].items():
+                if target in updated:
+                    updated[target] += share * weight
+        change = isolated * abs(base - isolated_rank) + sum(abs(updated[path] - ranks[path]) for path in linked)
+        ranks, isolated_rank = updated, base
+        if change < RANK_TOLERANCE:
+            break
+    return {path: ranks.get(path, isolated_rank) for path in files}
+
+
+def file_signatures(config: LilbotConfig, index: SymbolIndex, path: str) -> list[str]:
+    """Outline lines for one file, indented as they appear in the map."""
+
+    source = read_source(config.workspace_root / path)
+    if source is None:
+        return []
+    lines = source.splitlines()
+    if path.endswith(".py") and (tree := parse_python(source)) is not None:
+        return _python_signatures(tree, lines)
+    return [
+        f"    {_clip(lines[number - 1].strip())}"
+        for number, _ in index.definition_lines(path)
+        if number <= len(lines)
+    ]
+
+
+def _python_signatures(tree: ast.Module, lines: list[str]) -> list[str]:
+    signatures: list[str] = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and _is_public(node.name):
+            signatures.append(f"    {_signature(node, lines)}")
+        elif isinstance(node, ast.ClassDef) and _is_public(node.name):
+            signatures.append(f"    {_signature(node, lines)}")
+            signatures.extend(
+                f"      {_signature(child, lines)}"
+                for child in node.body
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))
+                and (_is_public(child.name) or child.name == "__init__")
+            )
+    return signatures
+
+
+def _signature(node: ast.FunctionDef | ast.AsyncFunctionDef | ast.ClassDef, lines: list[str]) -> str:
+    # Join a signature wrapped over several lines, stopping at the colon that opens the body.
+    end = node.body[0].lineno if node.body else node.lineno + 1
+    parts: list[str] = []
+    for number in range(node.lineno, max(end, node.lineno + 1)):
+        if number > len(lines):
+            break
+        text = lines[number - 1].strip()
+        parts.append(text)
+        if text.split("#", 1)[0].rstrip().endswith(":"):
+            break
+    joined = _WRAPPED_CLOSE.sub(r"\1", _WRAPPED_OPEN.sub(r"\1", " ".join(parts)))
+    return _clip(joined)
+
+
+def _clip(text: str) -> str:
+    return text if len(text) <= SIGNATURE_CHARS else text[: SIGNATURE_CHARS - 3].rstrip() + "..."
+
+
+def _is_public(name: str) -> bool:
+    return not name.startswith("_")
+
+
+def _pack(
+    config: LilbotConfig,
+    index: SymbolIndex,
+    root: Path,
+    ordered: list[str],
+    total: int,
+    max_tokens: int,
+) -> str:
+    body: list[str] = []
+    # The count in the header is known only at the end, so reserve room for the widest one.
+    length = len(_header(config, root, total, total)) + len("\n- files:\n")
+    mapped = 0
+    for path in ordered:
+        signatures = file_signatures(config, index, path)
+        if not signatures:
+            continue
+        block = [f"  {path}"]
+        block_length = len(block[0]) + 1
+        for line in signatures:
+            if estimate_tokens_from_length(length + block_length + len(line) + 1) > max_tokens:
+                break
+            block.append(line)
+            block_length += len(line) + 1
+        if len(block) == 1:
+            break
+        body.extend(block)
+        length += block_length
+        mapped += 1
+        if len(block) <= len(signatures):
+            break
+
+    if not body:
+        return f"{_header(config, root, 0, total)}\n- files: none with definitions"
+    return "\n".join([_header(config, root, mapped, total), "- files:", *body])
+
+
+def _header(config: LilbotConfig, root: Path, mapped: int, total: int) -> str:
+    return f"Repository map for {config.display_path(root)} ({mapped} of {total} files, most referenced first):"
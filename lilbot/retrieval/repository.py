@@ -0,0 +1,351 @@
+"""Hybrid lexical and vector retrieval over one workspace.
+
+``RepositoryIndex`` owns the per-workspace BM25 index and, when an embedding
+model is configured, the vector index. Both are built lazily on first search
+and refreshed incrementally: only files whose fingerprints changed (see
+``lilbot.retrieval.fingerprints``) are re-chunked and re-embedded.
+Results from the two are merged with reciprocal rank fusion, so a chunk that
+ranks well in either list surfaces, and one that ranks well in both wins.
+
+A search re-scans the workspace only if the index has not been refreshed in
+this process within ``config.retrieval_refresh_seconds`` (30 s by default), so
+edits made inside that window are not searchable until it passes or ``lilbot
+index update`` runs. Set it to 0 to re-scan on every search. The first search
+(or ``lilbot index``) does the full build; later searches in a run skip the scan.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+import shutil
+import threading
+import time
+
+from lilbot.config import LilbotConfig
+from lilbot.retrieval.chunking import Chunk, chunk_file
+from lilbot.retrieval.embeddings import (
+    EmbeddingBackend,
+    EmbeddingCache,
+    build_embedding_backend,
+    embed_chunks,
+    embed_query,
+)
+from lilbot.retrieval.fingerprints import scan_workspace
+from lilbot.retrieval.index import SearchHit, VectorIndex
+from lilbot.retrieval.lexical import LexicalIndex
+
+
+LEXICAL_INDEX_FILENAME = "lexical.sqlite3"
+VECTOR_INDEX_DIRNAME = "vectors"
+RRF_K = 60
+CANDIDATES_PER_SOURCE = 30
+EMBED_BATCH_CHUNKS = 256
+REFRESH_COMMIT_FILES = 500
+# When each index directory was last refreshed in this process, shared by every
+# RepositoryIndex instance so per-call indexes do not each re-scan the tree.
+# Each directory has its own lock, so a first-time build of one workspace does
+# not hold up searches of another.
+_REFRESHED_AT: dict[Path, float] = {}
+_REFRESH_LOCKS: dict[Path, threading.Lock] = {}
+_REFRESH_LOCKS_GUARD = threading.Lock()
+
+
+@dataclass(frozen=True)
+class RetrievalResult:
+    """A fused search result pointing at a line range of a workspace file."""
+
+    path: str
+    start_line: int
+    end_line: int
+    kind: str
+    name: str | None
+    score: float
+    sources: tuple[str, ...]
+
+    @property
+    def chunk_id(self) -> str:
+        return f"{self.path}:{self.start_line}-{self.end_line}"
+
+
+@dataclass(frozen=True)
+class IndexChanges:
+    """Paths a refresh would add, re-index, or drop."""
+
+    added: list[str]
+    updated: list[str]
+    removed: list[str]
+    unchanged: int
+
+    @property
+    def total(self) -> int:
+        return len(self.added) + len(self.updated) + len(self.removed)
+
+
+@dataclass(frozen=True)
+class IndexStatus:
+    directory: Path
+    source: str
+    files: int
+    chunks: int
+    vector_chunks: int | None
+    changes: IndexChanges
+    seconds: float
+
+
+@dataclass(frozen=True)
+class RefreshResult:
+    source: str
+    changes: IndexChanges
+    files: int
+    chunks: int
+    seconds: float
+
+
+class RepositoryIndex:
+    """Lexical plus optional vector index for the configured workspace."""
+
+    def __init__(
+        self,
+        config: LilbotConfig,
+        *,
+        embedding_backend: EmbeddingBackend | None = None,
+        use_vectors: bool = True,
+    ) -> None:
+        self.config = config
+        self.directory = config.index_dir
+        self.use_vectors = use_vectors
+        self._embedding_backend = embedding_backend
+        self._embedding_error: str | None = None
+        self._lexical: LexicalIndex | None = None
+        self._vectors: VectorIndex | None = None
+        self._embedding_cache: EmbeddingCache | None = None
+
+    @property
+    def lexical(self) -> LexicalIndex:
+        if self._lexical is None:
+            self._lexical = LexicalIndex(self.directory / LEXICAL_INDEX_FILENAME)
+        return self._lexical
+
+    @property
+    def embedding_backend(self) -> EmbeddingBackend | None:
+        return self._resolve_embedding_backend()
+
+    @property
+    def embedding_error(self) -> str | None:
+        return self._embedding_error
+
+    def close(self) -> None:
+        for resource in (self._lexical, self._vectors, self._embedding_cache):
+            if resource is not None:
+                resource.close()
+        self._lexical = None
+        self._vectors = None
+        self._embedding_cache = None
+
+    def status(self) -> IndexStatus:
+        """Report index size and how many files a refresh would touch."""
+
+        started = time.perf_counter()
+        scan = scan_workspace(self.config)
+        changes = diff_fingerprints(self.lexical.file_fingerprints(), scan.files)
+        vectors = self._vector_index()
+        return IndexStatus(
+            directory=self.directory,
+            source=scan.source,
+            files=self.lexical.file_count,
+            chunks=self.lexical.doc_count,
+            vector_chunks=vectors.live_rows if vectors is not None else None,
+            changes=changes,
+            seconds=time.perf_counter() - started,
+        )
+
+    def refresh(self) -> RefreshResult:
+        """Re-chunk and re-embed only the files whose fingerprints changed."""
+
+        started = time.perf_counter()
+        scan = scan_workspace(self.config)
+        known = self.lexical.file_fingerprints()
+        changes = diff_fingerprints(known, scan.files)
+        to_index = [*changes.added, *changes.updated]
+
+        vectors = self._vector_index()
+        to_embed_only: list[str] = []
+        if vectors is not None:
+            stale = [*to_index, *changes.removed]
+            if stale:
+                vectors.delete_paths(stale)
+            if not vectors.live_rows and self.lexical.doc_count:
+                # Embeddings were enabled after the lexical index was built.
+                to_embed_only = [path for path in known if path in scan.files and path not in to_index]
+
+        pending: list[Chunk] = []
+        with self.lexical.bulk():
+            for relative in changes.removed:
+                self.lexical.remove_file(relative)
+        lexical_paths = set(to_index)
+        paths = [*to_index, *to_embed_only]
+        for offset in range(0, len(paths), REFRESH_COMMIT_FILES):
+            # Commit in batches so an interrupted build keeps the files it finished.
+            with self.lexical.bulk():
+                for relative in paths[offset : offset + REFRESH_COMMIT_FILES]:
+                    chunks = list(chunk_file(self.config.workspace_root / relative, relative))
+                    if relative in lexical_paths:
+                        self.lexical.update_file(relative, chunks, fingerprint=scan.files[relative])
+                    if vectors is None:
+                        continue
+                    pending.extend(chunks)
+                    if len(pending) >= EMBED_BATCH_CHUNKS:
+                        self._append_vectors(vectors, pending)
+                        pending = []
+                # Embed the rest of the batch before its fingerprints commit;
+                # otherwise an interrupted build would leave files the lexical
+                # index calls current but the vector index never received.
+                if pending:
+                    self._append_vectors(vectors, pending)
+                    pending = []
+        if vectors is not None and vectors.rows and vectors.live_rows * 2 < vectors.rows:
+            vectors.compact()
+
+        _REFRESHED_AT[self.directory] = time.monotonic()
+        return RefreshResult(
+            source=scan.source,
+            changes=changes,
+            files=self.lexical.file_count,
+            chunks=self.lexical.doc_count,
+            seconds=time.perf_counter() - started,
+        )
+
+    def rebuild(self) -> RefreshResult:
+        """Delete the index for this workspace and build it again."""
+
+        self.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        return self.refresh()
+
+    def search(self, query: str, *, k: int = 5, path_prefix: str | None = None) -> list[RetrievalResult]:
+        """Return fused lexical and vector results for ``query``."""
+
+        self._refresh_if_stale()
+        ranked_lists: dict[str, list[SearchHit]] = {
+            "lexical": self.lexical.search(query, k=CANDIDATES_PER_SOURCE, path_prefix=path_prefix),
+        }
+        vectors = self._vector_index()
+        if vectors is not None and vectors.rows:
+            query_vector = embed_query(self._embedding_backend, query, cache=self._embedding_cache)
+            ranked_lists["vector"] = vectors.search(query_vector, k=CANDIDATES_PER_SOURCE, path_prefix=path_prefix)
+        return fuse_results(ranked_lists, k=k)
+
+    def _refresh_if_stale(self) -> None:
+        with _refresh_lock(self.directory):
+            refreshed_at = _REFRESHED_AT.get(self.directory)
+            if (
+                refreshed_at is not None
+                and time.monotonic() - refreshed_at < self.config.retrieval_refresh_seconds
+            ):
+                return
+            self.refresh()
+
+    def _append_vectors(self, vectors: VectorIndex, chunks: list[Chunk]) -> None:
+        vectors.append(chunks, embed_chunks(self._embedding_backend, chunks, cache=self._embedding_cache))
+
+    def _resolve_embedding_backend(self) -> EmbeddingBackend | None:
+        if not self.use_vectors:
+            return None
+        if self._embedding_backend is not None:
+            return self._embedding_backend
+        if self._embedding_error is not None or not self.config.embedding_model:
+            return None
+        try:
+            self._embedding_backend = build_embedding_backend(self.config)
+        except RuntimeError as exc:
+            self._embedding_error = str(exc)
+            return None
+        return self._embedding_backend
+
+    def _vector_index(self) -> VectorIndex | None:
+        backend = self._resolve_embedding_backend()
+        if backend is None:
+            return None
+        if self._vectors is None:
+            directory = self.directory / VECTOR_INDEX_DIRNAME
+            try:
+                if VectorIndex.exists(directory):
+                    existing = VectorIndex(directory)
+                    outdated = existing.model_name != backend.model_name or existing.dimension != backend.dimension
+                    existing.close()
+                    if outdated:
+                        # Vectors from another model are not comparable; start over.
+                        shutil.rmtree(directory)
+                if self._embedding_cache is None:
+                    self._embedding_cache = EmbeddingCache(self.config.embedding_cache_path)
+                self._vectors = VectorIndex(
+                    directory,
+                    dimension=backend.dimension,
+                    model_name=backend.model_name,
+                )
+            except (OSError, RuntimeError) as exc:
+                self._embedding_error = str(exc)
+                self._embedding_backend = None
+                return None
+        return self._vectors
+
+
+def _refresh_lock(directory: Path) -> threading.Lock:
+    with _REFRESH_LOCKS_GUARD:
+        return _REFRESH_LOCKS.setdefault(directory, threading.Lock())
+
+
+def diff_fingerprints(known: dict[str, str], current: dict[str, str]) -> IndexChanges:
+    """Compare stored fingerprints with a fresh scan, keyed by workspace-relative path."""
+
+    added = sorted(path for path in current if path not in known)
+    updated = sorted(path for path, fingerprint in current.items() if path in known and known[path] != fingerprint)
+    removed = sorted(path for path in known if path not in current)
+    return IndexChanges(
+        added=added,
+        updated=updated,
+        removed=removed,
+        unchanged=len(current) - len(added) - len(updated),
+    )
+
+
+def fuse_results(ranked_lists: dict[str, list[SearchHit]], *, k: int) -> list[RetrievalResult]:
+    """Merge ranked hit lists with reciprocal rank fusion."""
+
+    scores: dict[str, float] = {}
+    hits: dict[str, SearchHit] = {}
+    sources: dict[str, list[str]] = {}
+    for source, ranked in ranked_lists.items():
+        for rank, hit in enumerate(ranked, start=1):
+            scores[hit.chunk_id] = scores.get(hit.chunk_id, 0.0) + 1.0 / (RRF_K + rank)
+            hits.setdefault(hit.chunk_id, hit)
+            sources.setdefault(hit.chunk_id, []).append(source)
+
+    ordered = sorted(scores, key=lambda chunk_id: (-scores[chunk_id], chunk_id))[: max(0, k)]
+    return [
+        RetrievalResult(
+            path=hits[chunk_id].path,
+            start_line=hits[chunk_id].start_line,
+            end_line=hits[chunk_id].end_line,
+            kind=hits[chunk_id].kind,
+            name=hits[chunk_id].name,
+            score=scores[chunk_id],
+            sources=tuple(sources[chunk_id]),
+        )
+        for chunk_id in ordered
+    ]
+
+
+def read_result_lines(config: LilbotConfig, result: RetrievalResult, *, max_lines: int) -> list[str]:
+    """Read the current text of a result's line range, capped at ``max_lines``."""
+
+    path = config.workspace_root / result.path
+    count = max(0, min(result.end_line - result.start_line + 1, max_lines))
+    try:
+        with path.open("r", encoding="utf-8", errors="replace") as handle:
+            return [line.rstrip("\n") for line in islice(handle, result.start_line - 1, result.start_line - 1 + count)]
+    except OSError:
+        return []
+
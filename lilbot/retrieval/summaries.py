@@ -0,0 +1,271 @@
+"""Cached per-directory digests behind ``summarize_repo``.
+
+A repository summary is assembled from one ``DirectoryDigest`` per
+directory: file and extension counts, files per directory, likely entrypoints
+and key-file headlines, all relative to that directory. Each digest is stored
+under a key hashed from its own files' fingerprints (git blob ids, or
+mtime+size outside git; see ``lilbot.retrieval.fingerprints``) and its
+subdirectories' keys, the same way a git tree id covers everything below it.
+Summarizing an unchanged tree is therefore one fingerprint scan and one
+lookup, and after an edit only the directories between the changed file and
+the summarized root are rebuilt; every other subtree is reused as stored.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass, field
+import hashlib
+import json
+from pathlib import Path
+import sqlite3
+
+from lilbot.config import LilbotConfig
+from lilbot.retrieval.fingerprints import scan_workspace
+from lilbot.tools.filesystem import read_text_preview
+from lilbot.tools.repo import IGNORED_REPO_SUFFIXES, IMPORTANT_REPO_FILES, is_likely_entrypoint
+from lilbot.utils.formatting import first_nonempty_line, truncate_text
+
+
+SUMMARY_CACHE_FILENAME = "summaries.sqlite3"
+# Bump when the digest layout or what goes into it changes, so old rows stop matching.
+DIGEST_VERSION = "1"
+DIGEST_ENTRYPOINTS = 5
+DIGEST_KEY_FILES = 4
+KEY_FILE_PREVIEW_CHARS = 300
+KEY_FILE_HEADLINE_CHARS = 180
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS digests (
+    path TEXT PRIMARY KEY,
+    key TEXT NOT NULL,
+    digest TEXT NOT NULL
+);
+"""
+
+
+@dataclass(frozen=True)
+class DirectoryDigest:
+    """Everything ``summarize_repo`` reports about one directory and its subtree.
+
+    ``directories`` counts the files directly inside each directory of the
+    subtree, keyed by its path relative to this one ("" for this directory).
+    Paths and counts are in walk order so ties rank the same as a walk would.
+    """
+
+    files: int = 0
+    extensions: dict[str, int] = field(default_factory=dict)
+    directories: dict[str, int] = field(default_factory=dict)
+    entrypoints: tuple[str, ...] = ()
+    key_files: tuple[tuple[str, str], ...] = ()
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "files": self.files,
+                "extensions": self.extensions,
+                "directories": self.directories,
+                "entrypoints": list(self.entrypoints),
+                "key_files": [list(item) for item in self.key_files],
+            },
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, text: str) -> "DirectoryDigest":
+        data = json.loads(text)
+        return cls(
+            files=int(data["files"]),
+            extensions=dict(data["extensions"]),
+            directories=dict(data["directories"]),
+            entrypoints=tuple(data["entrypoints"]),
+            key_files=tuple((path, headline) for path, headline in data["key_files"]),
+        )
+
+
+@dataclass(frozen=True)
+class TreeSummary:
+    """A digest for the requested root and the directories rebuilt to produce it."""
+
+    digest: DirectoryDigest
+    rebuilt: tuple[str, ...]
+
+
+@dataclass
+class _Directory:
+    files: dict[str, str] = field(default_factory=dict)
+    children: set[str] = field(default_factory=set)
+
+
+class SummaryCache:
+    """Directory digests for one workspace, stored in SQLite by workspace-relative path."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path).expanduser()
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(self.path))
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            self._connection.execute("PRAGMA synchronous = NORMAL")
+            with self._connection:
+                self._connection.executescript(_SCHEMA)
+        except (OSError, sqlite3.Error) as exc:
+            raise RuntimeError(f"Could not open the summary cache at {self.path}: {exc}") from exc
+
+    @classmethod
+    def for_workspace(cls, config: LilbotConfig) -> "SummaryCache":
+        return cls(config.index_dir / SUMMARY_CACHE_FILENAME)
+
+    def __enter__(self) -> "SummaryCache":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def summarize(self, config: LilbotConfig, root: Path) -> TreeSummary:
+        """Return the digest for ``root``, rebuilding only directories whose contents changed."""
+
+        base = root.relative_to(config.workspace_root).as_posix()
+        base = "" if base == "." else base
+        scan = scan_workspace(config, skipped_suffixes=IGNORED_REPO_SUFFIXES)
+        tree = _group_by_directory(scan.files, base)
+        keys: dict[str, str] = {}
+        _directory_key(tree, base, keys)
+
+        rebuilt: list[str] = []
+        with self._connection:
+            digest = self._digest(config, tree, keys, base, rebuilt)
+            if rebuilt:
+                self._prune(base, keys)
+        return TreeSummary(digest=digest, rebuilt=tuple(rebuilt))
+
+    def _digest(
+        self,
+        config: LilbotConfig,
+        tree: dict[str, _Directory],
+        keys: dict[str, str],
+        directory: str,
+        rebuilt: list[str],
+    ) -> DirectoryDigest:
+        row = self._connection.execute(
+            "SELECT key, digest FROM digests WHERE path = ?",
+            (directory,),
+        ).fetchone()
+        if row is not None and row[0] == keys[directory]:
+            return DirectoryDigest.from_json(row[1])
+
+        node = tree.get(directory, _Directory())
+        children = [
+            (name, self._digest(config, tree, keys, _join(directory, name), rebuilt))
+            for name in sorted(node.children)
+        ]
+        digest = _build_digest(config.workspace_root / directory, sorted(node.files), children)
+        self._connection.execute(
+            "INSERT INTO digests (path, key, digest) VALUES (?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET key = excluded.key, digest = excluded.digest",
+            (directory, keys[directory], digest.to_json()),
+        )
+        rebuilt.append(directory)
+        return digest
+
+    def _prune(self, base: str, keys: dict[str, str]) -> None:
+        # Drop digests for directories under the root that no longer hold any files.
+        stale = [
+            (path,)
+            for (path,) in self._connection.execute("SELECT path FROM digests")
+            if path not in keys and (not base or path.startswith(base + "/"))
+        ]
+        self._connection.executemany("DELETE FROM digests WHERE path = ?", stale)
+
+
+def _group_by_directory(files: dict[str, str], base: str) -> dict[str, _Directory]:
+    tree: dict[str, _Directory] = {base: _Directory()}
+    prefix = base + "/" if base else ""
+    for relative, fingerprint in files.items():
+        if not relative.startswith(prefix):
+            continue
+        parent, _, name = relative.rpartition("/")
+        node = tree.get(parent)
+        if node is None:
+            node = tree[parent] = _Directory()
+            # Link the new directory to its parents until one is already known.
+            child = parent
+            while child != base:
+                above, _, child_name = child.rpartition("/")
+                above_node = tree.get(above)
+                if above_node is None:
+                    above_node = tree[above] = _Directory()
+                    above_node.children.add(child_name)
+                    child = above
+                    continue
+                above_node.children.add(child_name)
+                break
+        node.files[name] = fingerprint
+    return tree
+
+
+def _directory_key(tree: dict[str, _Directory], directory: str, keys: dict[str, str]) -> str:
+    node = tree[directory]
+    digest = hashlib.sha1(DIGEST_VERSION.encode("utf-8"))
+    for name in sorted(node.files):
+        digest.update(f"f\0{name}\0{node.files[name]}\n".encode("utf-8", errors="surrogateescape"))
+    for name in sorted(node.children):
+        child_key = _directory_key(tree, _join(directory, name), keys)
+        digest.update(f"d\0{name}\0{child_key}\n".encode("utf-8", errors="surrogateescape"))
+    keys[directory] = digest.hexdigest()
+    return keys[directory]
+
+
+def _build_digest(
+    directory: Path,
+    names: list[str],
+    children: list[tuple[str, DirectoryDigest]],
+) -> DirectoryDigest:
+    extensions = Counter(Path(name).suffix.lower() or "<no extension>" for name in names)
+    directories = {"": len(names)} if names else {}
+    entrypoints = [name for name in names if is_likely_entrypoint(directory / name)][:DIGEST_ENTRYPOINTS]
+    key_files = [
+        (name, headline)
+        for name in sorted(
+            (name for name in names if name in IMPORTANT_REPO_FILES),
+            key=IMPORTANT_REPO_FILES.index,
+        )
+        if (headline := _key_file_headline(directory / name)) is not None
+    ][:DIGEST_KEY_FILES]
+
+    files = len(names)
+    for child, digest in children:
+        files += digest.files
+        extensions.update(digest.extensions)
+        for relative, count in digest.directories.items():
+            directories[_join(child, relative)] = count
+        entrypoints.extend(
+            f"{child}/{path}" for path in digest.entrypoints[: DIGEST_ENTRYPOINTS - len(entrypoints)]
+        )
+        key_files.extend(
+            (f"{child}/{path}", headline)
+            for path, headline in digest.key_files[: DIGEST_KEY_FILES - len(key_files)]
+        )
+    return DirectoryDigest(
+        files=files,
+        extensions=dict(extensions),
+        directories=directories,
+        entrypoints=tuple(entrypoints),
+        key_files=tuple(key_files),
+    )
+
+
+def _key_file_headline(path: Path) -> str | None:
+    try:
+        preview = read_text_preview(path, KEY_FILE_PREVIEW_CHARS)
+    except OSError:
+        return None
+    return truncate_text(first_nonempty_line(preview) or "(empty)", KEY_FILE_HEADLINE_CHARS)
+
+
+def _join(directory: str, name: str) -> str:
+    if not directory:
+        return name
+    return f"{directory}/{name}" if name else directory
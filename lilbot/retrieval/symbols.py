@@ -0,0 +1,616 @@
+"""Persistent symbol table behind ``find_function``, ``trace_calls`` and ``repo_map``.
+
+For every workspace file the index keeps its function definitions (Python
+from the ``ast`` visitor in ``lilbot.tools.function_scan``, other languages
+from its line patterns) and a posting per identifier listing the lines it
+appears on. Python files also record their call sites, with targets resolved
+from imports and ``self.`` where possible, which makes the index a call
+graph: ``callers`` and ``callees`` walk it a hop at a time with indexed
+queries. Files are re-read only when their fingerprint changes (see
+``lilbot.retrieval.fingerprints``), so a lookup costs one workspace scan plus
+a few indexed queries instead of parsing every file again.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+import hashlib
+from pathlib import Path
+import re
+import sqlite3
+
+from lilbot.config import LilbotConfig
+from lilbot.retrieval.fingerprints import scan_workspace
+from lilbot.retrieval.repository import IndexChanges, diff_fingerprints
+from lilbot.tools.function_scan import (
+    MODULE_CALLER,
+    REFERENCES_PER_FILE,
+    Definition,
+    heuristic_definitions,
+    parse_python,
+    python_module_name,
+    python_outline,
+    read_source,
+)
+
+
+SYMBOL_INDEX_FILENAME = "symbols.sqlite3"
+SYMBOL_COMMIT_FILES = 500
+MIN_SYMBOL_LENGTH = 2
+MAX_SYMBOL_LENGTH = 64
+# Whole word runs that do not start with a digit, which is exactly what
+# `\bname\b` matches; the length bounds are part of the pattern so longer
+# runs are skipped by the regex engine rather than filtered afterwards.
+SYMBOL_PATTERN = re.compile(rf"\b[^\W\d]\w{{{MIN_SYMBOL_LENGTH - 1},{MAX_SYMBOL_LENGTH - 1}}}\b")
+# Calls matched by name alone skip names that builtin containers and strings
+# also define, since `cache.clear()` is far more often a dict than a workspace method.
+_BUILTIN_METHOD_NAMES = frozenset(
+    name for kind in (bytes, dict, list, set, str, tuple) for name in dir(kind) if not name.startswith("_")
+)
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    fingerprint TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS definitions (
+    file_id INTEGER NOT NULL,
+    line INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    label TEXT NOT NULL,
+    name TEXT NOT NULL,
+    snippet TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS definitions_name ON definitions (name);
+CREATE INDEX IF NOT EXISTS definitions_file ON definitions (file_id);
+CREATE TABLE IF NOT EXISTS symbols (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS mentions (
+    symbol_id INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    lines TEXT NOT NULL,
+    line_count INTEGER NOT NULL,
+    PRIMARY KEY (symbol_id, file_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS mentions_file ON mentions (file_id);
+CREATE TABLE IF NOT EXISTS calls (
+    file_id INTEGER NOT NULL,
+    line INTEGER NOT NULL,
+    caller TEXT NOT NULL,
+    name TEXT NOT NULL,
+    target TEXT
+);
+CREATE INDEX IF NOT EXISTS calls_name ON calls (name);
+CREATE INDEX IF NOT EXISTS calls_caller ON calls (file_id, caller);
+CREATE TABLE IF NOT EXISTS artifacts (
+    name TEXT PRIMARY KEY,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+"""
+
+
+@dataclass(frozen=True)
+class SymbolMention:
+    """Lines of one file that mention a symbol; ``lines`` keeps the first few."""
+
+    path: str
+    lines: tuple[int, ...]
+    line_count: int
+
+
+@dataclass(frozen=True)
+class SymbolLookup:
+    definitions: list[tuple[str, Definition]]
+    mentions: list[SymbolMention]
+
+
+@dataclass(frozen=True)
+class CallEdge:
+    """One call found while walking the call graph ``hop`` steps from the requested function.
+
+    ``path`` and ``line`` locate the call site and ``caller`` is the function
+    containing it. ``callee`` is a definition label when ``callee_path`` is
+    set, otherwise the dotted target or bare name of something outside the
+    workspace. ``by_name`` marks calls matched on the called name alone.
+    """
+
+    hop: int
+    path: str
+    line: int
+    caller: str
+    callee: str
+    callee_path: str | None
+    by_name: bool = False
+
+
+@dataclass(frozen=True)
+class CallGraph:
+    """Definitions matching a call-graph query, the edges reached, and per-hop counts left out."""
+
+    roots: list[tuple[str, Definition]]
+    edges: list[CallEdge]
+    omitted: dict[int, int]
+
+
+@dataclass(frozen=True)
+class _Function:
+    path: str
+    label: str
+    name: str
+    dotted: str
+
+
+def is_indexed_symbol(name: str) -> bool:
+    """Whether lookups for ``name`` can be answered from the index."""
+
+    return SYMBOL_PATTERN.fullmatch(name) is not None
+
+
+class SymbolIndex:
+    """Definitions and identifier postings for one workspace, stored in SQLite."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path).expanduser()
+        self._bulk_depth = 0
+        # Symbol ids never change once assigned, so they can be cached for the connection's life.
+        self._symbol_cache: dict[str, int] = {}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(self.path))
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            self._connection.execute("PRAGMA synchronous = NORMAL")
+            with self._connection:
+                self._connection.executescript(_SCHEMA)
+        except (OSError, sqlite3.Error) as exc:
+            raise RuntimeError(f"Could not open the symbol index at {self.path}: {exc}") from exc
+
+    @classmethod
+    def for_workspace(cls, config: LilbotConfig) -> "SymbolIndex":
+        return cls(config.index_dir / SYMBOL_INDEX_FILENAME)
+
+    def __enter__(self) -> "SymbolIndex":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    @contextmanager
+    def bulk(self) -> Iterator["SymbolIndex"]:
+        """Group many file updates into one transaction."""
+
+        self._bulk_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._bulk_depth -= 1
+            if not self._bulk_depth:
+                self._connection.rollback()
+                self._symbol_cache.clear()
+            raise
+        self._bulk_depth -= 1
+        self._commit()
+
+    @property
+    def file_count(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def file_fingerprints(self) -> dict[str, str]:
+        return dict(self._connection.execute("SELECT path, fingerprint FROM files"))
+
+    def refresh(self, config: LilbotConfig) -> IndexChanges:
+        """Re-read only the workspace files whose fingerprints changed."""
+
+        scan = scan_workspace(config)
+        changes = diff_fingerprints(self.file_fingerprints(), scan.files)
+        with self.bulk():
+            for relative in changes.removed:
+                self.remove_file(relative)
+        paths = [*changes.added, *changes.updated]
+        for offset in range(0, len(paths), SYMBOL_COMMIT_FILES):
+            # Commit in batches so an interrupted build keeps the files it finished.
+            with self.bulk():
+                for relative in paths[offset : offset + SYMBOL_COMMIT_FILES]:
+                    self.update_file(
+                        relative,
+                        config.workspace_root / relative,
+                        fingerprint=scan.files[relative],
+                    )
+        return changes
+
+    def update_file(self, relative: str, path: Path, *, fingerprint: str = "") -> None:
+        """Replace the definitions and postings for ``relative`` with the file's current contents."""
+
+        self._delete_file_rows(relative)
+        self._connection.execute(
+            "INSERT INTO files (path, fingerprint) VALUES (?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET fingerprint = excluded.fingerprint",
+            (relative, fingerprint),
+        )
+        file_id = self._connection.execute("SELECT id FROM files WHERE path = ?", (relative,)).fetchone()[0]
+        text = read_source(path)
+        if text is None:
+            self._commit()
+            return
+
+        lines = text.splitlines()
+        if path.suffix == ".py":
+            # One parse and one walk serve both the definitions and the call sites.
+            tree = parse_python(text)
+            definitions, calls = python_outline(tree, lines, relative) if tree is not None else ([], [])
+        else:
+            definitions = heuristic_definitions(lines)
+            calls = []
+        self._connection.executemany(
+            "INSERT INTO definitions (file_id, line, kind, label, name, snippet) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (file_id, item.line, item.kind, item.label, item.name, item.snippet)
+                for item in definitions
+            ),
+        )
+        self._connection.executemany(
+            "INSERT INTO calls (file_id, line, caller, name, target) VALUES (?, ?, ?, ?, ?)",
+            ((file_id, call.line, call.caller, call.name, call.target) for call in calls),
+        )
+
+        postings: dict[str, list[int]] = {}
+        counts: dict[str, int] = {}
+        for line_number, line in enumerate(lines, start=1):
+            for symbol in set(SYMBOL_PATTERN.findall(line)):
+                counts[symbol] = counts.get(symbol, 0) + 1
+                found = postings.setdefault(symbol, [])
+                if len(found) < REFERENCES_PER_FILE:
+                    found.append(line_number)
+        symbol_ids = self._symbol_ids(postings)
+        self._connection.executemany(
+            "INSERT INTO mentions (symbol_id, file_id, lines, line_count) VALUES (?, ?, ?, ?)",
+            (
+                (symbol_ids[symbol], file_id, ",".join(map(str, found)), counts[symbol])
+                for symbol, found in postings.items()
+            ),
+        )
+        self._commit()
+
+    def remove_file(self, relative: str) -> None:
+        self._delete_file_rows(relative)
+        self._connection.execute("DELETE FROM files WHERE path = ?", (relative,))
+        self._commit()
+
+    def lookup(self, name: str, *, path_prefix: str | None = None) -> SymbolLookup:
+        """Return every definition of ``name`` and every file that mentions it, in path order."""
+
+        prefix = normalize_prefix(path_prefix)
+
+        definitions = [
+            (path, Definition(line=line, kind=kind, label=label, name=name, snippet=snippet))
+            for path, line, kind, label, snippet in self._connection.execute(
+                "SELECT files.path, definitions.line, definitions.kind, definitions.label, definitions.snippet "
+                "FROM definitions JOIN files ON files.id = definitions.file_id "
+                "WHERE definitions.name = ? ORDER BY files.path, definitions.line",
+                (name,),
+            )
+            if under_prefix(path, prefix)
+        ]
+        mentions = [
+            SymbolMention(path=path, lines=tuple(int(value) for value in lines.split(",")), line_count=line_count)
+            for path, lines, line_count in self._connection.execute(
+                "SELECT files.path, mentions.lines, mentions.line_count FROM mentions "
+                "JOIN symbols ON symbols.id = mentions.symbol_id "
+                "JOIN files ON files.id = mentions.file_id "
+                "WHERE symbols.name = ? ORDER BY files.path",
+                (name,),
+            )
+            if under_prefix(path, prefix)
+        ]
+        return SymbolLookup(definitions=definitions, mentions=mentions)
+
+    def callers(
+        self,
+        name: str,
+        *,
+        depth: int = 1,
+        limit: int = 20,
+        path_prefix: str | None = None,
+    ) -> CallGraph:
+        """Functions that call ``name``, then their callers, up to ``depth`` hops.
+
+        ``name`` is a function name, a class-qualified label such as
+        ``Session.close`` or a dotted path such as ``pkg.auth.login``. Only call
+        sites under ``path_prefix`` are reported, and at most ``limit`` edges
+        per hop. Calls matched by name alone are followed further only when
+        the name has a single Python definition in the workspace.
+        """
+
+        prefix = normalize_prefix(path_prefix)
+        roots = self._python_functions(name)
+        candidates: dict[str, list[_Function]] = {}
+        seen = {(function.path, function.label) for function in roots}
+        frontier = roots
+        edges: list[CallEdge] = []
+        omitted: dict[int, int] = {}
+        for hop in range(1, depth + 1):
+            found: dict[tuple[str, str, str, str], CallEdge] = {}
+            next_frontier: list[_Function] = []
+            for function in frontier:
+                unique = len(self._functions_named(function.name, candidates)) == 1
+                for path, line, caller, target in self._connection.execute(
+                    "SELECT files.path, calls.line, calls.caller, calls.target FROM calls "
+                    "JOIN files ON files.id = calls.file_id WHERE calls.name = ? "
+                    "ORDER BY files.path, calls.line",
+                    (function.name,),
+                ):
+                    by_name = target is None
+                    if by_name and (function.name in _BUILTIN_METHOD_NAMES or (hop > 1 and not unique)):
+                        continue
+                    if not by_name and not _dotted_match(function.dotted, target):
+                        continue
+                    key = (path, caller, function.path, function.label)
+                    if not under_prefix(path, prefix) or key in found:
+                        continue
+                    if len(found) >= limit:
+                        omitted[hop] = omitted.get(hop, 0) + 1
+                        continue
+                    found[key] = CallEdge(
+                        hop=hop,
+                        path=path,
+                        line=line,
+                        caller=caller,
+                        callee=function.label,
+                        callee_path=function.path,
+                        by_name=by_name,
+                    )
+                    if caller != MODULE_CALLER and (path, caller) not in seen and (unique or not by_name):
+                        seen.add((path, caller))
+                        next_frontier.append(_function(path, caller))
+            edges.extend(found.values())
+            frontier = next_frontier
+            if not frontier:
+                break
+        return CallGraph(roots=self._root_definitions(roots), edges=edges, omitted=omitted)
+
+    def callees(
+        self,
+        name: str,
+        *,
+        depth: int = 1,
+        limit: int = 20,
+        path_prefix: str | None = None,
+    ) -> CallGraph:
+        """Functions that ``name`` calls, then what those call, up to ``depth`` hops.
+
+        Calls are followed only into workspace definitions: resolved targets,
+        or bare names with a single Python definition. Resolved calls into
+        other packages are listed but not followed, and unresolved calls whose
+        name is ambiguous are left out.
+        """
+
+        prefix = normalize_prefix(path_prefix)
+        roots = self._python_functions(name)
+        candidates: dict[str, list[_Function]] = {}
+        seen = {(function.path, function.label) for function in roots}
+        frontier = roots
+        edges: list[CallEdge] = []
+        omitted: dict[int, int] = {}
+        for hop in range(1, depth + 1):
+            found: dict[tuple[str, str, str], CallEdge] = {}
+            next_frontier: list[_Function] = []
+            for function in frontier:
+                if not under_prefix(function.path, prefix):
+                    continue
+                for line, called, target in self._connection.execute(
+                    "SELECT calls.line, calls.name, calls.target FROM calls "
+                    "JOIN files ON files.id = calls.file_id WHERE files.path = ? AND calls.caller = ? "
+                    "ORDER BY calls.line",
+                    (function.path, function.label),
+                ):
+                    named = self._functions_named(called, candidates)
+                    if target is not None:
+                        matches = [item for item in named if _dotted_match(item.dotted, target)]
+                    elif len(named) == 1 and called not in _BUILTIN_METHOD_NAMES:
+                        matches = named
+                    else:
+                        continue
+                    callee = matches[0] if matches else None
+                    label = callee.label if callee is not None else target
+                    key = (function.path, function.label, label)
+                    if key in found:
+                        continue
+                    if len(found) >= limit:
+                        omitted[hop] = omitted.get(hop, 0) + 1
+                        continue
+                    found[key] = CallEdge(
+                        hop=hop,
+                        path=function.path,
+                        line=line,
+                        caller=function.label,
+                        callee=label,
+                        callee_path=callee.path if callee is not None else None,
+                        by_name=target is None,
+                    )
+                    if callee is not None and (callee.path, callee.label) not in seen:
+                        seen.add((callee.path, callee.label))
+                        next_frontier.append(callee)
+            edges.extend(found.values())
+            frontier = next_frontier
+            if not frontier:
+                break
+        return CallGraph(roots=self._root_definitions(roots), edges=edges, omitted=omitted)
+
+    def tree_key(self, *, path_prefix: str | None = None) -> str:
+        """Hash of the indexed paths and fingerprints under ``path_prefix``; changes with any file."""
+
+        prefix = normalize_prefix(path_prefix)
+        digest = hashlib.sha1()
+        for path, fingerprint in self._connection.execute("SELECT path, fingerprint FROM files ORDER BY path"):
+            if under_prefix(path, prefix):
+                digest.update(f"{path}\0{fingerprint}\n".encode("utf-8", errors="surrogateescape"))
+        return digest.hexdigest()
+
+    def file_references(self, *, max_definers: int) -> Iterator[tuple[str, str, str, int]]:
+        """Yield ``(referencing path, defining path, name, line count)`` across files.
+
+        Only top-level names count: functions, and classes where their methods
+        are defined (method names such as ``close`` match too many unrelated
+        calls). Names defined in more than ``max_definers`` files, and dunder
+        names, say little about which file depends on which and are skipped.
+        """
+
+        yield from self._connection.execute(
+            "WITH named AS ("
+            "  SELECT file_id, name FROM definitions WHERE label = name UNION "
+            "  SELECT file_id, substr(label, 1, instr(label, '.') - 1) FROM definitions WHERE instr(label, '.') > 0"
+            "), defined AS ("
+            "  SELECT file_id, name FROM named WHERE name NOT LIKE '\\_\\_%' ESCAPE '\\' "
+            "  AND name IN (SELECT name FROM named GROUP BY name HAVING COUNT(*) <= ?)"
+            ") "
+            "SELECT referencing.path, defining.path, defined.name, mentions.line_count FROM defined "
+            "JOIN symbols ON symbols.name = defined.name "
+            "JOIN mentions ON mentions.symbol_id = symbols.id AND mentions.file_id != defined.file_id "
+            "JOIN files AS defining ON defining.id = defined.file_id "
+            "JOIN files AS referencing ON referencing.id = mentions.file_id",
+            (max_definers,),
+        )
+
+    def defining_paths(self) -> set[str]:
+        """Paths of the files with at least one indexed definition."""
+
+        return {
+            path
+            for (path,) in self._connection.execute(
+                "SELECT path FROM files WHERE EXISTS (SELECT 1 FROM definitions WHERE file_id = files.id)"
+            )
+        }
+
+    def definition_lines(self, path: str) -> list[tuple[int, str]]:
+        """``(line, label)`` for every definition indexed in ``path``, in line order."""
+
+        return list(
+            self._connection.execute(
+                "SELECT definitions.line, definitions.label FROM definitions "
+                "JOIN files ON files.id = definitions.file_id WHERE files.path = ? ORDER BY definitions.line",
+                (path,),
+            )
+        )
+
+    def cached_artifact(self, name: str, key: str) -> str | None:
+        """A value stored by ``store_artifact`` under ``name``, if it was stored with ``key``."""
+
+        row = self._connection.execute("SELECT key, value FROM artifacts WHERE name = ?", (name,)).fetchone()
+        return row[1] if row is not None and row[0] == key else None
+
+    def store_artifact(self, name: str, key: str, value: str) -> None:
+        self._connection.execute(
+            "INSERT INTO artifacts (name, key, value) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET key = excluded.key, value = excluded.value",
+            (name, key, value),
+        )
+        self._commit()
+
+    def _python_functions(self, name: str) -> list[_Function]:
+        """Python definitions whose dotted path ends with ``name``."""
+
+        query = name.strip().strip(".")
+        return [
+            function
+            for function in self._functions_named(query.rsplit(".", 1)[-1], {})
+            if _dotted_match(function.dotted, query)
+        ]
+
+    def _functions_named(self, name: str, cache: dict[str, list[_Function]]) -> list[_Function]:
+        found = cache.get(name)
+        if found is None:
+            found = cache[name] = [
+                _function(path, label)
+                for path, label in self._connection.execute(
+                    "SELECT files.path, definitions.label FROM definitions "
+                    "JOIN files ON files.id = definitions.file_id "
+                    "WHERE definitions.name = ? AND files.path LIKE '%.py' "
+                    "ORDER BY files.path, definitions.line",
+                    (name,),
+                )
+            ]
+        return found
+
+    def _root_definitions(self, roots: list[_Function]) -> list[tuple[str, Definition]]:
+        definitions: list[tuple[str, Definition]] = []
+        for function in roots:
+            row = self._connection.execute(
+                "SELECT definitions.line, definitions.kind, definitions.snippet FROM definitions "
+                "JOIN files ON files.id = definitions.file_id WHERE files.path = ? AND definitions.label = ? "
+                "ORDER BY definitions.line",
+                (function.path, function.label),
+            ).fetchone()
+            if row is not None:
+                line, kind, snippet = row
+                definitions.append(
+                    (
+                        function.path,
+                        Definition(line=line, kind=kind, label=function.label, name=function.name, snippet=snippet),
+                    )
+                )
+        return definitions
+
+    def _delete_file_rows(self, relative: str) -> None:
+        row = self._connection.execute("SELECT id FROM files WHERE path = ?", (relative,)).fetchone()
+        if row is None:
+            return
+        self._connection.execute("DELETE FROM definitions WHERE file_id = ?", (row[0],))
+        self._connection.execute("DELETE FROM mentions WHERE file_id = ?", (row[0],))
+        self._connection.execute("DELETE FROM calls WHERE file_id = ?", (row[0],))
+
+    def _symbol_ids(self, symbols: dict[str, list[int]]) -> dict[str, int]:
+        cache = self._symbol_cache
+        wanted = [symbol for symbol in symbols if symbol not in cache]
+        if wanted:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO symbols (name) VALUES (?)",
+                ((symbol,) for symbol in wanted),
+            )
+            for offset in range(0, len(wanted), 500):
+                batch = wanted[offset : offset + 500]
+                placeholders = ", ".join("?" for _ in batch)
+                cache.update(
+                    self._connection.execute(
+                        f"SELECT name, id FROM symbols WHERE name IN ({placeholders})",
+                        batch,
+                    )
+                )
+        return {symbol: cache[symbol] for symbol in symbols}
+
+    def _commit(self) -> None:
+        if not self._bulk_depth:
+            self._connection.commit()
+
+
+def under_prefix(path: str, prefix: str) -> bool:
+    """Whether ``path`` is ``prefix`` or inside it; an empty prefix matches everything."""
+
+    return not prefix or path == prefix or path.startswith(prefix + "/")
+
+
+def normalize_prefix(path_prefix: str | None) -> str:
+    """Turn a workspace-relative path filter into the form ``under_prefix`` expects."""
+
+    prefix = (path_prefix or "").strip().strip("/")
+    return "" if prefix == "." else prefix
+
+
+def _function(path: str, label: str) -> _Function:
+    return _Function(
+        path=path,
+        label=label,
+        name=label.rsplit(".", 1)[-1],
+        dotted=f"{python_module_name(path)}.{label}",
+    )
+
+
+def _dotted_match(dotted: str, target: str) -> bool:
+    # Targets are written as imported, so `pkg.mod.f` also matches a file at `src/pkg/mod.py`.
+    return dotted == target or dotted.endswith("." + target)
@@ -0,0 +1,332 @@
+"""Continuous-batching scheduler for concurrent Lilbot sessions."""
+
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+import threading
+import time
+
+from lilbot.controller import ContextProvider, LilbotController
+from lilbot.memory.session import LilbotSession
+from lilbot.model.base import BaseModel, DecodeState, GenerationStats
+from lilbot.tools.registry import ToolRegistry
+from lilbot.utils.logging import StepLogger
+
+
+@dataclass(frozen=True)
+class RequestMetrics:
+    """Latency breakdown for one generate call routed through the scheduler."""
+
+    queue_seconds: float
+    prefill_seconds: float | None
+    total_seconds: float
+    prompt_tokens: int | None
+    generated_tokens: int | None
+
+
+@dataclass
+class SchedulerMetrics:
+    """Aggregate queue and latency telemetry for a scheduler."""
+
+    requests: list[RequestMetrics] = field(default_factory=list)
+    decode_steps: int = 0
+    max_batch_size: int = 0
+    max_queue_depth: int = 0
+    queue_depth_total: int = 0
+    queue_depth_samples: int = 0
+
+    @property
+    def mean_queue_depth(self) -> float:
+        if not self.queue_depth_samples:
+            return 0.0
+        return self.queue_depth_total / self.queue_depth_samples
+
+    def latency_percentile(self, percentile: float) -> float | None:
+        latencies = sorted(request.total_seconds for request in self.requests)
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, max(0, round(percentile / 100.0 * (len(latencies) - 1))))
+        return latencies[index]
+
+    def render(self) -> str:
+        lines = [
+            "Scheduler metrics:",
+            f"- generate_requests: {len(self.requests)}",
+            f"- decode_steps: {self.decode_steps}",
+            f"- max_batch_size: {self.max_batch_size}",
+            f"- queue_depth: max={self.max_queue_depth} mean={self.mean_queue_depth:.2f}",
+        ]
+        if self.requests:
+            queue_wait = sum(request.queue_seconds for request in self.requests) / len(self.requests)
+            lines.append(
+                "- latency: "
+                f"p50={self.latency_percentile(50):.3f}s "
+                f"p95={self.latency_percentile(95):.3f}s "
+                f"max={self.latency_percentile(100):.3f}s"
+            )
+            lines.append(f"- mean_queue_wait: {queue_wait:.3f}s")
+        return "\n".join(lines)
+
+
+@dataclass
+class _GenerationRequest:
+    prompt: str
+    max_new_tokens: int | None
+    submitted_at: float = field(default_factory=time.perf_counter)
+    admitted_at: float | None = None
+    done: threading.Event = field(default_factory=threading.Event)
+    text: str | None = None
+    stats: GenerationStats | None = None
+    error: BaseException | None = None
+
+
+class _ScheduledModel(BaseModel):
+    """Per-session model proxy that routes generate calls through the scheduler."""
+
+    def __init__(self, scheduler: "SessionScheduler") -> None:
+        self.scheduler = scheduler
+        self.runtime_summary = scheduler.model.runtime_summary
+        self.max_new_tokens = getattr(scheduler.model, "max_new_tokens", None)
+
+    def generate(self, prompt: str, *, max_new_tokens: int | None = None) -> str:
+        request = self.scheduler._enqueue(prompt, max_new_tokens)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        self.last_generation = request.stats
+        return request.text or ""
+
+
+class SessionScheduler:
+    """Run many Lilbot sessions against one shared model process.
+
+    Each session's controller runs on a worker thread; its generate calls are
+    queued and merged by a single decode thread. Backends that support
+    incremental decoding are batched continuously: new requests are prefilled
+    and join the batch between decode steps, and finished ones leave it
+    immediately. Other backends are served one request at a time.
+    """
+
+    def __init__(
+        self,
+        model: BaseModel,
+        tool_registry: ToolRegistry,
+        *,
+        max_steps: int = 4,
+        max_batch_size: int = 8,
+        max_concurrent_sessions: int | None = None,
+        max_new_tokens: int | None = None,
+        max_run_seconds: float = 0.0,
+        max_run_tokens: int = 0,
+        logger: StepLogger | None = None,
+        context_provider: ContextProvider | None = None,
+    ) -> None:
+        self.model = model
+        self.tool_registry = tool_registry
+        self.max_steps = max_steps
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_new_tokens = max_new_tokens
+        self.max_run_seconds = max_run_seconds
+        self.max_run_tokens = max_run_tokens
+        self.logger = logger
+        self.context_provider = context_provider
+        self.metrics = SchedulerMetrics()
+
+        self._condition = threading.Condition()
+        self._pending: deque[_GenerationRequest] = deque()
+        self._accepting = True
+        self._closing = False
+        self._failure: BaseException | None = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, int(max_concurrent_sessions or self.max_batch_size)),
+            thread_name_prefix="lilbot-session",
+        )
+        self._decode_thread = threading.Thread(
+            target=self._decode_loop,
+            name="lilbot-decode",
+            daemon=True,
+        )
+        self._decode_thread.start()
+
+    def __enter__(self) -> "SessionScheduler":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    @property
+    def queue_depth(self) -> int:
+        with self._condition:
+            return len(self._pending)
+
+    def submit(
+        self,
+        session: LilbotSession,
+        *,
+        allowed_tools: Sequence[str] | None = None,
+    ) -> Future[str]:
+        """Queue a session; the future resolves to its final answer."""
+
+        controller = LilbotController(
+            model=_ScheduledModel(self),
+            tool_registry=self.tool_registry,
+            max_steps=self.max_steps,
+            logger=self.logger,
+            max_new_tokens=self.max_new_tokens,
+            max_run_seconds=self.max_run_seconds,
+            max_run_tokens=self.max_run_tokens,
+            context_provider=self.context_provider,
+        )
+        # Checked and submitted under the lock, so nothing is queued once close() has begun.
+        with self._condition:
+            if not self._accepting:
+                raise RuntimeError("The scheduler is closed.")
+            return self._executor.submit(controller.run, session, allowed_tools=allowed_tools)
+
+    def close(self) -> None:
+        """Finish every submitted session, then stop the decode thread."""
+
+        with self._condition:
+            self._accepting = False
+        self._executor.shutdown(wait=True)
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        self._decode_thread.join()
+
+    def _enqueue(self, prompt: str, max_new_tokens: int | None) -> _GenerationRequest:
+        request = _GenerationRequest(prompt=prompt, max_new_tokens=max_new_tokens)
+        with self._condition:
+            if self._failure is not None:
+                self._fail(request, self._failure)
+                return request
+            self._pending.append(request)
+            self._sample_queue_depth()
+            self._condition.notify_all()
+        return request
+
+    def _decode_loop(self) -> None:
+        active: list[tuple[_GenerationRequest, DecodeState]] = []
+        admitted: list[_GenerationRequest] = []
+        try:
+            self._decode_until_closed(active, admitted)
+        except BaseException as exc:
+            # The decode thread is gone; fail every waiting caller instead of
+            # leaving it blocked, including requests that arrive later.
+            with self._condition:
+                self._failure = exc
+                stranded = [*admitted, *(request for request, _ in active), *self._pending]
+                self._pending.clear()
+            for request in stranded:
+                if not request.done.is_set():
+                    self._fail(request, exc)
+
+    def _decode_until_closed(
+        self,
+        active: list[tuple[_GenerationRequest, DecodeState]],
+        admitted: list[_GenerationRequest],
+    ) -> None:
+        while True:
+            with self._condition:
+                while not self._pending and not active and not self._closing:
+                    self._condition.wait()
+                if self._closing and not self._pending and not active:
+                    return
+                admitted.clear()
+                while self._pending and len(active) + len(admitted) < self.max_batch_size:
+                    admitted.append(self._pending.popleft())
+                self._sample_queue_depth()
+
+            for request in admitted:
+                request.admitted_at = time.perf_counter()
+                if not self.model.supports_incremental_decoding:
+                    self._serve_serially(request)
+                    continue
+                try:
+                    state = self.model.start_sequence(
+                        request.prompt,
+                        max_new_tokens=request.max_new_tokens,
+                    )
+                except Exception as exc:
+                    self._fail(request, exc)
+                    continue
+                active.append((request, state))
+
+            unfinished = [state for _, state in active if not state.finished]
+            if unfinished:
+                self.metrics.max_batch_size = max(self.metrics.max_batch_size, len(unfinished))
+                try:
+                    self.model.decode_batch(unfinished)
+                except Exception as exc:
+                    for request, _ in active:
+                        self._fail(request, exc)
+                    active.clear()
+                    continue
+                self.metrics.decode_steps += 1
+
+            still_running: list[tuple[_GenerationRequest, DecodeState]] = []
+            for request, state in active:
+                if state.finished:
+                    self._complete_incremental(request, state)
+                else:
+                    still_running.append((request, state))
+            active[:] = still_running
+
+    def _serve_serially(self, request: _GenerationRequest) -> None:
+        self.metrics.max_batch_size = max(self.metrics.max_batch_size, 1)
+        self.model.last_generation = None
+        try:
+            if request.max_new_tokens is None:
+                text = self.model.generate(request.prompt)
+            else:
+                text = self.model.generate(request.prompt, max_new_tokens=request.max_new_tokens)
+        except Exception as exc:
+            self._fail(request, exc)
+            return
+        self._resolve(request, text, self.model.last_generation)
+
+    def _complete_incremental(self, request: _GenerationRequest, state: DecodeState) -> None:
+        try:
+            text = self.model.finish_sequence(state)
+        except Exception as exc:
+            self._fail(request, exc)
+            return
+        elapsed = time.perf_counter() - (request.admitted_at or request.submitted_at)
+        prefill = state.prefill_seconds
+        stats = GenerationStats(
+            prompt_tokens=state.prompt_tokens,
+            generated_tokens=state.generated_tokens,
+            prefill_seconds=prefill,
+            decode_seconds=max(0.0, elapsed - (prefill or 0.0)),
+        )
+        self._resolve(request, text, stats)
+
+    def _resolve(self, request: _GenerationRequest, text: str, stats: GenerationStats | None) -> None:
+        finished_at = time.perf_counter()
+        admitted_at = request.admitted_at or request.submitted_at
+        request.text = text
+        request.stats = stats
+        with self._condition:
+            self.metrics.requests.append(
+                RequestMetrics(
+                    queue_seconds=admitted_at - request.submitted_at,
+                    prefill_seconds=stats.prefill_seconds if stats else None,
+                    total_seconds=finished_at - request.submitted_at,
+                    prompt_tokens=stats.prompt_tokens if stats else None,
+                    generated_tokens=stats.generated_tokens if stats else None,
+                )
+            )
+        request.done.set()
+
+    def _fail(self, request: _GenerationRequest, exc: BaseException) -> None:
+        request.error = exc
+        request.done.set()
+
+    def _sample_queue_depth(self) -> None:
+        depth = len(self._pending)
+        self.metrics.max_queue_depth = max(self.metrics.max_queue_depth, depth)
+        self.metrics.queue_depth_total += depth
+        self.metrics.queue_depth_samples += 1
@@ -6,7 +6,14 @@ from lilbot.config import LilbotConfig
 from lilbot.tools.filesystem import ListDirectoryTool, ReadFileTool
 from lilbot.tools.logs import SummarizeLogTool
 from lilbot.tools.registry import ToolRegistry
-from lilbot.tools.repo import FindFunctionTool, SummarizeRepoTool
+from lilbot.tools.repo import (
+    FindFunctionTool,
+    GrepWorkspaceTool,
+    RepoMapTool,
+    SearchRepoTool,
+    SummarizeRepoTool,
+    TraceCallsTool,
+)
 from lilbot.tools.shell import RunShellTool
 from lilbot.tools.system import CpuSnapshotTool, DiskUsageTool, InspectSystemTool, MemoryUsageTool
 
@@ -19,6 +26,10 @@ def build_default_tool_registry(config: LilbotConfig) -> ToolRegistry:
             RunShellTool(config),
             SummarizeRepoTool(config),
             FindFunctionTool(config),
+            GrepWorkspaceTool(config),
+            TraceCallsTool(config),
+            RepoMapTool(config),
+            SearchRepoTool(config),
             SummarizeLogTool(config),
             InspectSystemTool(config),
             DiskUsageTool(config),
@@ -4,10 +4,19 @@ from __future__ import annotations
 
 from abc import ABC, abstractmethod
 from collections.abc import Mapping
+from dataclasses import dataclass
 
 from lilbot.config import LilbotConfig
 
 
+@dataclass(frozen=True)
+class ToolResult:
+    """A tool's output and whether it was served from a cache."""
+
+    text: str
+    cache_hit: bool = False
+
+
 class Tool(ABC):
     """Discrete deterministic tool used by Lilbot."""
 
@@ -27,3 +36,20 @@ class Tool(ABC):
     @abstractmethod
     def execute(self, **kwargs: object) -> str:
         """Execute the tool with keyword arguments."""
+
+    def run(self, **kwargs: object) -> ToolResult:
+        """Execute the tool and report whether a cache served the result.
+
+        Tools backed by a cache override this and implement ``execute`` on top of it.
+        """
+
+        return ToolResult(str(self.execute(**kwargs)))
+
+    def compact(self, observation: str) -> str | None:
+        """Return a shorter rendering of an observation for older transcript steps.
+
+        Tools return None when the observation should stay verbatim.
+        """
+
+        del observation
+        return None
@@ -2,13 +2,25 @@
 
 from __future__ import annotations
 
+from array import array
+from bisect import bisect_left
 from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import islice
+import mmap
 import os
 from pathlib import Path
+import random
+import re
 from typing import Iterator
 
 from lilbot.config import LilbotConfig
 from lilbot.tools.base import Tool
+from lilbot.utils.formatting import keep_head_tail_lines
+from lilbot.utils.git import IgnoreRules, list_git_files
 
 
 TEXT_FILE_EXTENSIONS = {
@@ -41,6 +53,41 @@ TEXT_FILE_EXTENSIONS = {
     ".yaml",
     ".yml",
 }
+BINARY_FILE_EXTENSIONS = {
+    ".bin",
+    ".ckpt",
+    ".gif",
+    ".gz",
+    ".jpeg",
+    ".jpg",
+    ".onnx",
+    ".pdf",
+    ".png",
+    ".pt",
+    ".pth",
+    ".pyc",
+    ".safetensors",
+    ".so",
+    ".sqlite3",
+    ".tar",
+    ".zip",
+}
+WALK_WORKERS = 8
+SAMPLE_SEED = 0
+TEXT_SNIFF_BYTES = 1024
+# Below this, one read() is cheaper than setting up a mapping.
+MMAP_MIN_BYTES = 64 * 1024
+# Seeking to a line scans at most one block past the nearest recorded newline count.
+LINE_INDEX_BLOCK_BYTES = 64 * 1024
+LINE_INDEX_CACHE_FILES = 32
+COMPACT_PREVIEW_LINES = 12
+COMPACT_OUTLINE_LIMIT = 40
+COMPACT_DIRECTORY_ENTRIES = 20
+RANGE_HEADER_PATTERN = re.compile(r"^Lines (\d+)-\d+ of \d+ in ")
+OUTLINE_LINE_PATTERN = re.compile(
+    r"^\s*(?:(?:async\s+)?def\s|class\s|function\s|func\s|fn\s|pub\s+fn\s|"
+    r"export\s+(?:default\s+)?(?:function|class)\s|#{1,6}\s|\[[^\]]+\]\s*$)"
+)
 
 
 def read_text_preview(path: Path, max_chars: int) -> str:
@@ -58,24 +105,240 @@ def read_text_preview(path: Path, max_chars: int) -> str:
     return text
 
 
+@dataclass(frozen=True, slots=True)
+class WorkspaceFile:
+    """A file found by the workspace walk, with the stat data gathered while walking.
+
+    ``is_text`` is a hint from the suffix: True for known text types, False for
+    known binary types, None when only the contents can tell.
+    """
+
+    root: Path
+    relative: str
+    size: int
+    mtime_ns: int
+    is_text: bool | None
+
+    @property
+    def path(self) -> Path:
+        return self.root / self.relative
+
+
+@dataclass(frozen=True)
+class WorkspaceListing:
+    """The files selected from a walk, and how many the walk found in total."""
+
+    files: list[WorkspaceFile]
+    total: int
+    sampled: bool = False
+
+
+def list_workspace_files(
+    config: LilbotConfig,
+    root: Path,
+    *,
+    limit: int | None = None,
+    sample: bool = False,
+) -> WorkspaceListing:
+    """List files under ``root`` that git would consider, in walk order.
+
+    Inside a git work tree the list comes from ``git ls-files``, so anything
+    ignored by ``.gitignore``, ``.git/info/exclude``, or the global excludes
+    file is skipped. Elsewhere the tree is walked with ``os.scandir``, one
+    directory per task in a thread pool, and ``.gitignore`` files are applied
+    along the way. ``config.ignored_directories`` is skipped either way.
+
+    When more than ``limit`` files exist, the first ``limit`` in walk order are
+    kept, or with ``sample=True`` a random sample drawn from the whole tree and
+    returned in walk order. The sample is seeded, so the same tree gives the
+    same sample. Only the kept files are statted.
+    """
+
+    relatives = _git_relative_paths(config, root)
+    if relatives is None:
+        relatives = _walk_relative_paths(config, root)
+
+    total = len(relatives)
+    sampled = False
+    if limit is not None and total > limit:
+        if sample:
+            # A fixed seed keeps repeated summaries stable; a stride would alias with regular layouts.
+            chosen = sorted(random.Random(SAMPLE_SEED).sample(range(total), limit))
+            relatives = [relatives[index] for index in chosen]
+            sampled = True
+        else:
+            relatives = relatives[:limit]
+    return WorkspaceListing(files=_stat_files(root, relatives), total=total, sampled=sampled)
+
+
 def iter_workspace_files(
     config: LilbotConfig,
     root: Path,
     *,
     limit: int | None = None,
 ) -> Iterator[Path]:
-    visited = 0
-    for current_root, dirnames, filenames in os.walk(root):
-        dirnames[:] = sorted(
-            name
-            for name in dirnames
-            if name not in config.ignored_directories and not name.endswith(".egg-info")
+    """Yield the paths ``list_workspace_files`` would list, in the same order, lazily.
+
+    Nothing is statted, and outside git the tree is walked one directory at a
+    time as paths are consumed, so ``limit`` or stopping early skips the rest
+    of the walk.
+    """
+
+    relatives = _git_relative_paths(config, root)
+    paths = iter(relatives) if relatives is not None else _iter_walk_relative_paths(config, root)
+    for relative in islice(paths, limit):
+        yield root / relative
+
+
+def text_hint(name: str) -> bool | None:
+    suffix = os.path.splitext(name)[1].lower()
+    if suffix in TEXT_FILE_EXTENSIONS:
+        return True
+    if suffix in BINARY_FILE_EXTENSIONS:
+        return False
+    return None
+
+
+def _git_relative_paths(config: LilbotConfig, root: Path) -> list[str] | None:
+    relatives = list_git_files(root)
+    if relatives is None:
+        return None
+    relatives = [
+        relative
+        for relative in relatives
+        if not in_ignored_directory(config, relative.rpartition("/")[0])
+    ]
+    # Match the order of the directory walk: a directory's files before its subdirectories.
+    relatives.sort(key=_walk_order)
+    return relatives
+
+
+def _walk_root(config: LilbotConfig, root: Path) -> tuple[str, str, Path, IgnoreRules]:
+    """The ``_scan_directory`` arguments for the walk root."""
+
+    base = config.workspace_root if root.is_relative_to(config.workspace_root) else root
+    rules = IgnoreRules()
+    for directory in reversed(root.parents):
+        # .gitignore files above the walk root, up to the workspace root, still apply.
+        if directory.is_relative_to(base):
+            rules = rules.with_directory(directory, _relative_posix(directory, base))
+    return "", _relative_posix(root, base), root, rules
+
+
+def _iter_walk_relative_paths(config: LilbotConfig, root: Path) -> Iterator[str]:
+    # Depth-first on the calling thread, so nothing past what the caller consumes is listed.
+    stack = [_walk_root(config, root)]
+    while stack:
+        _, files, subdirectories = _scan_directory(config, *stack.pop())
+        yield from files
+        stack.extend(reversed(subdirectories))
+
+
+def _walk_relative_paths(config: LilbotConfig, root: Path) -> list[str]:
+    listed: dict[str, tuple[list[str], list[str]]] = {}
+    with ThreadPoolExecutor(max_workers=WALK_WORKERS) as pool:
+        pending = {pool.submit(_scan_directory, config, *_walk_root(config, root))}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                relative, files, subdirectories = future.result()
+                listed[relative] = (files, [child for child, *_ in subdirectories])
+                for child in subdirectories:
+                    pending.add(pool.submit(_scan_directory, config, *child))
+
+    # Threads finish in any order; rebuild the depth-first walk order from the listing.
+    ordered: list[str] = []
+    stack = [""]
+    while stack:
+        files, subdirectories = listed[stack.pop()]
+        ordered.extend(files)
+        stack.extend(reversed(subdirectories))
+    return ordered
+
+
+def _scan_directory(
+    config: LilbotConfig,
+    relative: str,
+    prefix: str,
+    directory: Path,
+    rules: IgnoreRules,
+) -> tuple[str, list[str], list[tuple[str, str, Path, IgnoreRules]]]:
+    """List one directory; ``relative`` is from the walk root, ``prefix`` from the ignore-rule base."""
+
+    rules = rules.with_directory(directory, prefix)
+    try:
+        with os.scandir(directory) as iterator:
+            entries = sorted(iterator, key=lambda entry: entry.name)
+    except OSError:
+        return relative, [], []
+
+    files: list[str] = []
+    subdirectories: list[tuple[str, str, Path, IgnoreRules]] = []
+    for entry in entries:
+        name = entry.name
+        ignore_path = f"{prefix}/{name}" if prefix else name
+        try:
+            is_directory = entry.is_dir()
+        except OSError:
+            is_directory = False
+        if is_directory:
+            # Like os.walk, symlinked directories are neither entered nor listed.
+            if entry.is_symlink() or in_ignored_directory(config, name):
+                continue
+            if rules.is_ignored(ignore_path, is_dir=True):
+                continue
+            subdirectories.append(
+                (f"{relative}/{name}" if relative else name, ignore_path, directory / name, rules)
+            )
+        elif not rules.is_ignored(ignore_path):
+            files.append(f"{relative}/{name}" if relative else name)
+    return relative, files, subdirectories
+
+
+def _stat_files(root: Path, relatives: list[str]) -> list[WorkspaceFile]:
+    base = os.fspath(root)
+    files = []
+    for relative in relatives:
+        try:
+            stat = os.stat(os.path.join(base, relative))
+        except OSError:
+            continue
+        files.append(
+            WorkspaceFile(
+                root=root,
+                relative=relative,
+                size=stat.st_size,
+                mtime_ns=stat.st_mtime_ns,
+                is_text=text_hint(relative),
+            )
         )
-        for filename in sorted(filenames):
-            visited += 1
-            if limit is not None and visited > limit:
-                return
-            yield Path(current_root) / filename
+    return files
+
+
+def in_ignored_directory(config: LilbotConfig, directory: str) -> bool:
+    """Whether any part of the relative ``directory`` is one the workspace walk skips.
+
+    The listing tools and the retrieval index both filter paths with this, so
+    they agree on which files exist.
+    """
+
+    return bool(directory) and _in_ignored_directory(config.ignored_directories, directory)
+
+
+@lru_cache(maxsize=4096)
+def _in_ignored_directory(ignored_directories: frozenset[str], directory: str) -> bool:
+    # Thousands of files share each directory, so the answer is cached per directory.
+    return any(name in ignored_directories or name.endswith(".egg-info") for name in directory.split("/"))
+
+
+def _walk_order(relative: str) -> tuple[tuple[int, str], ...]:
+    *directories, filename = relative.split("/")
+    return (*((1, name) for name in directories), (0, filename))
+
+
+def _relative_posix(path: Path, base: Path) -> str:
+    relative = path.relative_to(base).as_posix()
+    return "" if relative == "." else relative
 
 
 def tail_file(path: Path, *, max_lines: int) -> list[str]:
@@ -86,24 +349,237 @@ def tail_file(path: Path, *, max_lines: int) -> list[str]:
     return list(lines)
 
 
+def find_in_file(
+    path: Path,
+    pattern: bytes | re.Pattern[bytes],
+    *,
+    limit: int | None = None,
+) -> int:
+    """Byte offset of the first match of ``pattern`` in ``path``, or -1.
+
+    Only the first ``limit`` bytes are searched when it is given. Files of at
+    least ``MMAP_MIN_BYTES`` are memory-mapped, so the search runs over the
+    page cache without copying or decoding them and stops at the first match;
+    smaller files are read in one call. Raises OSError if the file cannot be
+    read.
+    """
+
+    with path.open("rb") as handle:
+        size = os.fstat(handle.fileno()).st_size
+        end = size if limit is None else min(size, limit)
+        if end >= MMAP_MIN_BYTES:
+            try:
+                mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                # Some filesystems cannot be mapped; fall through to a plain read.
+                pass
+            else:
+                with mapped:
+                    return _search_buffer(mapped, pattern, end)
+        # Sizes of special files can be 0 or stale, so read up to the limit rather than ``end``.
+        data = handle.read(-1 if limit is None else limit)
+    return _search_buffer(data, pattern, len(data))
+
+
+def _search_buffer(buffer: bytes | mmap.mmap, pattern: bytes | re.Pattern[bytes], end: int) -> int:
+    if isinstance(pattern, bytes):
+        return buffer.find(pattern, 0, end)
+    match = pattern.search(buffer, 0, end)
+    return match.start() if match else -1
+
+
+@contextmanager
+def mapped_bytes(path: str | Path) -> Iterator[bytes | mmap.mmap]:
+    """The whole file for searching in place: a read-only mapping from ``MMAP_MIN_BYTES``, else its bytes.
+
+    Raises OSError if the file cannot be read.
+    """
+
+    with open(path, "rb") as handle:
+        if os.fstat(handle.fileno()).st_size >= MMAP_MIN_BYTES:
+            try:
+                mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                # Some filesystems cannot be mapped; fall through to a plain read.
+                pass
+            else:
+                with mapped:
+                    yield mapped
+                return
+        data = handle.read()
+    yield data
+
+
+@dataclass(frozen=True)
+class LineIndex:
+    """Newline counts at every ``LINE_INDEX_BLOCK_BYTES`` boundary of one file.
+
+    ``block_lines[i]`` is how many newlines come before byte
+    ``i * LINE_INDEX_BLOCK_BYTES``. A few hundred kilobytes cover a
+    multi-gigabyte file, and finding a line is a bisect plus a scan of at most
+    one block, however far into the file it is.
+    """
+
+    size: int
+    lines: int
+    block_lines: array
+
+    @classmethod
+    def build(cls, buffer: bytes | mmap.mmap) -> "LineIndex":
+        block_lines = array("Q")
+        newlines = 0
+        for start in range(0, len(buffer), LINE_INDEX_BLOCK_BYTES):
+            block_lines.append(newlines)
+            # mmap has no count(); slicing copies one block at a time.
+            newlines += buffer[start : start + LINE_INDEX_BLOCK_BYTES].count(b"\n")
+        unterminated = bool(buffer) and buffer[-1:] != b"\n"
+        return cls(size=len(buffer), lines=newlines + unterminated, block_lines=block_lines)
+
+    def block_start(self, offset: int) -> tuple[int, int]:
+        """First byte of the block holding ``offset`` and how many newlines precede it."""
+
+        if not self.block_lines:
+            return 0, 0
+        block = min(max(offset, 0) // LINE_INDEX_BLOCK_BYTES, len(self.block_lines) - 1)
+        return block * LINE_INDEX_BLOCK_BYTES, self.block_lines[block]
+
+    def line_offset(self, buffer: bytes | mmap.mmap, line: int) -> int:
+        """Byte offset where 1-based ``line`` starts; the file size past the last line."""
+
+        if line <= 1:
+            return 0
+        if line > self.lines:
+            return self.size
+        # The last block starting before the newline that ends line - 1, so never mid-line.
+        block = bisect_left(self.block_lines, line - 1) - 1
+        offset = block * LINE_INDEX_BLOCK_BYTES
+        for _ in range(line - 1 - self.block_lines[block]):
+            offset = buffer.find(b"\n", offset) + 1
+        return offset
+
+
+@dataclass(frozen=True)
+class FileRange:
+    """Text read from part of a file, with the 1-based lines or the byte span it covers.
+
+    ``resume_offset`` is set when a line range stopped partway through a line
+    longer than the budget: the byte offset where the rest of that line starts.
+    """
+
+    text: str
+    start: int
+    end: int
+    total: int
+    truncated: bool
+    resume_offset: int | None = None
+
+
+def line_index(path: Path) -> LineIndex:
+    """The cached ``LineIndex`` for ``path``, rebuilt when its size or mtime changes."""
+
+    stat = path.stat()
+    return _cached_line_index(os.fspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+@lru_cache(maxsize=LINE_INDEX_CACHE_FILES)
+def _cached_line_index(path: str, size: int, mtime_ns: int) -> LineIndex:
+    del size, mtime_ns  # Only part of the cache key.
+    with mapped_bytes(path) as buffer:
+        return LineIndex.build(buffer)
+
+
+def read_line_range(path: Path, start: int, end: int | None, max_chars: int) -> FileRange:
+    """Read lines ``start`` to ``end`` (1-based, inclusive) up to ``max_chars`` characters.
+
+    A negative ``start`` counts from the end of the file. Only the requested
+    lines are read; the line index finds where they begin.
+    """
+
+    index = line_index(path)
+    if start < 0:
+        start = max(1, index.lines + start + 1)
+    start = max(1, start)
+    end = index.lines if end is None else min(end, index.lines)
+    with mapped_bytes(path) as buffer:
+        offset = index.line_offset(buffer, start)
+        stop = index.line_offset(buffer, end + 1) if end >= start else offset
+        data = buffer[offset : min(stop, offset + max_chars + 1)]
+    text = data.decode("utf-8", errors="replace")
+    # Split on newlines only, the same boundaries the index counts.
+    lines = text.removesuffix("\n").split("\n") if text else []
+    truncated = offset + len(data) < stop
+    resume_offset = None
+    if truncated and len(lines) > 1:
+        # Drop the line cut off by the character budget rather than show half of it.
+        lines.pop()
+    elif truncated and b"\n" not in data:
+        # One line longer than the whole budget: show its head, continue by byte offset.
+        data = data[:max_chars]
+        lines = [data.decode("utf-8", errors="replace")]
+        resume_offset = offset + len(data)
+    text = "\n".join(lines)[:max_chars]
+    return FileRange(
+        text=text,
+        start=start,
+        end=start + len(lines) - 1,
+        total=index.lines,
+        truncated=truncated,
+        resume_offset=resume_offset,
+    )
+
+
+def read_byte_range(path: Path, offset: int, max_chars: int) -> FileRange:
+    """Read up to ``max_chars`` bytes from ``offset``; a negative offset counts from the end."""
+
+    with mapped_bytes(path) as buffer:
+        size = len(buffer)
+        start = max(0, size + offset if offset < 0 else min(offset, size))
+        data = buffer[start : start + max_chars]
+    return FileRange(
+        text=data.decode("utf-8", errors="replace"),
+        start=start,
+        end=start + len(data),
+        total=size,
+        truncated=start + len(data) < size,
+    )
+
+
+def _optional_int(value: object) -> int | None:
+    if value is None or value == "":
+        return None
+    return int(value)
+
+
 def is_probably_text(path: Path) -> bool:
     if path.suffix.lower() in TEXT_FILE_EXTENSIONS:
         return True
     try:
-        with path.open("rb") as handle:
-            sample = handle.read(1024)
+        return find_in_file(path, b"\x00", limit=TEXT_SNIFF_BYTES) < 0
     except OSError:
         return False
-    return b"\x00" not in sample
 
 
 class ReadFileTool(Tool):
     name = "read_file"
     description = "Read a UTF-8 text file under the workspace root."
-    args_schema = {"path": "Workspace-relative file path."}
+    args_schema = {
+        "path": "Workspace-relative file path.",
+        "start_line": "Optional first line; negative counts from the end.",
+        "end_line": "Optional last line.",
+        "offset": "Optional byte offset to read from instead.",
+    }
 
     def execute(self, **kwargs: object) -> str:
         path = str(kwargs.get("path", "")).strip()
+        try:
+            start_line = _optional_int(kwargs.get("start_line"))
+            end_line = _optional_int(kwargs.get("end_line"))
+            offset = _optional_int(kwargs.get("offset"))
+        except (TypeError, ValueError):
+            return "Line numbers and offsets must be integers."
+        if offset is not None and (start_line is not None or end_line is not None):
+            return "Pass either a line range or a byte offset, not both."
+
         try:
             target = self.config.resolve_workspace_path(path, must_exist=True)
         except ValueError as exc:
@@ -112,12 +588,62 @@ class ReadFileTool(Tool):
         if not target.is_file():
             return f"Not a file: {self.config.display_path(target)}"
 
+        display = self.config.display_path(target)
+        if start_line is None and end_line is None and offset is None:
+            try:
+                preview = read_text_preview(target, self.config.file_preview_chars)
+            except OSError as exc:
+                return f"Unable to read {display}: {exc}"
+            return f"File preview for {display}:\n{preview}"
+
         try:
-            preview = read_text_preview(target, self.config.file_preview_chars)
+            if find_in_file(target, b"\x00", limit=TEXT_SNIFF_BYTES) >= 0:
+                return f"File preview for {display}:\nBinary file preview blocked."
+            if offset is not None:
+                part = read_byte_range(target, offset, self.config.file_preview_chars)
+            else:
+                part = read_line_range(target, start_line or 1, end_line, self.config.file_preview_chars)
         except OSError as exc:
-            return f"Unable to read {self.config.display_path(target)}: {exc}"
+            return f"Unable to read {display}: {exc}"
+
+        if offset is not None:
+            header = f"Bytes {part.start}-{part.end} of {part.total} in {display}:"
+            more = f"offset={part.end}"
+        elif part.end < part.start:
+            return f"Lines of {display}: none in range ({part.total} lines)"
+        else:
+            header = f"Lines {part.start}-{part.end} of {part.total} in {display}:"
+            if part.resume_offset is not None:
+                more = f"offset={part.resume_offset}"
+            else:
+                more = f"start_line={part.end + 1}"
+        body = part.text or "(empty range)"
+        if part.truncated:
+            body += f"\n... (truncated; continue with {more})"
+        return f"{header}\n{body}"
+
+    def compact(self, observation: str) -> str | None:
+        header, _, body = observation.partition("\n")
+        lines = body.splitlines()
+        if len(lines) <= COMPACT_PREVIEW_LINES:
+            return None
 
-        return f"File preview for {self.config.display_path(target)}:\n{preview}"
+        # Range reads start numbering at their first line.
+        first = RANGE_HEADER_PATTERN.match(header)
+        outline = [
+            f"{number}: {line.strip()}"
+            for number, line in enumerate(lines, start=int(first.group(1)) if first else 1)
+            if OUTLINE_LINE_PATTERN.match(line)
+        ]
+        if outline:
+            rendered = outline[:COMPACT_OUTLINE_LIMIT]
+            if len(outline) > COMPACT_OUTLINE_LIMIT:
+                rendered.append(f"... ({len(outline) - COMPACT_OUTLINE_LIMIT} more outline entries)")
+            return (
+                f"{header}\n(outline of {len(lines)} previewed lines; read the file again for full text)\n"
+                + "\n".join(rendered)
+            )
+        return f"{header}\n" + keep_head_tail_lines(body, head=COMPACT_PREVIEW_LINES)
 
 
 class ListDirectoryTool(Tool):
@@ -153,3 +679,6 @@ class ListDirectoryTool(Tool):
             )
 
         return f"Directory listing for {self.config.display_path(target)}:\n" + "\n".join(rendered)
+
+    def compact(self, observation: str) -> str | None:
+        return keep_head_tail_lines(observation, head=COMPACT_DIRECTORY_ENTRIES + 1)
@@ -0,0 +1,466 @@
+"""Single-pass definition and reference scan behind ``find_function``.
+
+Each file is opened once: the first block doubles as the binary sniff, and
+files that do not contain the name at all are dropped before decoding, so
+only the few files that mention it are parsed. Python definitions come from
+``ast`` (with their enclosing classes), other languages use line patterns,
+and references are whole-word matches, all on the same buffer.
+
+Large trees are split into batches and scanned in a process pool. Batches
+come back in submission order, so ``merge_matches`` sees files in walk order
+and the output is the same whether the scan ran serially or in parallel.
+
+``python_outline`` also collects each call site with its target resolved from
+imports where possible; the symbol index stores those as its call graph.
+"""
+
+from __future__ import annotations
+
+import ast
+from collections.abc import Iterable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from functools import lru_cache
+import mmap
+import multiprocessing
+import os
+from pathlib import Path
+import re
+from typing import BinaryIO
+
+from lilbot.tools.filesystem import TEXT_FILE_EXTENSIONS, MMAP_MIN_BYTES, TEXT_SNIFF_BYTES
+from lilbot.utils.formatting import truncate_text
+
+
+REFERENCES_PER_FILE = 5
+PARALLEL_SCAN_MIN_FILES = 2000
+SCAN_BATCH_FILES = 256
+MAX_SCAN_WORKERS = 8
+HEURISTIC_KIND = "heuristic definition"
+MODULE_CALLER = "<module>"
+HEURISTIC_DEFINITION_PATTERNS = (
+    re.compile(r"^\s*function\s+(?P<name>\w+)\s*\("),
+    re.compile(r"^\s*(?:const|let|var)\s+(?P<name>\w+)\s*=\s*(?:async\s*)?\("),
+    re.compile(r"^\s*func\s+(?P<name>\w+)\s*\("),
+    re.compile(r"^\s*fn\s+(?P<name>\w+)\b"),
+)
+
+
+@dataclass(frozen=True, slots=True)
+class FileMatches:
+    """Definitions and references for one file, already formatted for output."""
+
+    relative: str
+    definitions: tuple[str, ...] = ()
+    heuristic: str | None = None
+    references: tuple[str, ...] = ()
+
+
+@dataclass(frozen=True, slots=True)
+class Definition:
+    """One function definition; ``label`` is class-qualified for Python methods."""
+
+    line: int
+    kind: str
+    label: str
+    name: str
+    snippet: str
+
+    def render(self, relative: str) -> str:
+        if self.kind == HEURISTIC_KIND:
+            return f"{relative}:{self.line} {self.kind}\n    {self.snippet}"
+        return f"{relative}:{self.line} {self.kind} {self.label}\n    {self.snippet}"
+
+
+@dataclass(frozen=True, slots=True)
+class CallSite:
+    """One call in a Python module.
+
+    ``caller`` is the enclosing function's class-qualified label, or
+    ``MODULE_CALLER`` for module and class bodies. ``name`` is the called
+    name; ``target`` is its dotted path when ``python_outline`` could resolve it.
+    """
+
+    line: int
+    caller: str
+    name: str
+    target: str | None
+
+
+def scan_file(path: Path, relative: str, name: str) -> FileMatches | None:
+    """Read ``path`` once and collect every match for ``name``; None if it has none."""
+
+    text = read_source(path, must_contain=name)
+    if text is None:
+        return None
+    lines = text.splitlines()
+    definitions: tuple[str, ...] = ()
+    heuristic = None
+    if path.suffix == ".py":
+        definitions = tuple(
+            definition.render(relative)
+            for definition in python_definitions(text, lines)
+            if definition.name == name
+        )
+    else:
+        heuristic = _heuristic_definition(lines, relative, name)
+    references = tuple(_text_references(lines, relative, name))
+    if not (definitions or heuristic or references):
+        return None
+    return FileMatches(relative=relative, definitions=definitions, heuristic=heuristic, references=references)
+
+
+def read_source(path: Path, *, must_contain: str | None = None) -> str | None:
+    """Read a text file in one pass; None for binary or unreadable files.
+
+    With ``must_contain``, files whose bytes do not include it are rejected
+    before they are decoded, and large ones before they are read at all.
+    """
+
+    try:
+        with path.open("rb") as handle:
+            needle = must_contain.encode("utf-8") if must_contain is not None else None
+            # Large files are searched in place first so misses are never read into memory.
+            if (
+                needle is not None
+                and os.fstat(handle.fileno()).st_size >= MMAP_MIN_BYTES
+                and not _mapped_contains(handle, needle)
+            ):
+                return None
+            data = handle.read(TEXT_SNIFF_BYTES)
+            if path.suffix.lower() not in TEXT_FILE_EXTENSIONS and b"\x00" in data:
+                return None
+            data += handle.read()
+    except OSError:
+        return None
+    if needle is not None and needle not in data:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+def _mapped_contains(handle: BinaryIO, needle: bytes) -> bool:
+    """Whether the open file contains ``needle``, searched through a map of the same descriptor."""
+
+    try:
+        mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # Some filesystems cannot be mapped; the caller checks after reading instead.
+        return True
+    with mapped:
+        return mapped.find(needle) >= 0
+
+
+def scan_files(
+    files: Sequence[tuple[Path, str]],
+    name: str,
+    *,
+    workers: int | None = None,
+) -> Iterator[FileMatches]:
+    """Yield matches for ``(path, relative)`` pairs in input order.
+
+    Trees with at least ``PARALLEL_SCAN_MIN_FILES`` files are scanned in a
+    process pool when more than one CPU is available. Closing the iterator
+    early cancels batches that have not started.
+    """
+
+    if workers is None:
+        workers = min(os.cpu_count() or 1, MAX_SCAN_WORKERS)
+    if workers < 2 or len(files) < PARALLEL_SCAN_MIN_FILES:
+        for path, relative in files:
+            matches = scan_file(path, relative, name)
+            if matches is not None:
+                yield matches
+        return
+
+    batches = [
+        ([(str(path), relative) for path, relative in files[offset : offset + SCAN_BATCH_FILES]], name)
+        for offset in range(0, len(files), SCAN_BATCH_FILES)
+    ]
+    try:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=pool_context())
+    except (OSError, ValueError):
+        yield from scan_files(files, name, workers=1)
+        return
+    finished = 0
+    try:
+        # map() returns results in submission order, which keeps the merge deterministic.
+        for batch in executor.map(_scan_batch, batches):
+            yield from batch
+            finished += 1
+    except BrokenProcessPool:
+        # Workers could not start (or died); finish the remaining batches here.
+        yield from scan_files(files[finished * SCAN_BATCH_FILES :], name, workers=1)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def merge_matches(results: Iterable[FileMatches], *, limit: int) -> tuple[list[str], list[str]]:
+    """Combine per-file matches in walk order, keeping at most ``limit`` of each kind."""
+
+    definitions: list[str] = []
+    references: list[str] = []
+    for matches in results:
+        definitions.extend(matches.definitions)
+        if matches.heuristic and len(definitions) < limit:
+            definitions.append(matches.heuristic)
+        if len(references) < limit:
+            references.extend(matches.references)
+        if len(definitions) >= limit and len(references) >= limit:
+            break
+    return definitions[:limit], references[:limit]
+
+
+def _scan_batch(batch: tuple[list[tuple[str, str]], str]) -> list[FileMatches]:
+    paths, name = batch
+    results = []
+    for path, relative in paths:
+        matches = scan_file(Path(path), relative, name)
+        if matches is not None:
+            results.append(matches)
+    return results
+
+
+def pool_context() -> multiprocessing.context.BaseContext:
+    """Start method for scan worker pools: forkserver where available, else spawn."""
+
+    # Forking a process that may be running scheduler threads is unsafe; forkserver is not.
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def parse_python(source: str) -> ast.Module | None:
+    try:
+        return ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+
+
+def python_definitions(source: str, lines: list[str]) -> list[Definition]:
+    """Every function and method in a Python module, qualified by enclosing classes."""
+
+    tree = parse_python(source)
+    if tree is None:
+        return []
+    return python_outline(tree, lines)[0]
+
+
+def python_module_name(relative: str) -> str:
+    """Dotted module path for a workspace-relative ``.py`` file (packages drop ``__init__``)."""
+
+    parts = relative[: -len(".py")].split("/") if relative.endswith(".py") else relative.split("/")
+    if parts[-1] == "__init__" and len(parts) > 1:
+        parts.pop()
+    return ".".join(parts)
+
+
+def python_outline(
+    tree: ast.Module,
+    lines: list[str] | None,
+    relative: str | None = None,
+) -> tuple[list[Definition], list[CallSite]]:
+    """Definitions (when ``lines`` is given) and call sites (when ``relative`` is) in one pass.
+
+    Call targets are dotted paths such as ``pkg.service.Session.close``. They
+    are resolved from the module's imports (wherever they appear), its
+    top-level functions and classes, and ``self.``/``cls.`` method calls
+    inside a class. Anything else (calls on local variables or return values,
+    builtins) is recorded by name only.
+    """
+
+    definitions: list[Definition] = []
+    # (line, caller, name, dotted chain, enclosing classes); resolved once every import is known.
+    raw_calls: list[tuple[int, str | None, str, str | None, tuple[str, ...]]] = []
+    imports: list[ast.Import | ast.ImportFrom] = []
+    stack: list[tuple[ast.AST, tuple[str, ...], str | None]] = [(tree, (), None)]
+    while stack:
+        node, classes, caller = stack.pop()
+        if isinstance(node, ast.ClassDef):
+            classes = (*classes, node.name)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            if lines is not None:
+                kind = "definition" if isinstance(node, ast.FunctionDef) else "async definition"
+                definitions.append(_python_definition(node, lines, list(classes), kind=kind))
+            caller = ".".join((*classes, node.name))
+        elif relative is None:
+            pass
+        elif isinstance(node, ast.Call):
+            called = _called_name(node.func)
+            if called is not None:
+                raw_calls.append((node.lineno, caller, *called, classes))
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            imports.append(node)
+        # Reversed so the stack pops children in source order, like a recursive visit.
+        stack.extend((child, classes, caller) for child in reversed(list(ast.iter_child_nodes(node))))
+
+    if relative is None:
+        return definitions, []
+
+    module = python_module_name(relative)
+    package = module if relative.endswith("__init__.py") else module.rpartition(".")[0]
+    bindings: dict[str, str] = {
+        node.name: f"{module}.{node.name}"
+        for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+    }
+    for node in imports:
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    bindings[alias.asname] = alias.name
+                else:
+                    root = alias.name.partition(".")[0]
+                    bindings[root] = root
+        else:
+            source = _resolve_import(package, node.module, node.level)
+            for alias in node.names:
+                if alias.name != "*":
+                    bindings[alias.asname or alias.name] = f"{source}.{alias.name}" if source else alias.name
+
+    calls = [
+        CallSite(
+            line=line,
+            caller=caller or MODULE_CALLER,
+            name=name,
+            target=_resolve_call(dotted, bindings, module, classes, in_function=caller is not None),
+        )
+        for line, caller, name, dotted, classes in raw_calls
+    ]
+    return definitions, calls
+
+
+def _resolve_call(
+    dotted: str | None,
+    bindings: dict[str, str],
+    module: str,
+    classes: tuple[str, ...],
+    *,
+    in_function: bool,
+) -> str | None:
+    if dotted is None:
+        return None
+    root, _, rest = dotted.partition(".")
+    if root in {"self", "cls"}:
+        # Only direct method calls resolve; `self.client.get()` is a call on an attribute's value.
+        if "." in rest or not rest or not (classes and in_function):
+            return None
+        return f"{module}.{'.'.join(classes)}.{rest}"
+    bound = bindings.get(root)
+    if bound is None:
+        return None
+    return f"{bound}.{rest}" if rest else bound
+
+
+def _called_name(func: ast.expr) -> tuple[str, str | None] | None:
+    """The called name and, for plain dotted chains, the whole chain."""
+
+    if isinstance(func, ast.Name):
+        return func.id, func.id
+    if not isinstance(func, ast.Attribute):
+        return None
+    parts = [func.attr]
+    value = func.value
+    while isinstance(value, ast.Attribute):
+        parts.append(value.attr)
+        value = value.value
+    if not isinstance(value, ast.Name):
+        return func.attr, None
+    parts.append(value.id)
+    return func.attr, ".".join(reversed(parts))
+
+
+def _resolve_import(package: str, module: str | None, level: int) -> str:
+    if not level:
+        return module or ""
+    parts = package.split(".") if package else []
+    if level > 1:
+        parts = parts[: len(parts) - (level - 1)] if level - 1 <= len(parts) else []
+    if module:
+        parts.append(module)
+    return ".".join(parts)
+
+
+def heuristic_definitions(lines: list[str]) -> list[Definition]:
+    """Function definitions in non-Python sources found by ``HEURISTIC_DEFINITION_PATTERNS``."""
+
+    definitions: list[Definition] = []
+    for index, line in enumerate(lines, start=1):
+        for pattern in HEURISTIC_DEFINITION_PATTERNS:
+            match = pattern.match(line)
+            if match:
+                name = match.group("name")
+                definitions.append(
+                    Definition(
+                        line=index,
+                        kind=HEURISTIC_KIND,
+                        label=name,
+                        name=name,
+                        snippet=_snippet(lines, index),
+                    )
+                )
+                break
+    return definitions
+
+
+def format_reference(relative: str, line_number: int, line: str) -> str:
+    return f"{relative}:{line_number} {truncate_text(line.strip(), 220)}"
+
+
+def _python_definition(
+    node: ast.FunctionDef | ast.AsyncFunctionDef,
+    lines: list[str],
+    class_stack: list[str],
+    *,
+    kind: str,
+) -> Definition:
+    prefix = ".".join(class_stack)
+    return Definition(
+        line=node.lineno,
+        kind=kind,
+        label=f"{prefix}.{node.name}" if prefix else node.name,
+        name=node.name,
+        snippet=_snippet(lines, node.lineno),
+    )
+
+
+def _heuristic_definition(lines: list[str], relative: str, name: str) -> str | None:
+    patterns = _heuristic_patterns(name)
+    for index, line in enumerate(lines, start=1):
+        if name in line and any(pattern.search(line) for pattern in patterns):
+            return f"{relative}:{index} {HEURISTIC_KIND}\n    {_snippet(lines, index)}"
+    return None
+
+
+def _text_references(lines: list[str], relative: str, name: str) -> list[str]:
+    pattern = _reference_pattern(name)
+    matches: list[str] = []
+    for line_number, line in enumerate(lines, start=1):
+        if name not in line or not pattern.search(line):
+            continue
+        matches.append(format_reference(relative, line_number, line))
+        if len(matches) >= REFERENCES_PER_FILE:
+            break
+    return matches
+
+
+@lru_cache(maxsize=32)
+def _heuristic_patterns(name: str) -> tuple[re.Pattern[str], ...]:
+    escaped = re.escape(name)
+    return (
+        re.compile(rf"^\s*function\s+{escaped}\s*\("),
+        re.compile(rf"^\s*(?:const|let|var)\s+{escaped}\s*=\s*(?:async\s*)?\("),
+        re.compile(rf"^\s*func\s+{escaped}\s*\("),
+        re.compile(rf"^\s*fn\s+{escaped}\b"),
+    )
+
+
+@lru_cache(maxsize=32)
+def _reference_pattern(name: str) -> re.Pattern[str]:
+    return re.compile(rf"\b{re.escape(name)}\b")
+
+
+def _snippet(lines: list[str], line_number: int, *, window: int = 1) -> str:
+    start = max(1, line_number - window)
+    end = min(len(lines), line_number + window)
+    selected = [lines[index - 1].rstrip() for index in range(start, end + 1)]
+    return " | ".join(truncate_text(line.strip(), 100) for line in selected if line.strip())
@@ -0,0 +1,162 @@
+"""Regex content search behind ``grep_workspace``.
+
+Patterns are compiled to bytes regexes and run directly over each file's
+bytes. Files of at least ``MMAP_MIN_BYTES`` are memory-mapped (see
+``lilbot.tools.filesystem.mapped_bytes``), so a file without a match is
+searched in the page cache and never copied or decoded; only matching lines
+are decoded. Binary files are skipped by the same rules as
+``is_probably_text`` (the suffix, then a NUL in the first block), checked on
+the buffer that is already open.
+
+Large trees are searched in batches in a process pool, like
+``lilbot.tools.function_scan.scan_files``. Results come back in walk order,
+and each batch stops once it alone has ``limit`` matches. Closing the
+iterator, which the caller does as soon as it has enough, cancels batches
+that have not started.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+import fnmatch
+import mmap
+import os
+import re
+
+from lilbot.tools.filesystem import TEXT_FILE_EXTENSIONS, TEXT_SNIFF_BYTES, mapped_bytes
+from lilbot.tools.function_scan import (
+    MAX_SCAN_WORKERS,
+    PARALLEL_SCAN_MIN_FILES,
+    SCAN_BATCH_FILES,
+    format_reference,
+    pool_context,
+)
+
+
+@dataclass(frozen=True)
+class GrepMatch:
+    relative: str
+    line: int
+    text: str
+
+    def render(self) -> str:
+        return format_reference(self.relative, self.line, self.text)
+
+
+def compile_grep_pattern(pattern: str) -> re.Pattern[bytes]:
+    """Compile a user pattern for searching raw file bytes; raises ``re.error`` if invalid."""
+
+    return re.compile(pattern.encode("utf-8"), re.MULTILINE)
+
+
+def glob_matcher(glob: str) -> re.Pattern[str]:
+    """Match workspace-relative paths; globs without a ``/`` match file names anywhere."""
+
+    translated = fnmatch.translate(glob)
+    return re.compile(translated if "/" in glob else f"(?:.*/)?{translated}")
+
+
+def grep_file(path: str, relative: str, pattern: re.Pattern[bytes], *, limit: int) -> list[GrepMatch]:
+    """Up to ``limit`` matching lines of one file, one entry per line; empty for binary files."""
+
+    try:
+        with mapped_bytes(path) as buffer:
+            suffix = os.path.splitext(path)[1].lower()
+            if suffix not in TEXT_FILE_EXTENSIONS and buffer.find(b"\x00", 0, TEXT_SNIFF_BYTES) >= 0:
+                return []
+            return _grep_buffer(buffer, relative, pattern, limit)
+    except OSError:
+        return []
+
+
+def grep_files(
+    files: Sequence[tuple[str, str]],
+    pattern: re.Pattern[bytes],
+    *,
+    limit: int,
+    workers: int | None = None,
+) -> Iterator[GrepMatch]:
+    """Yield matches for ``(path, relative)`` string pairs in input order.
+
+    Trees with at least ``PARALLEL_SCAN_MIN_FILES`` files are searched in a
+    process pool when more than one CPU is available. Closing the iterator
+    early cancels batches that have not started.
+    """
+
+    if workers is None:
+        workers = min(os.cpu_count() or 1, MAX_SCAN_WORKERS)
+    if workers < 2 or len(files) < PARALLEL_SCAN_MIN_FILES:
+        remaining = limit
+        for path, relative in files:
+            matches = grep_file(path, relative, pattern, limit=remaining)
+            yield from matches
+            remaining -= len(matches)
+            if remaining <= 0:
+                return
+        return
+
+    batches = [
+        (files[offset : offset + SCAN_BATCH_FILES], pattern, limit)
+        for offset in range(0, len(files), SCAN_BATCH_FILES)
+    ]
+    try:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=pool_context())
+    except (OSError, ValueError):
+        yield from grep_files(files, pattern, limit=limit, workers=1)
+        return
+    finished = 0
+    found = 0
+    try:
+        # map() returns results in submission order, so matches stay in walk order.
+        for batch in executor.map(_grep_batch, batches):
+            yield from batch
+            finished += 1
+            found += len(batch)
+            if found >= limit:
+                return
+    except BrokenProcessPool:
+        # Workers could not start (or died); finish the remaining batches here.
+        yield from grep_files(files[finished * SCAN_BATCH_FILES :], pattern, limit=limit - found, workers=1)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _grep_batch(batch: tuple[Sequence[tuple[str, str]], re.Pattern[bytes], int]) -> list[GrepMatch]:
+    paths, pattern, limit = batch
+    results: list[GrepMatch] = []
+    for path, relative in paths:
+        results.extend(grep_file(path, relative, pattern, limit=limit - len(results)))
+        if len(results) >= limit:
+            break
+    return results
+
+
+def _grep_buffer(
+    buffer: bytes | mmap.mmap,
+    relative: str,
+    pattern: re.Pattern[bytes],
+    limit: int,
+) -> list[GrepMatch]:
+    matches: list[GrepMatch] = []
+    position = 0
+    line_number = 1
+    counted_to = 0
+    while len(matches) < limit:
+        match = pattern.search(buffer, position)
+        if match is None:
+            break
+        start = buffer.rfind(b"\n", 0, match.start()) + 1
+        end = buffer.find(b"\n", match.start())
+        end = len(buffer) if end < 0 else end
+        # Count newlines only over the stretch since the previous match.
+        line_number += buffer[counted_to:start].count(b"\n")
+        counted_to = start
+        matches.append(GrepMatch(relative, line_number, buffer[start:end].decode("utf-8", errors="replace")))
+        # One entry per line: resume after this line, so later matches on it are skipped.
+        position = end + 1
+        if position > len(buffer):
+            break
+    return matches
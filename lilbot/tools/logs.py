@@ -7,11 +7,13 @@ import re
 
 from lilbot.tools.base import Tool
 from lilbot.tools.filesystem import tail_file
+from lilbot.utils.formatting import limit_section_items
 
 
 TIMESTAMP_PREFIX_PATTERN = re.compile(
     r"^(?:[A-Z][a-z]{2}\s+\d+\s+\d\d:\d\d:\d\d|\d{4}-\d{2}-\d{2}[T\s]\d\d:\d\d:\d\d(?:\.\d+)?)\s+"
 )
+COMPACT_LOG_ITEMS = 2
 
 
 class SummarizeLogTool(Tool):
@@ -75,6 +77,9 @@ class SummarizeLogTool(Tool):
 
         return "\n".join(summary_lines)
 
+    def compact(self, observation: str) -> str | None:
+        return limit_section_items(observation, COMPACT_LOG_ITEMS)
+
 
 def _normalize_log_line(line: str) -> str:
     stripped = TIMESTAMP_PREFIX_PATTERN.sub("", line.strip())
@@ -4,7 +4,7 @@ from __future__ import annotations
 
 from collections.abc import Iterable, Mapping, Sequence
 
-from lilbot.tools.base import Tool
+from lilbot.tools.base import Tool, ToolResult
 
 
 class ToolRegistry:
@@ -40,5 +40,23 @@ class ToolRegistry:
         return "\n".join(lines) if lines else "No tools available."
 
     def execute(self, name: str, arguments: Mapping[str, object] | None = None) -> str:
-        tool = self.get(name)
-        return str(tool.execute(**dict(arguments or {})))
+        return self.run(name, arguments).text
+
+    def run(self, name: str, arguments: Mapping[str, object] | None = None) -> ToolResult:
+        """Execute a tool, keeping whether its result came from a cache."""
+
+        return self.get(name).run(**dict(arguments or {}))
+
+    def compact(self, name: str, observation: str) -> str | None:
+        """Return the tool's compact transcript rendering when it is actually shorter."""
+
+        tool = self._tools.get(name)
+        if tool is None:
+            return None
+        try:
+            compacted = tool.compact(observation)
+        except Exception:
+            return None
+        if compacted is None or len(compacted) >= len(observation):
+            return None
+        return compacted
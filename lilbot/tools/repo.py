@@ -2,18 +2,31 @@
 
 from __future__ import annotations
 
-import ast
 from collections import Counter
+from contextlib import closing
+from itertools import islice
+import os
 from pathlib import Path
 import re
-
-from lilbot.tools.base import Tool
-from lilbot.tools.filesystem import (
-    is_probably_text,
-    iter_workspace_files,
-    read_text_preview,
+import sqlite3
+import threading
+from typing import TYPE_CHECKING
+
+from lilbot.config import LilbotConfig
+from lilbot.tools.base import Tool, ToolResult
+from lilbot.tools.filesystem import find_in_file, list_workspace_files
+from lilbot.tools.function_scan import (
+    HEURISTIC_KIND,
+    format_reference,
+    merge_matches,
+    read_source,
+    scan_files,
 )
-from lilbot.utils.formatting import first_nonempty_line, truncate_text
+from lilbot.tools.grep import compile_grep_pattern, glob_matcher, grep_files
+from lilbot.utils.formatting import limit_section_items
+
+if TYPE_CHECKING:
+    from lilbot.retrieval.embeddings import EmbeddingBackend
 
 
 IMPORTANT_REPO_FILES = (
@@ -32,7 +45,17 @@ LIKELY_ENTRYPOINTS = {
     "manage.py",
     "server.py",
 }
+MAIN_GUARD_PATTERN = re.compile(rb"if\s+__name__\s*==\s*[\"']__main__[\"']\s*:")
 IGNORED_REPO_SUFFIXES = {".safetensors", ".bin", ".pt", ".pth", ".ckpt", ".onnx"}
+COMPACT_TRACE_ITEMS = 5
+COMPACT_MAP_FILES = 10
+DEFAULT_CALL_DEPTH = 2
+MAX_CALL_DEPTH = 5
+MAX_GREP_MATCHES = 200
+DEFAULT_SEARCH_RESULTS = 5
+MAX_SEARCH_RESULTS = 20
+SEARCH_SNIPPET_LINES = 12
+SEARCH_SNIPPET_CHARS = 160
 
 
 class SummarizeRepoTool(Tool):
@@ -41,58 +64,55 @@ class SummarizeRepoTool(Tool):
     args_schema = {"path": "Workspace-relative repository path. Defaults to '.'."}
 
     def execute(self, **kwargs: object) -> str:
+        return self.run(**kwargs).text
+
+    def run(self, **kwargs: object) -> ToolResult:
         path = str(kwargs.get("path", ".")).strip() or "."
         try:
             root = self.config.resolve_workspace_path(path, must_exist=True)
         except ValueError as exc:
-            return f"Path error: {exc}"
+            return ToolResult(f"Path error: {exc}")
 
         if not root.is_dir():
-            return f"Not a directory: {self.config.display_path(root)}"
+            return ToolResult(f"Not a directory: {self.config.display_path(root)}")
 
-        files = [
-            file
-            for file in iter_workspace_files(self.config, root, limit=self.config.repo_file_limit)
-            if file.suffix.lower() not in IGNORED_REPO_SUFFIXES
-        ]
-        if not files:
-            return f"Repository summary for {self.config.display_path(root)}:\n- no files found"
+        # Imported here because the retrieval package itself imports lilbot.tools.
+        from lilbot.retrieval.summaries import SummaryCache
+
+        try:
+            with SummaryCache.for_workspace(self.config) as cache:
+                summary = cache.summarize(self.config, root)
+            cache_hit = not summary.rebuilt
+        except (RuntimeError, sqlite3.Error):
+            # Without a usable cache file, build the same digests in memory.
+            with SummaryCache(":memory:") as cache:
+                summary = cache.summarize(self.config, root)
+            cache_hit = False
+        digest = summary.digest
+        if not digest.files:
+            return ToolResult(f"Repository summary for {self.config.display_path(root)}:\n- no files found", cache_hit)
 
-        extension_counter = Counter(file.suffix.lower() or "<no extension>" for file in files)
         directory_counter = Counter(
-            str(file.parent.relative_to(root)) or "."
-            for file in files
-            if file.parent != root
+            {directory: count for directory, count in digest.directories.items() if directory}
         )
-
-        key_files = [file for file in files if file.name in IMPORTANT_REPO_FILES]
-        entrypoints = [file.relative_to(root).as_posix() for file in files if _is_likely_entrypoint(file)]
-
         summary_lines = [
             f"Repository summary for {self.config.display_path(root)}:",
-            f"- scanned_files: {len(files)}",
-            f"- top_extensions: {_format_counter(extension_counter, 6)}",
+            f"- scanned_files: {digest.files}",
+            f"- top_extensions: {_format_counter(Counter(digest.extensions), 6)}",
             f"- busiest_directories: {_format_counter(directory_counter, 5)}",
         ]
 
-        if entrypoints:
+        if digest.entrypoints:
             summary_lines.append("- likely_entrypoints:")
-            for entrypoint in entrypoints[:5]:
+            for entrypoint in digest.entrypoints[:5]:
                 summary_lines.append(f"  {entrypoint}")
 
-        if key_files:
+        if digest.key_files:
             summary_lines.append("- key_file_previews:")
-            for file in key_files[:4]:
-                try:
-                    preview = read_text_preview(file, 300)
-                except OSError:
-                    continue
-                headline = first_nonempty_line(preview) or "(empty)"
-                summary_lines.append(
-                    f"  {file.relative_to(root).as_posix()}: {truncate_text(headline, 180)}"
-                )
+            for relative, headline in digest.key_files[:4]:
+                summary_lines.append(f"  {relative}: {headline}")
 
-        return "\n".join(summary_lines)
+        return ToolResult("\n".join(summary_lines), cache_hit)
 
 
 class FindFunctionTool(Tool):
@@ -117,150 +137,348 @@ class FindFunctionTool(Tool):
         if not root.is_dir():
             return f"Not a directory: {self.config.display_path(root)}"
 
-        definitions: list[str] = []
-        references: list[str] = []
-
-        for file_path in iter_workspace_files(self.config, root, limit=self.config.repo_file_limit):
-            if file_path.suffix.lower() in IGNORED_REPO_SUFFIXES:
-                continue
-            if not is_probably_text(file_path):
-                continue
-
-            relative = file_path.relative_to(root).as_posix()
-            if file_path.suffix == ".py":
-                definitions.extend(_find_python_definitions(file_path, relative, name))
-            elif len(definitions) < self.config.repo_reference_limit:
-                match = _find_heuristic_definition(file_path, relative, name)
-                if match:
-                    definitions.append(match)
-
-            if len(references) < self.config.repo_reference_limit:
-                references.extend(_find_text_references(file_path, relative, name))
+        # Imported here because the retrieval package itself imports lilbot.tools.
+        from lilbot.retrieval.symbols import is_indexed_symbol
+
+        definitions: list[str] | None = None
+        if is_indexed_symbol(name):
+            try:
+                definitions, references = self._lookup_symbol(name, root)
+            except (RuntimeError, sqlite3.Error):
+                definitions = None
+        if definitions is None:
+            files = [
+                (item.path, item.relative)
+                for item in list_workspace_files(self.config, root, limit=self.config.repo_file_limit).files
+                if item.is_text is not False and item.path.suffix.lower() not in IGNORED_REPO_SUFFIXES
+            ]
+            with closing(scan_files(files, name)) as results:
+                definitions, references = merge_matches(results, limit=self.config.repo_reference_limit)
 
         output = [f"Function trace for `{name}` under {self.config.display_path(root)}:"]
         if definitions:
             output.append("- definitions:")
-            output.extend(f"  {item}" for item in definitions[: self.config.repo_reference_limit])
+            output.extend(f"  {item}" for item in definitions)
         else:
             output.append("- definitions: none found")
 
         if references:
             output.append("- references:")
-            output.extend(f"  {item}" for item in references[: self.config.repo_reference_limit])
+            output.extend(f"  {item}" for item in references)
         else:
             output.append("- references: none found")
 
         return "\n".join(output)
 
+    def _lookup_symbol(self, name: str, root: Path) -> tuple[list[str], list[str]]:
+        """Answer from the persistent symbol index, which covers every workspace file."""
+
+        from lilbot.retrieval.symbols import SymbolIndex
+
+        prefix = root.relative_to(self.config.workspace_root).as_posix()
+        with SymbolIndex.for_workspace(self.config) as index:
+            index.refresh(self.config)
+            found = index.lookup(name, path_prefix=prefix)
+
+        limit = self.config.repo_reference_limit
+        definitions: list[str] = []
+        heuristic_paths: set[str] = set()
+        for path, definition in found.definitions:
+            if definition.kind == HEURISTIC_KIND:
+                # Like the scan, report the first pattern match per file.
+                if path in heuristic_paths:
+                    continue
+                heuristic_paths.add(path)
+            definitions.append(definition.render(_relative_to(path, prefix)))
+        if len(definitions) > limit:
+            definitions = [*definitions[:limit], f"... ({len(definitions) - limit} more)"]
+
+        references: list[str] = []
+        for mention in found.mentions:
+            if len(references) >= limit:
+                break
+            text = read_source(self.config.workspace_root / mention.path)
+            if text is None:
+                continue
+            lines = text.splitlines()
+            relative = _relative_to(mention.path, prefix)
+            references.extend(
+                format_reference(relative, number, lines[number - 1])
+                for number in mention.lines
+                if number <= len(lines)
+            )
+        shown = references[:limit]
+        remaining = sum(mention.line_count for mention in found.mentions) - len(shown)
+        if remaining > 0:
+            shown.append(f"... ({remaining} more lines in {len(found.mentions)} files)")
+        return definitions, shown
+
+    def compact(self, observation: str) -> str | None:
+        return limit_section_items(observation, COMPACT_TRACE_ITEMS)
+
+
+class GrepWorkspaceTool(Tool):
+    name = "grep_workspace"
+    description = "Search file contents with a Python regex; (?i) ignores case."
+    args_schema = {
+        "pattern": "Regex to search for.",
+        "path": "Workspace-relative path to search. Defaults to '.'.",
+        "glob": "Optional file filter such as '*.py'.",
+    }
+
+    def execute(self, **kwargs: object) -> str:
+        pattern = str(kwargs.get("pattern", ""))
+        path = str(kwargs.get("path", ".")).strip() or "."
+        glob = str(kwargs.get("glob", "") or "").strip()
+        if not pattern:
+            return "Search pattern is required."
+        try:
+            limit = max(1, min(int(kwargs.get("limit", self.config.repo_reference_limit)), MAX_GREP_MATCHES))
+        except (TypeError, ValueError):
+            return "Match limit must be an integer."
+        try:
+            compiled = compile_grep_pattern(pattern)
+        except re.error as exc:
+            return f"Invalid pattern: {exc}"
+
+        try:
+            root = self.config.resolve_workspace_path(path, must_exist=True)
+        except ValueError as exc:
+            return f"Path error: {exc}"
+
+        if root.is_file():
+            files = [(os.fspath(root), self.config.display_path(root).removeprefix("./"))]
+        else:
+            base = os.fspath(root)
+            matcher = glob_matcher(glob) if glob else None
+            files = [
+                (os.path.join(base, item.relative), item.relative)
+                for item in list_workspace_files(self.config, root).files
+                if item.is_text is not False
+                and os.path.splitext(item.relative)[1].lower() not in IGNORED_REPO_SUFFIXES
+                and (matcher is None or matcher.fullmatch(item.relative))
+            ]
+
+        with closing(grep_files(files, compiled, limit=limit + 1)) as results:
+            matches = list(islice(results, limit + 1))
+
+        output = [f"Matches for `{pattern}` under {self.config.display_path(root)}:"]
+        if not matches:
+            output.append("- matches: none found")
+            return "\n".join(output)
+        output.append("- matches:")
+        output.extend(f"  {match.render()}" for match in matches[:limit])
+        if len(matches) > limit:
+            output.append(f"  ... (stopped after {limit} matches)")
+        return "\n".join(output)
+
+    def compact(self, observation: str) -> str | None:
+        return limit_section_items(observation, COMPACT_TRACE_ITEMS)
+
+
+class TraceCallsTool(Tool):
+    name = "trace_calls"
+    description = "Trace who calls a Python function, or what it calls, over several hops."
+    args_schema = {
+        "name": "Function, Class.method, or dotted path.",
+        "direction": "'callers' or 'callees'.",
+        "depth": f"Hops, default {DEFAULT_CALL_DEPTH}.",
+        "path": "Workspace-relative scope. Defaults to '.'.",
+    }
+
+    def execute(self, **kwargs: object) -> str:
+        name = str(kwargs.get("name", "")).strip()
+        direction = str(kwargs.get("direction", "callers")).strip().lower() or "callers"
+        path = str(kwargs.get("path", ".")).strip() or "."
+        if not name:
+            return "Function name is required."
+        if direction not in {"callers", "callees"}:
+            return "Direction must be 'callers' or 'callees'."
+        try:
+            depth = max(1, min(int(kwargs.get("depth", DEFAULT_CALL_DEPTH)), MAX_CALL_DEPTH))
+        except (TypeError, ValueError):
+            return "Call depth must be an integer."
+
+        try:
+            root = self.config.resolve_workspace_path(path, must_exist=True)
+        except ValueError as exc:
+            return f"Path error: {exc}"
+
+        # Imported here because the retrieval package itself imports lilbot.tools.
+        from lilbot.retrieval.symbols import SymbolIndex, is_indexed_symbol
+
+        if not all(is_indexed_symbol(part) for part in name.split(".")):
+            return "Function name must be an identifier or a dotted path."
+
+        prefix = root.relative_to(self.config.workspace_root).as_posix()
+        try:
+            with SymbolIndex.for_workspace(self.config) as index:
+                index.refresh(self.config)
+                walk = index.callers if direction == "callers" else index.callees
+                graph = walk(name, depth=depth, limit=self.config.repo_reference_limit, path_prefix=prefix)
+        except (RuntimeError, sqlite3.Error) as exc:
+            return f"Call graph error: {exc}"
+
+        title = "Callers" if direction == "callers" else "Callees"
+        output = [f"{title} of `{name}` under {self.config.display_path(root)}:"]
+        if not graph.roots:
+            output.append("- definitions: none found")
+            return "\n".join(output)
+        output.append("- definitions:")
+        output.extend(f"  {definition.render(path)}" for path, definition in graph.roots)
+
+        if not graph.edges:
+            output.append(f"- {direction}: none found")
+            return "\n".join(output)
+        output.append(f"- {direction}:")
+        for hop in range(1, depth + 1):
+            for edge in (edge for edge in graph.edges if edge.hop == hop):
+                callee = edge.callee
+                if direction == "callees" and edge.callee_path and edge.callee_path != edge.path:
+                    callee += f" ({edge.callee_path})"
+                notes = [f"hop {hop}"] if hop > 1 else []
+                if edge.by_name:
+                    notes.append("by name")
+                suffix = f" [{', '.join(notes)}]" if notes else ""
+                output.append(f"  {edge.path}:{edge.line} {edge.caller} -> {callee}{suffix}")
+            if graph.omitted.get(hop):
+                output.append(f"  ... ({graph.omitted[hop]} more at hop {hop})")
+        return "\n".join(output)
+
+    def compact(self, observation: str) -> str | None:
+        return limit_section_items(observation, COMPACT_TRACE_ITEMS)
+
+
+class RepoMapTool(Tool):
+    name = "repo_map"
+    description = "Outline the most referenced files and their signatures."
+    args_schema = {
+        "path": "Workspace-relative scope. Defaults to '.'.",
+    }
+
+    def execute(self, **kwargs: object) -> str:
+        return self.run(**kwargs).text
+
+    def run(self, **kwargs: object) -> ToolResult:
+        path = str(kwargs.get("path", ".")).strip() or "."
+        try:
+            root = self.config.resolve_workspace_path(path, must_exist=True)
+        except ValueError as exc:
+            return ToolResult(f"Path error: {exc}")
+
+        if not root.is_dir():
+            return ToolResult(f"Not a directory: {self.config.display_path(root)}")
+
+        # Imported here because the retrieval package itself imports lilbot.tools.
+        from lilbot.retrieval.repo_map import build_repo_map
+        from lilbot.retrieval.symbols import SymbolIndex
+
+        try:
+            with SymbolIndex.for_workspace(self.config) as index:
+                index.refresh(self.config)
+                repo_map = build_repo_map(self.config, index, root, max_tokens=self.config.repo_map_tokens)
+        except (RuntimeError, sqlite3.Error) as exc:
+            return ToolResult(f"Repository map error: {exc}")
+        return ToolResult(repo_map.text, repo_map.cached)
+
+    def compact(self, observation: str) -> str | None:
+        # Older steps keep the ranked file list; signatures are cheap to map again.
+        lines = [line for line in observation.splitlines() if not line.startswith("    ")]
+        return limit_section_items("\n".join(lines), COMPACT_MAP_FILES)
+
+
+class SearchRepoTool(Tool):
+    name = "search_repo"
+    description = "Rank code and text snippets matching keywords or a description."
+    args_schema = {
+        "query": "What to find.",
+        "path": "Workspace-relative path to search. Defaults to '.'.",
+    }
+
+    def __init__(self, config: LilbotConfig) -> None:
+        super().__init__(config)
+        # The index is opened per call: its SQLite connections belong to the
+        # thread that opened them, and the scheduler runs sessions on several.
+        self._lock = threading.Lock()
+        self._embedding_backend: EmbeddingBackend | None = None
+        self._embedding_error: str | None = None
+        self._use_vectors = True
+
+    def execute(self, **kwargs: object) -> str:
+        query = str(kwargs.get("query", "")).strip()
+        path = str(kwargs.get("path", ".")).strip() or "."
+        if not query:
+            return "Search query is required."
+        try:
+            limit = max(1, min(int(kwargs.get("limit", DEFAULT_SEARCH_RESULTS)), MAX_SEARCH_RESULTS))
+        except (TypeError, ValueError):
+            return "Search limit must be an integer."
+
+        try:
+            root = self.config.resolve_workspace_path(path, must_exist=True)
+        except ValueError as exc:
+            return f"Path error: {exc}"
+
+        # Imported here because the retrieval package itself imports lilbot.tools.
+        from lilbot.retrieval.repository import RepositoryIndex, read_result_lines
+
+        prefix = root.relative_to(self.config.workspace_root).as_posix()
+        with self._lock:
+            index = RepositoryIndex(
+                self.config,
+                embedding_backend=self._embedding_backend,
+                use_vectors=self._use_vectors,
+            )
+            try:
+                results = index.search(query, k=limit, path_prefix=prefix)
+                # Keep the loaded model, or remember why it failed, for later calls.
+                self._embedding_backend = index.embedding_backend
+                self._embedding_error = self._embedding_error or index.embedding_error
+                self._use_vectors = self._embedding_backend is not None
+            except RuntimeError as exc:
+                return f"Search error: {exc}"
+            finally:
+                index.close()
+
+        output = [f"Search results for `{query}` under {self.config.display_path(root)}:"]
+        if self._embedding_error:
+            output.append(f"- note: lexical results only ({self._embedding_error})")
+        if not results:
+            output.append("- matches: none found")
+            return "\n".join(output)
+
+        output.append("- matches:")
+        for result in results:
+            label = f"{result.kind} {result.name}" if result.name else result.kind
+            output.append(f"  ./{result.path}:{result.start_line}-{result.end_line} ({label})")
+            for offset, line in enumerate(
+                read_result_lines(self.config, result, max_lines=SEARCH_SNIPPET_LINES)
+            ):
+                output.append(f"    {result.start_line + offset}: {line[:SEARCH_SNIPPET_CHARS]}")
+        return "\n".join(output)
+
+    def compact(self, observation: str) -> str | None:
+        # Older steps keep the ranked locations; the snippets can be re-read if needed.
+        lines = [line for line in observation.splitlines() if not line.startswith("    ")]
+        return limit_section_items("\n".join(lines), COMPACT_TRACE_ITEMS)
+
 
-def _is_likely_entrypoint(path: Path) -> bool:
+def is_likely_entrypoint(path: Path) -> bool:
     if path.name in LIKELY_ENTRYPOINTS:
         return True
     if path.suffix != ".py":
         return False
     try:
-        text = path.read_text(encoding="utf-8", errors="replace")
+        # The literal probe is much faster than the regex, which only runs on files that pass it.
+        return find_in_file(path, b"__main__") >= 0 and find_in_file(path, MAIN_GUARD_PATTERN) >= 0
     except OSError:
         return False
-    return bool(
-        re.search(r"if\s+__name__\s*==\s*[\"']__main__[\"']\s*:", text)
-    )
 
 
-def _find_python_definitions(path: Path, relative: str, name: str) -> list[str]:
-    try:
-        source = path.read_text(encoding="utf-8")
-    except OSError:
-        return []
-
-    try:
-        tree = ast.parse(source)
-    except SyntaxError:
-        return []
-
-    lines = source.splitlines()
-    matches: list[str] = []
-
-    class Visitor(ast.NodeVisitor):
-        def __init__(self) -> None:
-            self.class_stack: list[str] = []
-
-        def visit_ClassDef(self, node: ast.ClassDef) -> None:
-            self.class_stack.append(node.name)
-            self.generic_visit(node)
-            self.class_stack.pop()
-
-        def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
-            if node.name == name:
-                matches.append(_format_definition_match(relative, node.lineno, lines, self.class_stack, node.name, async_def=False))
-            self.generic_visit(node)
-
-        def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef) -> None:
-            if node.name == name:
-                matches.append(_format_definition_match(relative, node.lineno, lines, self.class_stack, node.name, async_def=True))
-            self.generic_visit(node)
-
-    Visitor().visit(tree)
-    return matches
-
-
-def _format_definition_match(
-    relative: str,
-    line_number: int,
-    lines: list[str],
-    class_stack: list[str],
-    name: str,
-    *,
-    async_def: bool,
-) -> str:
-    prefix = ".".join(class_stack)
-    label = f"{prefix}.{name}" if prefix else name
-    kind = "async definition" if async_def else "definition"
-    snippet = _snippet(lines, line_number)
-    return f"{relative}:{line_number} {kind} {label}\n    {snippet}"
-
-
-def _find_heuristic_definition(path: Path, relative: str, name: str) -> str | None:
-    try:
-        lines = path.read_text(encoding="utf-8", errors="replace").splitlines()
-    except OSError:
-        return None
-
-    patterns = [
-        re.compile(rf"^\s*function\s+{re.escape(name)}\s*\("),
-        re.compile(rf"^\s*(?:const|let|var)\s+{re.escape(name)}\s*=\s*(?:async\s*)?\("),
-        re.compile(rf"^\s*func\s+{re.escape(name)}\s*\("),
-        re.compile(rf"^\s*fn\s+{re.escape(name)}\b"),
-    ]
-    for index, line in enumerate(lines, start=1):
-        if any(pattern.search(line) for pattern in patterns):
-            return f"{relative}:{index} heuristic definition\n    {_snippet(lines, index)}"
-    return None
-
-
-def _find_text_references(path: Path, relative: str, name: str) -> list[str]:
-    try:
-        lines = path.read_text(encoding="utf-8", errors="replace").splitlines()
-    except OSError:
-        return []
-
-    pattern = re.compile(rf"\b{re.escape(name)}\b")
-    matches: list[str] = []
-    for line_number, line in enumerate(lines, start=1):
-        if not pattern.search(line):
-            continue
-        snippet = truncate_text(line.strip(), 220)
-        matches.append(f"{relative}:{line_number} {snippet}")
-        if len(matches) >= 5:
-            break
-    return matches
-
-
-def _snippet(lines: list[str], line_number: int, *, window: int = 1) -> str:
-    start = max(1, line_number - window)
-    end = min(len(lines), line_number + window)
-    selected = [lines[index - 1].rstrip() for index in range(start, end + 1)]
-    return " | ".join(truncate_text(line.strip(), 100) for line in selected if line.strip())
+def _relative_to(path: str, prefix: str) -> str:
+    if prefix and prefix != ".":
+        return path[len(prefix) + 1 :] if path != prefix else Path(path).name
+    return path
 
 
 def _format_counter(counter: Counter[str], limit: int) -> str:
@@ -7,7 +7,11 @@ import subprocess
 
 from lilbot.safety.shell_policy import ShellPolicy
 from lilbot.tools.base import Tool
-from lilbot.utils.formatting import truncate_text
+from lilbot.utils.formatting import keep_head_tail_lines, truncate_text
+
+
+COMPACT_OUTPUT_HEAD_LINES = 8
+COMPACT_OUTPUT_TAIL_LINES = 4
 
 
 class RunShellTool(Tool):
@@ -62,3 +66,13 @@ class RunShellTool(Tool):
             f"Exit code: {completed.returncode}\n"
             f"Output:\n{output}"
         )
+
+    def compact(self, observation: str) -> str | None:
+        header, marker, output = observation.partition("Output:\n")
+        if not marker:
+            return None
+        return header + marker + keep_head_tail_lines(
+            output,
+            head=COMPACT_OUTPUT_HEAD_LINES,
+            tail=COMPACT_OUTPUT_TAIL_LINES,
+        )
@@ -29,3 +29,57 @@ def summarize_observation(text: str, *, limit: int = 320) -> str:
     if not headline:
         return ""
     return truncate_text(headline, limit).replace("\n", " ")
+
+
+def estimate_tokens(text: str | None) -> int:
+    """Cheaply estimate how many model tokens a block of text will occupy."""
+
+    if not text:
+        return 0
+    return estimate_tokens_from_length(len(str(text)))
+
+
+def estimate_tokens_from_length(length: int) -> int:
+    """Estimate tokens for a text of ``length`` characters without loading it."""
+
+    return (max(0, int(length)) + 3) // 4
+
+
+def keep_head_tail_lines(text: str, *, head: int, tail: int = 0) -> str:
+    """Keep the first and last lines of a block, noting how many were omitted."""
+
+    lines = str(text).splitlines()
+    if len(lines) <= head + tail:
+        return str(text)
+    kept = lines[:head]
+    kept.append(f"... ({len(lines) - head - tail} lines omitted)")
+    if tail:
+        kept.extend(lines[-tail:])
+    return "\n".join(kept)
+
+
+def limit_section_items(text: str, limit: int) -> str:
+    """Keep at most ``limit`` indented items under each ``- section:`` header."""
+
+    kept: list[str] = []
+    items_in_section = 0
+    omitted = 0
+    for line in str(text).splitlines():
+        if line.startswith("  "):
+            # Continuation lines (deeper indent) follow the fate of their item.
+            is_item = not line.startswith("   ")
+            if is_item:
+                items_in_section += 1
+            if items_in_section > limit:
+                omitted += int(is_item)
+                continue
+            kept.append(line)
+            continue
+        if omitted:
+            kept.append(f"  ... ({omitted} more)")
+        items_in_section = 0
+        omitted = 0
+        kept.append(line)
+    if omitted:
+        kept.append(f"  ... ({omitted} more)")
+    return "\n".join(kept)
@@ -0,0 +1,184 @@
+"""Git helpers for listing workspace files.
+
+Inside a work tree, ``git ls-files`` already knows which files are tracked or
+untracked-but-not-ignored, so asking it is both faster and more accurate than
+walking the tree. Outside git, ``IgnoreRules`` applies ``.gitignore`` files
+the same way git would, so an exported or unpacked checkout is filtered the
+same as a cloned one.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import os
+from pathlib import Path
+import re
+import shutil
+import subprocess
+
+
+GIT_TIMEOUT_SECONDS = 30
+GITIGNORE_FILENAME = ".gitignore"
+
+
+def run_git(root: Path, *args: str) -> str | None:
+    """Run a read-only git command in ``root``; None if git is missing or it fails."""
+
+    if shutil.which("git") is None:
+        return None
+    try:
+        completed = subprocess.run(
+            ["git", "-C", str(root), *args],
+            capture_output=True,
+            timeout=GIT_TIMEOUT_SECONDS,
+            check=False,
+            env={**os.environ, "GIT_OPTIONAL_LOCKS": "0"},
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if completed.returncode != 0:
+        return None
+    return completed.stdout.decode("utf-8", errors="surrogateescape")
+
+
+def list_git_files(root: Path) -> list[str] | None:
+    """Paths under ``root`` (relative to it) that git tracks or would not ignore.
+
+    Tracked files deleted from the work tree are left out. Returns None when
+    ``root`` is not inside a git work tree.
+    """
+
+    listing = run_git(root, "ls-files", "-z", "-t", "-c", "-o", "-d", "--exclude-standard")
+    if listing is None:
+        return None
+    files: dict[str, None] = {}
+    deleted: set[str] = set()
+    for entry in listing.split("\0"):
+        if not entry:
+            continue
+        tag, _, relative = entry.partition(" ")
+        if relative.endswith("/"):
+            # An untracked nested repository is listed as a directory; git does not look inside.
+            continue
+        if tag == "R":
+            deleted.add(relative)
+        else:
+            files[relative] = None
+    return [relative for relative in files if relative not in deleted]
+
+
+@dataclass(frozen=True, slots=True)
+class IgnorePattern:
+    base: str
+    regex: re.Pattern[str]
+    negated: bool
+    directory_only: bool
+    anchored: bool
+
+
+class IgnoreRules:
+    """``.gitignore`` patterns collected from a directory and its parents.
+
+    Rules from deeper files come later and win, and within one file the last
+    matching pattern wins, as in git.
+    """
+
+    def __init__(self, patterns: tuple[IgnorePattern, ...] = ()) -> None:
+        self.patterns = patterns
+
+    def with_directory(self, directory: Path, relative: str) -> "IgnoreRules":
+        """Return these rules plus any ``.gitignore`` in ``directory``.
+
+        ``relative`` is the directory's path from the walk base ("" for the base
+        itself); ``is_ignored`` takes paths relative to the same base.
+        """
+
+        try:
+            text = (directory / GITIGNORE_FILENAME).read_text(encoding="utf-8", errors="replace")
+        except OSError:
+            return self
+        added = tuple(
+            pattern
+            for line in text.splitlines()
+            if (pattern := _parse_pattern(line, relative)) is not None
+        )
+        return IgnoreRules(self.patterns + added) if added else self
+
+    def is_ignored(self, relative: str, *, is_dir: bool = False) -> bool:
+        ignored = False
+        for pattern in self.patterns:
+            if pattern.directory_only and not is_dir:
+                continue
+            if pattern.base:
+                if not relative.startswith(pattern.base + "/"):
+                    continue
+                candidate = relative[len(pattern.base) + 1 :]
+            else:
+                candidate = relative
+            if not pattern.anchored:
+                candidate = candidate.rsplit("/", 1)[-1]
+            if pattern.regex.fullmatch(candidate):
+                ignored = not pattern.negated
+        return ignored
+
+
+def _parse_pattern(line: str, base: str) -> IgnorePattern | None:
+    if not line or line.startswith("#"):
+        return None
+    if not line.endswith("\\ "):
+        line = line.rstrip(" ")
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    elif line.startswith("\\"):
+        line = line[1:]
+    directory_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    anchored = "/" in line
+    line = line.lstrip("/")
+    return IgnorePattern(
+        base=base,
+        regex=re.compile(_translate_glob(line)),
+        negated=negated,
+        directory_only=directory_only,
+        anchored=anchored,
+    )
+
+
+def _translate_glob(pattern: str) -> str:
+    parts: list[str] = []
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if pattern.startswith("**/", index) and (index == 0 or pattern[index - 1] == "/"):
+            parts.append("(?:.*/)?")
+            index += 3
+        elif pattern.startswith("**", index) and index + 2 == len(pattern) and (index == 0 or pattern[index - 1] == "/"):
+            parts.append(".*")
+            index += 2
+        elif char == "*":
+            parts.append("[^/]*")
+            index += 1
+        elif char == "?":
+            parts.append("[^/]")
+            index += 1
+        elif char == "[":
+            end = pattern.find("]", index + 2)
+            if end == -1:
+                parts.append(re.escape(char))
+                index += 1
+                continue
+            body = pattern[index + 1 : end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            parts.append(f"[{body}]")
+            index = end + 1
+        elif char == "\\" and index + 1 < len(pattern):
+            parts.append(re.escape(pattern[index + 1]))
+            index += 2
+        else:
+            parts.append(re.escape(char))
+            index += 1
+    return "".join(parts)
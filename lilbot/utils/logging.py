@@ -35,6 +35,9 @@ class StepLogger:
     def observation(self, message: str) -> None:
         self._emit("OBSERVATION", summarize_observation(message))
 
+    def timing(self, message: str) -> None:
+        self._emit("TIMING", message)
+
     def error(self, message: str) -> None:
         self._emit("ERROR", message)
 
@@ -0,0 +1,51 @@
+"""JSON Lines trace export for offline latency analysis."""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+import json
+from pathlib import Path
+from typing import Any
+
+from lilbot.memory.session import LilbotSession
+from lilbot.prompts import rebuild_step_prompt
+
+
+def build_trace_record(
+    session: LilbotSession,
+    *,
+    mode: str,
+    model: object | None = None,
+) -> dict[str, Any]:
+    """Combine a finished session with run metadata into one trace record."""
+
+    record: dict[str, Any] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "mode": mode,
+        "model": getattr(model, "model_name", None),
+        "runtime_summary": getattr(model, "runtime_summary", "") or None,
+    }
+    record.update(session.to_trace_record())
+    return record
+
+
+def append_trace_record(path: Path, record: dict[str, Any]) -> None:
+    """Append one run record to a JSON Lines trace file."""
+
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("a", encoding="utf-8") as handle:
+            handle.write(json.dumps(record, ensure_ascii=True, sort_keys=True) + "\n")
+    except OSError as exc:
+        raise RuntimeError(f"Could not write Lilbot trace to {path}: {exc}") from exc
+
+
+def rebuild_trace_prompts(record: dict[str, Any]) -> list[str]:
+    """Reconstruct the full per-step prompts of a trace record.
+
+    Trace records store each distinct prompt head once plus per-step fields,
+    so their size grows linearly with the transcript instead of quadratically.
+    """
+
+    session = LilbotSession.from_trace_record(record)
+    return [rebuild_step_prompt(session, step) for step in session.steps]
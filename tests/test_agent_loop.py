@@ -1,25 +1,69 @@
 from __future__ import annotations
 
 from pathlib import Path
+import sqlite3
 import tempfile
+import time
 import unittest
 
 from lilbot.agent import LilbotAgent
 from lilbot.config import LilbotConfig
-from lilbot.model.base import BaseModel
+from lilbot.memory.session import SpilledText
+from lilbot.model.base import BaseModel, GenerationStats
+from lilbot.prompts import rebuild_step_prompt
 from lilbot.tools import build_default_tool_registry
+from lilbot.utils.formatting import estimate_tokens
+from lilbot.utils.trace import rebuild_trace_prompts
 
 
 class FakeModel(BaseModel):
     def __init__(self, outputs: list[str]) -> None:
         self.outputs = list(outputs)
         self.runtime_summary = "Loaded fake model"
+        self.prompts: list[str] = []
 
     def generate(self, prompt: str) -> str:
-        del prompt
+        self.prompts.append(prompt)
         return self.outputs.pop(0)
 
 
+class MeteredFakeModel(FakeModel):
+    def generate(self, prompt: str) -> str:
+        self.last_generation = GenerationStats(
+            prompt_tokens=len(prompt.split()),
+            generated_tokens=7,
+            prefill_seconds=0.25,
+            decode_seconds=0.5,
+        )
+        return super().generate(prompt)
+
+
+class BudgetAwareFakeModel(FakeModel):
+    max_new_tokens = 192
+
+    def __init__(
+        self,
+        outputs: list[str],
+        *,
+        delay_seconds: float = 0.0,
+        reported_generated_tokens: int | None = None,
+    ) -> None:
+        super().__init__(outputs)
+        self.delay_seconds = delay_seconds
+        self.reported_generated_tokens = reported_generated_tokens
+        self.requested_new_tokens: list[int | None] = []
+
+    def generate(self, prompt: str, *, max_new_tokens: int | None = None) -> str:
+        self.requested_new_tokens.append(max_new_tokens)
+        time.sleep(self.delay_seconds)
+        if self.reported_generated_tokens is not None:
+            self.last_generation = GenerationStats(
+                prompt_tokens=estimate_tokens(prompt),
+                generated_tokens=self.reported_generated_tokens,
+            )
+        return super().generate(prompt)
+
+
 class AgentLoopTests(unittest.TestCase):
     def setUp(self) -> None:
         self.tempdir = tempfile.TemporaryDirectory()
@@ -87,3 +131,193 @@ class AgentLoopTests(unittest.TestCase):
         self.assertTrue(result.answer.startswith("Based on the current snapshot:"))
         self.assertEqual(result.steps, 1)
         self.assertEqual(result.session.actions_taken, ["inspect_system"])
+
+    def test_steps_record_token_counts_and_timings(self) -> None:
+        agent = LilbotAgent(
+            MeteredFakeModel(
+                [
+                    'THOUGHT: inspect the README\nACTION: read_file\nARGS: {"path": "README.md"}',
+                    "THOUGHT: summarize\nFINAL: Done.",
+                ]
+            ),
+            self.registry,
+            max_steps=3,
+        )
+
+        result = agent.answer("what is this project?")
+        first, second = result.session.steps
+
+        self.assertGreater(first.prompt_tokens, 0)
+        self.assertEqual(first.generated_tokens, 7)
+        self.assertEqual(first.prefill_seconds, 0.25)
+        self.assertEqual(first.decode_seconds, 0.5)
+        self.assertIsNotNone(first.generation_seconds)
+        self.assertIsNotNone(first.tool_seconds)
+        self.assertFalse(first.tool_cache_hit)
+        self.assertIsNone(second.tool_seconds)
+
+        record = result.session.to_trace_record()
+        self.assertEqual(record["generated_tokens"], 14)
+        self.assertEqual(len(record["steps"]), 2)
+        self.assertIsNotNone(record["total_seconds"])
+
+    def test_older_observations_use_compact_rendering(self) -> None:
+        (self.workspace / "notes.txt").write_text(
+            "\n".join(f"line {index}" for index in range(60)) + "\n",
+            encoding="utf-8",
+        )
+        model = FakeModel(
+            [
+                'THOUGHT: read notes\nACTION: read_file\nARGS: {"path": "notes.txt"}',
+                'THOUGHT: read readme\nACTION: read_file\nARGS: {"path": "README.md"}',
+                "THOUGHT: done\nFINAL: Read both files.",
+            ]
+        )
+        agent = LilbotAgent(model, self.registry, max_steps=4)
+
+        result = agent.answer("read my notes and the README")
+
+        self.assertIn("line 59", model.prompts[1])
+        self.assertNotIn("line 59", model.prompts[2])
+        self.assertIn("lines omitted", model.prompts[2])
+        self.assertIn("line 59", result.session.steps[0].observation)
+        self.assertEqual(result.session.steps[1].prompt_tokens_saved, 0)
+        self.assertGreater(result.session.steps[2].prompt_tokens_saved, 0)
+
+    def test_last_allowed_step_forces_final_synthesis(self) -> None:
+        model = FakeModel(
+            [
+                'THOUGHT: inspect\nACTION: read_file\nARGS: {"path": "README.md"}',
+                'THOUGHT: more\nACTION: list_directory\nARGS: {"path": "."}',
+            ]
+        )
+        agent = LilbotAgent(model, self.registry, max_steps=2)
+
+        result = agent.answer("what is this project?")
+
+        self.assertIn("Do not request more tools", model.prompts[1])
+        self.assertNotIn("- read_file:", model.prompts[1])
+        self.assertIn("because the step limit was reached", result.answer)
+        self.assertIn("step 1 read_file", result.answer)
+        self.assertIn("Lilbot prototype", result.answer)
+
+    def _first_prompt_tokens(self, request: str) -> int:
+        """Token estimate of the first prompt a run sends, so budgets track the tool list."""
+
+        probe = FakeModel(["FINAL: probe."])
+        LilbotAgent(probe, self.registry, max_steps=4).answer(request)
+        return estimate_tokens(probe.prompts[0])
+
+    def test_token_budget_caps_new_tokens_and_forces_final(self) -> None:
+        model = BudgetAwareFakeModel(["THOUGHT: answer\nFINAL: Lilbot prototype."])
+        # Room for the first prompt plus fewer new tokens than the model's default.
+        budget = self._first_prompt_tokens("what is this project?") + 100
+        agent = LilbotAgent(model, self.registry, max_steps=4, max_run_tokens=budget)
+
+        result = agent.answer("what is this project?")
+
+        self.assertEqual(result.answer, "Lilbot prototype.")
+        self.assertEqual(model.requested_new_tokens[0], 100)
+        self.assertIn("Respond with a THOUGHT/FINAL block.", model.prompts[0])
+
+    def test_token_budget_stops_with_summary_when_spent(self) -> None:
+        model = BudgetAwareFakeModel(
+            ['THOUGHT: inspect\nACTION: read_file\nARGS: {"path": "README.md"}'],
+            reported_generated_tokens=1000,
+        )
+        # Just enough for two full steps, so the first may call a tool; its
+        # reported 1000 generated tokens then leave too little for a second.
+        budget = 2 * (self._first_prompt_tokens("what is this project?") + model.max_new_tokens)
+        agent = LilbotAgent(model, self.registry, max_steps=4, max_run_tokens=budget)
+
+        result = agent.answer("what is this project?")
+
+        self.assertEqual(len(model.prompts), 1)
+        self.assertEqual(result.session.actions_taken, ["read_file"])
+        self.assertIn("because the token budget was spent", result.answer)
+        self.assertIn("step 1 read_file", result.answer)
+
+    def test_wall_clock_budget_stops_run(self) -> None:
+        model = BudgetAwareFakeModel(
+            ['THOUGHT: inspect\nACTION: read_file\nARGS: {"path": "README.md"}'],
+            delay_seconds=0.05,
+        )
+        agent = LilbotAgent(model, self.registry, max_steps=4, max_run_seconds=0.01)
+
+        result = agent.answer("what is this project?")
+
+        self.assertEqual(result.steps, 1)
+        self.assertIn("because the wall-clock budget was spent", result.answer)
+
+    def test_step_prompts_are_rebuilt_from_compact_session_storage(self) -> None:
+        (self.workspace / "large.txt").write_text(
+            "\n".join(f"record {index:04d} " + "z" * 40 for index in range(100)) + "\n",
+            encoding="utf-8",
+        )
+        model = FakeModel(
+            [
+                'THOUGHT: read\nACTION: read_file\nARGS: {"path": "large.txt"}',
+                'THOUGHT: read\nACTION: read_file\nARGS: {"path": "README.md"}',
+                "THOUGHT: done\nFINAL: Both files read.",
+            ]
+        )
+        agent = LilbotAgent(model, self.registry, max_steps=3)
+
+        result = agent.answer("read the large file and README")
+        session = result.session
+
+        self.assertIsInstance(session.steps[0].observation_ref, SpilledText)
+        self.assertIn("record 0099", session.steps[0].observation)
+        self.assertEqual(len(session.prompt_heads), 2)
+        self.assertTrue(session.steps[2].final_only)
+        self.assertEqual(
+            [rebuild_step_prompt(session, step) for step in session.steps],
+            model.prompts,
+        )
+        self.assertEqual(rebuild_trace_prompts(session.to_trace_record()), model.prompts)
+        session.close()
+
+    def test_context_provider_is_queried_once_and_kept_in_every_head(self) -> None:
+        queries: list[str] = []
+
+        def provider(query: str) -> str:
+            queries.append(query)
+            return "Retrieved repository context:\n--- ./README.md:1-1 (block)\nLilbot prototype"
+
+        model = FakeModel(
+            [
+                'THOUGHT: check\nACTION: read_file\nARGS: {"path": "README.md"}',
+                "THOUGHT: done\nFINAL: Lilbot prototype.",
+            ]
+        )
+        agent = LilbotAgent(model, self.registry, max_steps=3, context_provider=provider)
+
+        result = agent.answer("chat memory block\nLatest user message:\nwhat is this?", retrieval_query="what is this?")
+
+        self.assertEqual(queries, ["what is this?"])
+        self.assertEqual(result.answer, "Lilbot prototype.")
+        for prompt in model.prompts:
+            self.assertIn("--- ./README.md:1-1 (block)", prompt)
+            self.assertLess(prompt.index("Retrieved repository context"), prompt.index("User request:"))
+        self.assertEqual(rebuild_step_prompt(result.session, result.session.steps[0]), model.prompts[0])
+
+    def test_context_provider_is_skipped_when_tools_are_disabled(self) -> None:
+        queries: list[str] = []
+        model = FakeModel(["THOUGHT: done\nFINAL: ok"])
+        agent = LilbotAgent(model, self.registry, context_provider=lambda query: queries.append(query) or "ctx")
+
+        agent.answer("explain ls", allowed_tools=[])
+
+        self.assertEqual(queries, [])
+
+    def test_failing_context_provider_does_not_stop_the_run(self) -> None:
+        def provider(query: str) -> str:
+            raise sqlite3.OperationalError("database is locked")
+
+        model = FakeModel(["THOUGHT: done\nFINAL: Lilbot prototype."])
+        agent = LilbotAgent(model, self.registry, context_provider=provider)
+
+        result = agent.answer("what is this?")
+
+        self.assertEqual(result.answer, "Lilbot prototype.")
+        self.assertNotIn("Retrieved repository context", model.prompts[0])
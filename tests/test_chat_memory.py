@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import unittest
+
+from lilbot.memory.chat import ChatMemory
+from lilbot.memory.session import LilbotSession, SessionStep
+from lilbot.utils.formatting import estimate_tokens
+
+
+def _session_with_tool(answer: str, action_args: dict[str, str], observation: str) -> LilbotSession:
+    session = LilbotSession(user_query="request", final_answer=answer)
+    step = SessionStep(number=1, action_name="read_file", action_args=action_args)
+    session.store_observation(step, observation)
+    session.steps.append(step)
+    return session
+
+
+class ChatMemoryTests(unittest.TestCase):
+    def test_tool_results_become_facts_and_repeat_calls_replace_them(self) -> None:
+        memory = ChatMemory()
+        memory.record_turn(
+            "what does the readme say?",
+            _session_with_tool("It describes Lilbot.", {"path": "README.md"}, "# Lilbot\nold text"),
+        )
+        memory.record_turn(
+            "check it again",
+            _session_with_tool("Still Lilbot.", {"path": "README.md"}, "# Lilbot\nnew text"),
+        )
+
+        rendered = memory.build_request("and the license?")
+
+        self.assertEqual(len(memory.facts), 1)
+        self.assertIn('read_file(path="README.md"): # Lilbot new text', rendered)
+        self.assertNotIn("old text", rendered)
+        self.assertIn("Turn 2 user: check it again", rendered)
+        self.assertTrue(rendered.endswith("Latest user message:\nand the license?"))
+
+    def test_memory_stays_within_token_budget(self) -> None:
+        memory = ChatMemory(token_budget=400)
+        for index in range(12):
+            memory.record_turn(
+                f"question {index} " + "detail " * 30,
+                _session_with_tool("answer " * 80, {"path": f"file_{index}.py"}, "def f():\n    pass\n"),
+            )
+
+        self.assertLessEqual(estimate_tokens(memory.render()), 400)
+        self.assertEqual(memory.turn_count, 12)
+        self.assertEqual(memory.recent[-1].number, 12)
+        self.assertTrue(memory.summary)
+
+    def test_summarizer_only_runs_when_summary_outgrows_its_share(self) -> None:
+        calls: list[str] = []
+
+        def summarize(notes: str) -> str:
+            calls.append(notes)
+            return "- condensed history"
+
+        memory = ChatMemory(token_budget=400, summarizer=summarize)
+        memory.record_turn("first", answer="short")
+        self.assertEqual(calls, [])
+
+        for index in range(10):
+            memory.record_turn(f"question {index}", answer="long answer " * 40)
+
+        self.assertTrue(calls)
+        self.assertIn("condensed history", memory.summary)
+
+    def test_snapshot_round_trip(self) -> None:
+        memory = ChatMemory()
+        memory.record_turn("hello", _session_with_tool("hi", {"path": "a.txt"}, "alpha"))
+
+        restored = ChatMemory.from_dict(memory.to_dict())
+
+        self.assertEqual(restored.render(), memory.render())
+        self.assertEqual(restored.turn_count, 1)
@@ -4,12 +4,14 @@ import io
 import json
 import os
 from pathlib import Path
+import re
 import tempfile
 import unittest
 from contextlib import redirect_stderr, redirect_stdout
 from unittest.mock import patch
 
 from lilbot.cli import main
+from lilbot.memory.session import LilbotSession
 from lilbot.model.base import BaseModel
 from lilbot.onboarding import SelfTestCheck, SelfTestResult
 
@@ -28,7 +30,25 @@ class FakeModel(BaseModel):
         return self.outputs.pop(0)
 
 
+class RecordingFakeModel(FakeModel):
+    def __init__(self, outputs: list[str]) -> None:
+        super().__init__(outputs)
+        self.prompts: list[str] = []
+
+    def generate(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        return self.outputs.pop(0)
+
+
 class CliTests(unittest.TestCase):
+    def setUp(self) -> None:
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache_dir = Path(cache_dir.name)
+        environment = patch.dict(os.environ, {"LILBOT_CACHE_DIR": cache_dir.name})
+        environment.start()
+        self.addCleanup(environment.stop)
+
     def test_one_shot_query_still_works(self) -> None:
         stdout = io.StringIO()
         stderr = io.StringIO()
@@ -183,3 +203,193 @@ class CliTests(unittest.TestCase):
             text = stdout.getvalue()
             self.assertIn("Lilbot is not ready for AI chat yet", text)
             self.assertIn("Deterministic commands", text)
+
+    def test_trace_option_writes_jsonl_record(self) -> None:
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        with tempfile.TemporaryDirectory() as tempdir:
+            trace_path = Path(tempdir) / "trace.jsonl"
+            with (
+                patch("lilbot.cli.build_model", return_value=FakeModel(["FINAL: Ready."])),
+                patch.object(LilbotSession, "close", autospec=True, side_effect=LilbotSession.close) as close,
+                redirect_stdout(stdout),
+                redirect_stderr(stderr),
+            ):
+                main(["--trace", str(trace_path), "what is lilbot?"])
+
+            records = [json.loads(line) for line in trace_path.read_text(encoding="utf-8").splitlines()]
+
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["mode"], "query")
+        self.assertEqual(records[0]["final_answer"], "Ready.")
+        self.assertEqual(records[0]["steps"][0]["number"], 1)
+        self.assertIn("generation_seconds", records[0]["steps"][0])
+        close.assert_called_once()
+
+    def test_batch_command_reports_failed_requests_and_keeps_going(self) -> None:
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        with tempfile.TemporaryDirectory() as tempdir:
+            requests_path = Path(tempdir) / "requests.txt"
+            requests_path.write_text("first\nsecond\nthird\n", encoding="utf-8")
+            # Only two replies: the third request's generate call raises IndexError.
+            with (
+                patch("lilbot.cli.build_model", return_value=FakeModel(["FINAL: one.", "FINAL: two."])),
+                redirect_stdout(stdout),
+                redirect_stderr(stderr),
+            ):
+                main(["batch", "--batch-size", "1", str(requests_path)])
+
+        text = stdout.getvalue()
+        self.assertIn("[3] third", text)
+        self.assertEqual(text.count("Error: pop from empty list"), 1)
+
+    def test_batch_command_rejects_an_empty_request_file(self) -> None:
+        stderr = io.StringIO()
+        with tempfile.TemporaryDirectory() as tempdir:
+            requests_path = Path(tempdir) / "requests.txt"
+            requests_path.write_text("# only a comment\n", encoding="utf-8")
+            with redirect_stderr(stderr), self.assertRaises(SystemExit) as exit_info:
+                main(["batch", str(requests_path)])
+
+        self.assertEqual(exit_info.exception.code, 2)
+        self.assertIn("batch requires at least one non-empty request line", stderr.getvalue())
+
+    def test_batch_command_answers_each_request(self) -> None:
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        with tempfile.TemporaryDirectory() as tempdir:
+            requests_path = Path(tempdir) / "requests.txt"
+            requests_path.write_text("first question\n\n# comment\nsecond question\n", encoding="utf-8")
+            with (
+                patch(
+                    "lilbot.cli.build_model",
+                    return_value=FakeModel(["FINAL: one.", "FINAL: two."]),
+                ),
+                patch.object(LilbotSession, "close", autospec=True, side_effect=LilbotSession.close) as close,
+                redirect_stdout(stdout),
+                redirect_stderr(stderr),
+            ):
+                main(["batch", str(requests_path)])
+
+        text = stdout.getvalue()
+        self.assertIn("[1] first question", text)
+        self.assertIn("[2] second question", text)
+        self.assertIn("Scheduler metrics:", stderr.getvalue())
+        self.assertEqual(close.call_count, 2)
+
+    def test_interactive_chat_is_saved_and_resumable(self) -> None:
+        stdout = io.StringIO()
+        with (
+            patch(
+                "lilbot.cli.build_model",
+                return_value=FakeModel(
+                    [
+                        'THOUGHT: inspect\nACTION: list_directory\nARGS: {"path": "."}',
+                        "THOUGHT: done\nFINAL: The repo has a README.",
+                    ]
+                ),
+            ),
+            patch("builtins.input", side_effect=["what is here?", "exit"]),
+            redirect_stdout(stdout),
+            redirect_stderr(io.StringIO()),
+        ):
+            main([])
+
+        match = re.search(r"lilbot --resume (\w+)", stdout.getvalue())
+        self.assertIsNotNone(match)
+        session_id = match.group(1)
+        self.assertTrue((self.cache_dir / "sessions.sqlite3").exists())
+
+        listing = io.StringIO()
+        with redirect_stdout(listing), redirect_stderr(io.StringIO()):
+            main(["sessions"])
+        self.assertIn(session_id, listing.getvalue())
+        self.assertIn("what is here?", listing.getvalue())
+
+        shown = io.StringIO()
+        with redirect_stdout(shown), redirect_stderr(io.StringIO()):
+            main(["sessions", "show", session_id[:6]])
+        self.assertIn("- turn 1: what is here?", shown.getvalue())
+        self.assertIn('step 1: list_directory {"path": "."} -> ', shown.getvalue())
+        self.assertIn("answer: The repo has a README.", shown.getvalue())
+        self.assertNotIn("README.md", shown.getvalue())
+
+        observation = io.StringIO()
+        with redirect_stdout(observation), redirect_stderr(io.StringIO()):
+            main(["sessions", "show", session_id, "--turn", "1", "--step", "1"])
+        self.assertIn("README.md", observation.getvalue())
+
+        resumed_model = RecordingFakeModel(["THOUGHT: recall\nFINAL: Still a README."])
+        resumed_stdout = io.StringIO()
+        with (
+            patch("lilbot.cli.build_model", return_value=resumed_model),
+            patch("builtins.input", side_effect=["and now?", "exit"]),
+            redirect_stdout(resumed_stdout),
+            redirect_stderr(io.StringIO()),
+        ):
+            main(["--resume", session_id[:6]])
+
+        self.assertIn(f"Resumed session {session_id}", resumed_stdout.getvalue())
+        self.assertIn("Still a README.", resumed_stdout.getvalue())
+        self.assertIn("what is here?", resumed_model.prompts[0])
+        self.assertIn("The repo has a README.", resumed_model.prompts[0])
+
+    def test_resume_unknown_session_reports_error(self) -> None:
+        stderr = io.StringIO()
+        with (
+            patch("lilbot.cli.build_model", return_value=FakeModel([])),
+            redirect_stdout(io.StringIO()),
+            redirect_stderr(stderr),
+        ):
+            with self.assertRaises(SystemExit) as raised:
+                main(["--resume", "missing"])
+
+        self.assertEqual(raised.exception.code, 1)
+        self.assertIn("No saved chat session matches", stderr.getvalue())
+
+    def test_index_commands_report_incremental_updates(self) -> None:
+        with tempfile.TemporaryDirectory() as workspace:
+            (Path(workspace) / "service.py").write_text("def handler():\n    return 1\n", encoding="utf-8")
+            outputs = []
+            for action in ("update", "update", "status"):
+                stdout = io.StringIO()
+                with redirect_stdout(stdout), redirect_stderr(io.StringIO()):
+                    main(["--workspace-root", workspace, "index", action])
+                outputs.append(stdout.getvalue())
+
+        self.assertIn("Index updated in", outputs[0])
+        self.assertIn("- added: 1", outputs[0])
+        self.assertIn("- unchanged: 1", outputs[1])
+        self.assertIn("- pending: 0 added, 0 updated, 0 removed", outputs[2])
+
+    def test_repo_callers_command_walks_the_call_graph(self) -> None:
+        with tempfile.TemporaryDirectory() as workspace:
+            (Path(workspace) / "service.py").write_text(
+                "def handler():\n    return 1\n\ndef route():\n    return handler()\n",
+                encoding="utf-8",
+            )
+            stdout = io.StringIO()
+            with redirect_stdout(stdout), redirect_stderr(io.StringIO()):
+                main(["--workspace-root", workspace, "repo", "callers", "handler", "--depth", "2"])
+
+        self.assertIn("Callers of `handler` under .:", stdout.getvalue())
+        self.assertIn("  service.py:5 route -> handler", stdout.getvalue())
+
+    def test_repo_map_command_honors_the_token_option(self) -> None:
+        with tempfile.TemporaryDirectory() as workspace:
+            for name in ("alpha", "beta", "gamma"):
+                (Path(workspace) / f"{name}.py").write_text(
+                    f"def {name}_handler(request, response):\n    return request\n",
+                    encoding="utf-8",
+                )
+            outputs = []
+            for tokens in ("35", "200"):
+                stdout = io.StringIO()
+                with redirect_stdout(stdout), redirect_stderr(io.StringIO()):
+                    main(["--workspace-root", workspace, "repo", "map", "--tokens", tokens])
+                outputs.append(stdout.getvalue())
+
+        self.assertIn("Repository map for . (1 of 3 files", outputs[0])
+        self.assertIn("Repository map for . (3 of 3 files", outputs[1])
+        self.assertIn("    def gamma_handler(request, response):", outputs[1])
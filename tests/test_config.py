@@ -67,3 +67,49 @@ class UserConfigTests(unittest.TestCase):
 
             self.assertEqual(config.device, "cuda")
             self.assertEqual(config.max_steps, 7)
+
+    def test_run_budgets_default_to_unlimited_and_read_environment(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            config_path = Path(tempdir) / "config.json"
+            with patch.dict(os.environ, {"LILBOT_CONFIG_PATH": str(config_path)}, clear=True):
+                defaults = LilbotConfig.from_sources(workspace_root=tempdir)
+            with patch.dict(
+                os.environ,
+                {
+                    "LILBOT_CONFIG_PATH": str(config_path),
+                    "LILBOT_MAX_RUN_SECONDS": "45",
+                    "LILBOT_MAX_RUN_TOKENS": "6000",
+                },
+                clear=True,
+            ):
+                configured = LilbotConfig.from_sources(workspace_root=tempdir)
+
+        self.assertEqual(defaults.max_run_seconds, 0.0)
+        self.assertEqual(defaults.max_run_tokens, 0)
+        self.assertEqual(configured.max_run_seconds, 45.0)
+        self.assertEqual(configured.max_run_tokens, 6000)
+
+    def test_retrieval_context_is_opt_in(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            config_path = Path(tempdir) / "config.json"
+            with patch.dict(os.environ, {"LILBOT_CONFIG_PATH": str(config_path)}, clear=True):
+                defaults = LilbotConfig.from_sources(workspace_root=tempdir)
+                flagged = LilbotConfig.from_sources(workspace_root=tempdir, retrieval_context_tokens=900)
+            with patch.dict(
+                os.environ,
+                {
+                    "LILBOT_CONFIG_PATH": str(config_path),
+                    "LILBOT_RETRIEVAL_CONTEXT_TOKENS": "600",
+                    "LILBOT_RETRIEVAL_TOP_K": "3",
+                    "LILBOT_RETRIEVAL_REFRESH_SECONDS": "5",
+                },
+                clear=True,
+            ):
+                configured = LilbotConfig.from_sources(workspace_root=tempdir)
+
+        self.assertEqual(defaults.retrieval_context_tokens, 0)
+        self.assertEqual(flagged.retrieval_context_tokens, 900)
+        self.assertEqual(configured.retrieval_context_tokens, 600)
+        self.assertEqual(configured.retrieval_top_k, 3)
+        self.assertEqual(defaults.retrieval_refresh_seconds, 30.0)
+        self.assertEqual(configured.retrieval_refresh_seconds, 5.0)
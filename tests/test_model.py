@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import importlib.util
 from types import SimpleNamespace
 import unittest
 from unittest.mock import Mock, patch
@@ -32,6 +33,52 @@ class FakeTokenizerWithoutTemplate:
     chat_template = None
 
 
+class CharTokenizer:
+    """Maps each character to a token id in a tiny vocabulary."""
+
+    chat_template = None
+    eos_token_id = None
+    vocab_size = 64
+
+    def __call__(self, text: str, *, return_tensors: str, truncation: bool, max_length: int) -> object:
+        import torch
+        from transformers import BatchEncoding
+
+        ids = [ord(character) % self.vocab_size for character in text][:max_length]
+        return BatchEncoding(
+            {
+                "input_ids": torch.tensor([ids], dtype=torch.long),
+                "attention_mask": torch.ones((1, len(ids)), dtype=torch.long),
+            }
+        )
+
+    def decode(self, ids: list[int], **kwargs: object) -> str:
+        return " ".join(str(token) for token in ids)
+
+
+def _tiny_local_model() -> HuggingFaceLocalModel:
+    import torch
+    import transformers
+
+    torch.manual_seed(0)
+    config = transformers.GPT2Config(
+        vocab_size=CharTokenizer.vocab_size,
+        n_positions=128,
+        n_embd=32,
+        n_layer=2,
+        n_head=2,
+    )
+    model = object.__new__(HuggingFaceLocalModel)
+    model.torch = torch
+    model.model = transformers.GPT2LMHeadModel(config).eval()
+    model.tokenizer = CharTokenizer()
+    model.device = torch.device("cpu")
+    model.max_new_tokens = 16
+    model.max_input_tokens = 128
+    model.temperature = 0.0
+    return model
+
+
 class ModelHelpersTests(unittest.TestCase):
     def test_missing_model_message_points_to_init(self) -> None:
         with self.assertRaises(RuntimeError) as exc_info:
@@ -155,3 +202,33 @@ class ModelHelpersTests(unittest.TestCase):
 
     def test_select_dtype_kwarg_uses_dtype_for_transformers_5(self) -> None:
         self.assertEqual(_select_dtype_kwarg("5.3.0"), "dtype")
+
+
+@unittest.skipUnless(
+    importlib.util.find_spec("torch") and importlib.util.find_spec("transformers"),
+    "torch and transformers are not installed",
+)
+class IncrementalDecodeTests(unittest.TestCase):
+    def test_batched_decode_matches_decoding_each_sequence_alone(self) -> None:
+        model = _tiny_local_model()
+        requests = [("short", 12), ("a somewhat longer prompt", 5), ("mid length", 12)]
+        expected = []
+        for prompt, limit in requests:
+            state = model.start_sequence(prompt, max_new_tokens=limit)
+            while not state.finished:
+                model.decode_batch([state])
+            expected.append(list(state.token_ids))
+            model.finish_sequence(state)
+
+        with patch.object(model, "_rebuild_batch", wraps=model._rebuild_batch) as rebuild:
+            states = [model.start_sequence(prompt, max_new_tokens=limit) for prompt, limit in requests[:2]]
+            for _ in range(3):
+                model.decode_batch(states)
+            states.append(model.start_sequence(requests[2][0], max_new_tokens=requests[2][1]))
+            while not all(state.finished for state in states):
+                model.decode_batch(states)
+
+        self.assertEqual([state.token_ids for state in states], expected)
+        # The shared cache is rebuilt only when the batch changes: at the start,
+        # when the third sequence joins, then as the second and first finish.
+        self.assertEqual(rebuild.call_count, 4)
@@ -0,0 +1,732 @@
+from __future__ import annotations
+
+from dataclasses import replace
+from datetime import datetime, timedelta
+import importlib.util
+import os
+from pathlib import Path
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+import types
+import unittest
+from unittest.mock import patch
+
+from lilbot.config import LilbotConfig
+from lilbot.retrieval.chunking import (
+    chunk_file,
+    chunk_python_source,
+    chunk_text_lines,
+    iter_repository_chunks,
+)
+from lilbot.retrieval.context import CONTEXT_HEADER, RetrievalContextProvider, pack_context
+from lilbot.retrieval.embeddings import EmbeddingBackend, EmbeddingCache, embed_chunks
+from lilbot.retrieval.fingerprints import is_indexable_path, scan_workspace
+from lilbot.retrieval.index import VectorIndex
+from lilbot.retrieval.lexical import LexicalIndex, tokenize
+from lilbot.retrieval.logs import chunk_log_lines, iter_log_chunks, parse_log_timestamp
+from lilbot.retrieval.repo_map import RepoMap, build_repo_map
+from lilbot.retrieval.repository import RepositoryIndex, RetrievalResult, _refresh_lock
+from lilbot.retrieval.symbols import SymbolIndex, is_indexed_symbol
+from lilbot.tools.filesystem import list_workspace_files
+from lilbot.utils.formatting import estimate_tokens
+
+
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+
+
+PYTHON_SOURCE = '''"""Module docstring."""
+
+import os
+
+LIMIT = 3
+
+
+@decorator
+def authenticate_user(name):
+    return name == "admin"
+
+
+class Session:
+    def open(self):
+        return True
+
+    async def close(self):
+        return False
+'''
+
+
+class FakeEmbeddingBackend(EmbeddingBackend):
+    """Deterministic bag-of-words vectors over a tiny vocabulary."""
+
+    model_name = "fake-embedder"
+    vocabulary = ("auth", "user", "session", "log", "disk", "readme")
+    dimension = len(vocabulary)
+
+    def __init__(self) -> None:
+        self.embedded: list[str] = []
+
+    def embed_texts(self, texts):
+        import numpy as np
+
+        self.embedded.extend(texts)
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            lowered = text.lower()
+            for column, word in enumerate(self.vocabulary):
+                vectors[row, column] = lowered.count(word)
+            norm = np.linalg.norm(vectors[row]) or 1.0
+            vectors[row] /= norm
+        return vectors.astype(np.float16)
+
+
+class ChunkingTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tempdir.name)
+        self.config = LilbotConfig.from_sources(workspace_root=self.tempdir.name)
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def test_python_is_split_at_top_level_definitions(self) -> None:
+        chunks = list(chunk_python_source(PYTHON_SOURCE, "pkg/auth.py"))
+
+        by_name = {chunk.name: chunk for chunk in chunks}
+        self.assertEqual([chunk.kind for chunk in chunks], ["module", "function", "class"])
+        self.assertEqual((by_name["authenticate_user"].start_line, by_name["authenticate_user"].end_line), (8, 10))
+        self.assertTrue(by_name["authenticate_user"].text.startswith("@decorator"))
+        self.assertEqual(by_name["Session"].chunk_id, "pkg/auth.py:13-18")
+        self.assertIn("LIMIT = 3", chunks[0].text)
+
+    def test_oversized_classes_are_split_by_method(self) -> None:
+        chunks = list(chunk_python_source(PYTHON_SOURCE, "pkg/auth.py", max_chunk_chars=60))
+
+        names = [(chunk.kind, chunk.name) for chunk in chunks if chunk.name and "Session" in chunk.name]
+        self.assertIn(("method", "Session.open"), names)
+        self.assertIn(("method", "Session.close"), names)
+        self.assertTrue(all(len(chunk.text) <= 60 for chunk in chunks))
+
+    def test_invalid_python_falls_back_to_text_chunks(self) -> None:
+        chunks = list(chunk_python_source("def broken(:\n    pass\n", "broken.py"))
+
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0].kind, "block")
+
+    def test_text_is_split_at_blank_lines_with_line_ranges(self) -> None:
+        paragraphs = ["alpha " * 10, "beta " * 10, "gamma " * 10]
+        lines = []
+        for paragraph in paragraphs:
+            lines.extend([paragraph + "\n", "\n"])
+
+        chunks = list(chunk_text_lines(lines, "notes.md", max_chunk_chars=100))
+
+        self.assertEqual([(chunk.start_line, chunk.end_line) for chunk in chunks], [(1, 2), (3, 4), (5, 6)])
+        self.assertTrue(chunks[1].text.startswith("beta"))
+
+    def test_repository_chunks_are_lazy_and_hashes_are_stable(self) -> None:
+        (self.root / "auth.py").write_text(PYTHON_SOURCE, encoding="utf-8")
+        (self.root / "README.md").write_text("# Project\n\nUsage notes.\n", encoding="utf-8")
+        (self.root / "weights.bin").write_bytes(b"\x00\x01\x02")
+        (self.root / "node_modules").mkdir()
+        (self.root / "node_modules" / "dep.js").write_text("function dep() {}\n", encoding="utf-8")
+
+        stream = iter_repository_chunks(self.config)
+        first_pass = list(stream)
+        second_pass = list(iter_repository_chunks(self.config))
+
+        self.assertIsInstance(stream, types.GeneratorType)
+        self.assertEqual({chunk.path for chunk in first_pass}, {"auth.py", "README.md"})
+        self.assertEqual(
+            [chunk.content_hash for chunk in first_pass],
+            [chunk.content_hash for chunk in second_pass],
+        )
+        self.assertEqual(len({chunk.content_hash for chunk in first_pass}), len(first_pass))
+
+
+@unittest.skipUnless(HAS_NUMPY, "NumPy is not installed")
+class EmbeddingTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.cache = EmbeddingCache(Path(self.tempdir.name) / "embeddings.sqlite3")
+
+    def tearDown(self) -> None:
+        self.cache.close()
+        self.tempdir.cleanup()
+
+    def test_unchanged_chunks_are_served_from_the_cache(self) -> None:
+        import numpy as np
+
+        chunks = list(chunk_python_source(PYTHON_SOURCE, "pkg/auth.py"))
+        backend = FakeEmbeddingBackend()
+
+        first = embed_chunks(backend, chunks, cache=self.cache)
+        calls_after_first = len(backend.embedded)
+        second = embed_chunks(backend, chunks, cache=self.cache)
+
+        self.assertEqual(first.dtype, np.float16)
+        self.assertEqual(first.shape, (len(chunks), backend.dimension))
+        self.assertEqual(calls_after_first, len(chunks))
+        self.assertEqual(len(backend.embedded), calls_after_first)
+        self.assertTrue(np.array_equal(first, second))
+
+    def test_duplicate_text_is_embedded_once(self) -> None:
+        chunks = list(chunk_text_lines(["session log\n"], "a.txt")) + list(
+            chunk_text_lines(["session log\n"], "b.txt")
+        )
+        backend = FakeEmbeddingBackend()
+
+        matrix = embed_chunks(backend, chunks)
+
+        self.assertEqual(len(backend.embedded), 1)
+        self.assertEqual(matrix.shape[0], 2)
+
+
+@unittest.skipUnless(HAS_NUMPY, "NumPy is not installed")
+class VectorIndexTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.directory = Path(self.tempdir.name) / "index"
+        self.backend = FakeEmbeddingBackend()
+        self.chunks = [
+            *chunk_text_lines(["auth user login\n"], "src/auth.py"),
+            *chunk_text_lines(["disk usage report\n"], "src/disk.py"),
+            *chunk_text_lines(["session log rotation\n"], "docs/logs.md"),
+        ]
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def _open(self) -> VectorIndex:
+        return VectorIndex(self.directory, dimension=self.backend.dimension, model_name=self.backend.model_name)
+
+    def test_search_returns_best_rows_and_persists(self) -> None:
+        with self._open() as index:
+            rows = index.append(self.chunks, self.backend.embed_texts([chunk.text for chunk in self.chunks]))
+            hits = index.search(self.backend.embed_query("disk"), k=2)
+
+        self.assertEqual(rows, [0, 1, 2])
+        self.assertEqual(hits[0].path, "src/disk.py")
+        self.assertEqual(hits[0].chunk_id, "src/disk.py:1-1")
+
+        with VectorIndex(self.directory) as reopened:
+            self.assertEqual(reopened.rows, 3)
+            self.assertEqual(reopened.search(self.backend.embed_query("auth user"), k=1)[0].path, "src/auth.py")
+            self.assertEqual(reopened.search(self.backend.embed_query("log"), k=3, path_prefix="src")[0].path, "src/auth.py")
+
+    def test_tombstones_hide_rows_until_compaction_drops_them(self) -> None:
+        with self._open() as index:
+            index.append(self.chunks, self.backend.embed_texts([chunk.text for chunk in self.chunks]))
+            self.assertEqual(index.delete_paths(["src/disk.py"]), 1)
+
+            hits = index.search(self.backend.embed_query("disk"), k=3)
+            self.assertNotIn("src/disk.py", [hit.path for hit in hits])
+            self.assertEqual(index.live_rows, 2)
+
+            index.compact()
+            self.assertEqual(index.rows, 2)
+            self.assertEqual(index.indexed_paths(), {"src/auth.py", "docs/logs.md"})
+            self.assertEqual(index.search(self.backend.embed_query("session log"), k=1)[0].path, "docs/logs.md")
+
+    def test_dimension_mismatch_is_rejected(self) -> None:
+        self._open().close()
+
+        with self.assertRaises(RuntimeError):
+            VectorIndex(self.directory, dimension=self.backend.dimension + 1)
+
+
+class LexicalIndexTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.index = LexicalIndex(Path(self.tempdir.name) / "lexical.sqlite3")
+
+    def tearDown(self) -> None:
+        self.index.close()
+        self.tempdir.cleanup()
+
+    def test_tokenize_splits_identifiers(self) -> None:
+        terms = tokenize("parseHTTPResponse(user_id) raised ConnectionRefusedError")
+
+        self.assertIn("parsehttpresponse", terms)
+        self.assertIn("http", terms)
+        self.assertIn("response", terms)
+        self.assertIn("user_id", terms)
+        self.assertIn("user", terms)
+        self.assertIn("refused", terms)
+
+    def test_search_ranks_exact_identifiers_and_updates_per_file(self) -> None:
+        with self.index.bulk():
+            self.index.update_file("auth.py", chunk_python_source(PYTHON_SOURCE, "auth.py"), fingerprint="v1")
+            self.index.update_file(
+                "notes.md",
+                chunk_text_lines(["Sessions expire after an hour.\n"], "notes.md"),
+                fingerprint="v1",
+            )
+
+        hits = self.index.search("authenticate_user")
+        self.assertEqual(hits[0].path, "auth.py")
+        self.assertEqual(hits[0].name, "authenticate_user")
+        self.assertEqual(self.index.search("session", k=5, path_prefix="auth.py")[0].name, "Session")
+        self.assertEqual(self.index.file_fingerprints(), {"auth.py": "v1", "notes.md": "v1"})
+
+        self.index.update_file(
+            "auth.py",
+            chunk_python_source("def rotate_keys():\n    return 1\n", "auth.py"),
+            fingerprint="v2",
+        )
+        self.assertEqual(self.index.search("authenticate_user"), [])
+        self.assertEqual(self.index.search("rotate keys")[0].name, "rotate_keys")
+
+        self.index.remove_file("notes.md")
+        self.assertEqual(self.index.search("expire"), [])
+        self.assertEqual(self.index.file_count, 1)
+        self.assertEqual(self.index.doc_count, 1)
+
+
+@unittest.skipUnless(HAS_NUMPY, "NumPy is not installed")
+class RepositoryIndexTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tempdir.name) / "workspace"
+        self.root.mkdir()
+        (self.root / "auth.py").write_text(PYTHON_SOURCE, encoding="utf-8")
+        (self.root / "notes.md").write_text("Disk usage report for the log volume.\n", encoding="utf-8")
+        self.config = replace(
+            LilbotConfig.from_sources(workspace_root=str(self.root)),
+            cache_dir=Path(self.tempdir.name) / "cache",
+        )
+        self.backend = FakeEmbeddingBackend()
+        self.index = RepositoryIndex(self.config, embedding_backend=self.backend)
+
+    def tearDown(self) -> None:
+        self.index.close()
+        self.tempdir.cleanup()
+
+    def test_search_fuses_lexical_and_vector_results(self) -> None:
+        results = self.index.search("authenticate_user", k=3)
+
+        self.assertEqual(results[0].name, "authenticate_user")
+        self.assertEqual(results[0].sources, ("lexical", "vector"))
+        self.assertEqual(self.index.refresh().changes.total, 0)
+
+        vector_only = self.index.search("disk", k=1)
+        self.assertEqual(vector_only[0].path, "notes.md")
+
+    def test_interrupted_refresh_embeds_every_file_it_committed(self) -> None:
+        def chunk_or_fail(path, relative):
+            if relative == "notes.md":
+                raise KeyboardInterrupt
+            return chunk_file(path, relative)
+
+        with (
+            patch("lilbot.retrieval.repository.REFRESH_COMMIT_FILES", 1),
+            patch("lilbot.retrieval.repository.chunk_file", side_effect=chunk_or_fail),
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                self.index.refresh()
+
+        self.assertEqual(set(self.index.lexical.file_fingerprints()), {"auth.py"})
+        self.assertTrue(any("authenticate_user" in text for text in self.backend.embedded))
+
+        resumed = self.index.refresh()
+        self.assertEqual(resumed.changes.added, ["notes.md"])
+        self.assertEqual(self.index.search("authenticate_user", k=1)[0].sources, ("lexical", "vector"))
+
+
+class IndexRefreshTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tempdir.name) / "workspace"
+        self.root.mkdir()
+        (self.root / "auth.py").write_text(PYTHON_SOURCE, encoding="utf-8")
+        (self.root / "notes.md").write_text("Sessions expire after an hour.\n", encoding="utf-8")
+        (self.root / "node_modules").mkdir()
+        (self.root / "node_modules" / "dep.js").write_text("function dep() {}\n", encoding="utf-8")
+        self.config = replace(
+            LilbotConfig.from_sources(workspace_root=str(self.root)),
+            cache_dir=Path(self.tempdir.name) / "cache",
+        )
+        self.index = RepositoryIndex(self.config)
+
+    def tearDown(self) -> None:
+        self.index.close()
+        self.tempdir.cleanup()
+
+    def test_index_and_listing_agree_on_ignored_directories(self) -> None:
+        (self.root / "pkg.egg-info").mkdir()
+        (self.root / "pkg.egg-info" / "PKG-INFO").write_text("Name: pkg\n", encoding="utf-8")
+
+        listed = {item.relative for item in list_workspace_files(self.config, self.root).files}
+
+        for relative in ("auth.py", "notes.md", "node_modules/dep.js", "pkg.egg-info/PKG-INFO"):
+            self.assertEqual(is_indexable_path(self.config, relative), relative in listed, relative)
+
+    def test_stat_fingerprints_drive_incremental_refresh(self) -> None:
+        scan = scan_workspace(self.config)
+        self.assertEqual(set(scan.files), {"auth.py", "notes.md"})
+
+        first = self.index.refresh()
+        self.assertEqual(first.changes.added, ["auth.py", "notes.md"])
+        self.assertEqual(self.index.refresh().changes.total, 0)
+
+        (self.root / "notes.md").write_text("Tokens rotate weekly, sessions expire hourly.\n", encoding="utf-8")
+        os.utime(self.root / "notes.md", ns=(1, 1))
+        (self.root / "auth.py").unlink()
+        (self.root / "disk.md").write_text("Disk usage report.\n", encoding="utf-8")
+
+        self.assertEqual(self.index.status().changes.total, 3)
+        second = self.index.refresh()
+        self.assertEqual(second.changes.added, ["disk.md"])
+        self.assertEqual(second.changes.updated, ["notes.md"])
+        self.assertEqual(second.changes.removed, ["auth.py"])
+        self.assertEqual(second.changes.unchanged, 0)
+        self.assertEqual(self.index.search("rotate")[0].path, "notes.md")
+        self.assertEqual(self.index.search("authenticate_user"), [])
+
+    def test_search_rescans_the_workspace_at_most_once_per_interval(self) -> None:
+        with patch("lilbot.retrieval.repository.scan_workspace", wraps=scan_workspace) as scan:
+            self.assertEqual(self.index.search("authenticate_user")[0].path, "auth.py")
+            # A second instance, as a per-call tool would open, reuses the recent refresh.
+            other = RepositoryIndex(self.config)
+            other.search("sessions")
+            other.close()
+            self.assertEqual(scan.call_count, 1)
+
+            later = time.monotonic() + self.config.retrieval_refresh_seconds + 1
+            with patch("lilbot.retrieval.repository.time.monotonic", return_value=later):
+                self.index.search("sessions")
+            self.assertEqual(scan.call_count, 2)
+
+    def test_a_build_in_one_index_directory_does_not_block_another(self) -> None:
+        other_directory = Path(self.tempdir.name) / "other-index"
+        # Stands in for a long first-time build of another workspace.
+        with _refresh_lock(other_directory):
+            self.assertEqual(self.index.search("authenticate_user")[0].path, "auth.py")
+
+    @unittest.skipUnless(shutil.which("git"), "git is not installed")
+    def test_git_blob_ids_fingerprint_tracked_files(self) -> None:
+        git = ["git", "-C", str(self.root), "-c", "user.name=test", "-c", "user.email=test@example.com"]
+        subprocess.run([*git, "init", "-q"], check=True)
+        (self.root / ".gitignore").write_text("ignored.txt\n", encoding="utf-8")
+        (self.root / "ignored.txt").write_text("scratch\n", encoding="utf-8")
+        subprocess.run([*git, "add", "auth.py", ".gitignore"], check=True)
+        subprocess.run([*git, "commit", "-q", "-m", "init"], check=True)
+
+        scan = scan_workspace(self.config)
+
+        self.assertEqual(scan.source, "git")
+        self.assertTrue(scan.files["auth.py"].startswith("git:"))
+        self.assertTrue(scan.files["notes.md"].startswith("stat:"))
+        self.assertNotIn("ignored.txt", scan.files)
+        self.assertNotIn("node_modules/dep.js", scan.files)
+
+        (self.root / "auth.py").write_text("def rotate_keys():\n    return 1\n", encoding="utf-8")
+        self.assertTrue(scan_workspace(self.config).files["auth.py"].startswith("stat:"))
+
+
+class SymbolIndexTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tempdir.name) / "workspace"
+        (self.root / "pkg").mkdir(parents=True)
+        (self.root / "pkg" / "auth.py").write_text(PYTHON_SOURCE, encoding="utf-8")
+        (self.root / "app.js").write_text("function close(handle) {\n  return handle;\n}\n", encoding="utf-8")
+        (self.root / "notes.md").write_text("Call close() when done.\n", encoding="utf-8")
+        self.config = replace(
+            LilbotConfig.from_sources(workspace_root=str(self.root)),
+            cache_dir=Path(self.tempdir.name) / "cache",
+        )
+        self.index = SymbolIndex.for_workspace(self.config)
+
+    def tearDown(self) -> None:
+        self.index.close()
+        self.tempdir.cleanup()
+
+    def test_lookup_returns_qualified_definitions_and_mentions(self) -> None:
+        self.index.refresh(self.config)
+
+        found = self.index.lookup("close")
+
+        self.assertEqual(
+            [(path, item.line, item.kind, item.label) for path, item in found.definitions],
+            [("app.js", 1, "heuristic definition", "close"), ("pkg/auth.py", 17, "async definition", "Session.close")],
+        )
+        self.assertEqual([(item.path, item.lines) for item in found.mentions], [
+            ("app.js", (1,)),
+            ("notes.md", (1,)),
+            ("pkg/auth.py", (17,)),
+        ])
+        self.assertEqual([path for path, _ in self.index.lookup("close", path_prefix="pkg").definitions], ["pkg/auth.py"])
+        self.assertFalse(is_indexed_symbol("a.b"))
+
+    def test_refresh_rereads_only_changed_files(self) -> None:
+        self.assertEqual(len(self.index.refresh(self.config).added), 3)
+        self.assertEqual(self.index.refresh(self.config).total, 0)
+
+        (self.root / "notes.md").write_text("Nothing to see.\n", encoding="utf-8")
+        os.utime(self.root / "notes.md", ns=(1, 1))
+        (self.root / "app.js").unlink()
+        changes = self.index.refresh(self.config)
+
+        self.assertEqual((changes.updated, changes.removed), (["notes.md"], ["app.js"]))
+        self.assertEqual([item.path for item in self.index.lookup("close").mentions], ["pkg/auth.py"])
+
+
+    def test_call_graph_follows_imports_self_calls_and_unique_names(self) -> None:
+        (self.root / "pkg" / "store.py").write_text(
+            "import os\n\ndef save(user):\n    return os.path.join('users', user)\n",
+            encoding="utf-8",
+        )
+        (self.root / "pkg" / "service.py").write_text(
+            "from .store import save\n\n"
+            "class Service:\n"
+            "    def login(self, user):\n"
+            "        self.audit(user)\n"
+            "        return save(user)\n\n"
+            "    def audit(self, user):\n"
+            "        print(user)\n",
+            encoding="utf-8",
+        )
+        (self.root / "main.py").write_text(
+            "from pkg.service import Service\n\n"
+            "def main():\n"
+            "    Service().login('ada')\n"
+            "    helper()\n\n"
+            "def helper():\n"
+            "    pass\n\n"
+            "main()\n",
+            encoding="utf-8",
+        )
+        self.index.refresh(self.config)
+
+        callers = self.index.callers("pkg.store.save", depth=3)
+        callees = self.index.callees("main", depth=2)
+
+        self.assertEqual([(path, item.label) for path, item in callers.roots], [("pkg/store.py", "save")])
+        self.assertEqual(
+            [(edge.hop, edge.path, edge.line, edge.caller, edge.callee, edge.by_name) for edge in callers.edges],
+            [
+                (1, "pkg/service.py", 6, "Service.login", "save", False),
+                (2, "main.py", 4, "main", "Service.login", True),
+                (3, "main.py", 10, "<module>", "main", False),
+            ],
+        )
+        self.assertEqual(
+            [(edge.hop, edge.caller, edge.callee, edge.callee_path) for edge in callees.edges],
+            [
+                (1, "main", "Service.login", "pkg/service.py"),
+                (1, "main", "pkg.service.Service", None),
+                (1, "main", "helper", "main.py"),
+                (2, "Service.login", "Service.audit", "pkg/service.py"),
+                (2, "Service.login", "save", "pkg/store.py"),
+            ],
+        )
+        self.assertEqual(self.index.callers("save", path_prefix="pkg", depth=3).edges[-1].path, "pkg/service.py")
+        self.assertEqual(self.index.callers("Service.missing").roots, [])
+
+    def test_repo_map_ranks_shared_files_first_within_the_budget(self) -> None:
+        (self.root / "pkg" / "core.py").write_text(
+            "class Engine:\n"
+            "    def __init__(self, size: int) -> None:\n"
+            "        self.size = size\n\n"
+            "    def start(self) -> None:\n"
+            "        pass\n\n"
+            "    def _tick(self) -> None:\n"
+            "        pass\n\n"
+            "def build_engine(\n"
+            "    size: int = 1,\n"
+            ") -> Engine:\n"
+            "    return Engine(size)\n",
+            encoding="utf-8",
+        )
+        (self.root / "pkg" / "cli.py").write_text(
+            "from .core import build_engine\n\ndef main():\n    build_engine().start()\n",
+            encoding="utf-8",
+        )
+        (self.root / "pkg" / "web.py").write_text(
+            "from .core import Engine\n\ndef serve():\n    Engine(2).start()\n",
+            encoding="utf-8",
+        )
+        self.index.refresh(self.config)
+
+        package = self.root / "pkg"
+        first = build_repo_map(self.config, self.index, package, max_tokens=1024)
+        rendered = first.text
+        small = build_repo_map(self.config, self.index, package, max_tokens=60).text
+
+        self.assertEqual(
+            rendered.splitlines()[:7],
+            [
+                "Repository map for ./pkg (4 of 4 files, most referenced first):",
+                "- files:",
+                "  pkg/core.py",
+                "    class Engine:",
+                "      def __init__(self, size: int) -> None:",
+                "      def start(self) -> None:",
+                "    def build_engine(size: int = 1) -> Engine:",
+            ],
+        )
+        self.assertNotIn("_tick", rendered)
+        self.assertLessEqual(estimate_tokens(small), 60)
+        self.assertTrue(small.startswith("Repository map for ./pkg (1 of 4 files"))
+
+        # The stored map is reused until the index sees a fingerprint change.
+        (self.root / "pkg" / "web.py").write_text("def serve_forever():\n    pass\n", encoding="utf-8")
+        self.assertFalse(first.cached)
+        self.assertEqual(
+            build_repo_map(self.config, self.index, package, max_tokens=1024),
+            RepoMap(rendered, cached=True),
+        )
+        self.index.refresh(self.config)
+        self.assertIn("def serve_forever():", build_repo_map(self.config, self.index, package, max_tokens=1024).text)
+
+
+class RetrievalContextTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tempdir.name) / "workspace"
+        self.root.mkdir()
+        (self.root / "auth.py").write_text(PYTHON_SOURCE, encoding="utf-8")
+        (self.root / "copy.py").write_text(PYTHON_SOURCE, encoding="utf-8")
+        (self.root / "big.md").write_text("".join(f"session line {index}\n" for index in range(200)), encoding="utf-8")
+        self.config = replace(
+            LilbotConfig.from_sources(workspace_root=str(self.root)),
+            cache_dir=Path(self.tempdir.name) / "cache",
+            retrieval_context_tokens=400,
+            retrieval_top_k=4,
+        )
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def _result(self, path: str, start: int, end: int) -> RetrievalResult:
+        return RetrievalResult(path, start, end, "block", None, 1.0, ("lexical",))
+
+    def test_packing_drops_overlaps_and_duplicate_text(self) -> None:
+        results = [
+            self._result("auth.py", 8, 10),
+            self._result("auth.py", 9, 12),
+            self._result("copy.py", 8, 10),
+            self._result("auth.py", 13, 18),
+        ]
+
+        context = pack_context(self.config, results, token_budget=400, max_chunks=4)
+
+        self.assertTrue(context.startswith(CONTEXT_HEADER))
+        self.assertEqual(context.count("--- ./"), 2)
+        self.assertIn("--- ./auth.py:8-10 (block)", context)
+        self.assertIn("--- ./auth.py:13-18 (block)", context)
+        self.assertNotIn("copy.py", context)
+
+    def test_packing_clips_the_last_chunk_to_the_budget(self) -> None:
+        context = pack_context(self.config, [self._result("big.md", 1, 200)], token_budget=120, max_chunks=4)
+
+        self.assertLessEqual(estimate_tokens(context), 120)
+        self.assertIn("session line 0", context)
+        self.assertNotIn("session line 79", context)
+        self.assertRegex(context, r"--- \./big\.md:1-\d+ \(block\)")
+
+    def test_provider_retrieves_from_the_workspace_index(self) -> None:
+        provider = RetrievalContextProvider(self.config)
+
+        context = provider("authenticate_user")
+
+        self.assertIn("authenticate_user", context)
+        self.assertLessEqual(estimate_tokens(context), 400)
+        self.assertIsNone(RetrievalContextProvider(replace(self.config, retrieval_context_tokens=0))("auth"))
+
+    def test_provider_treats_a_locked_index_as_no_context(self) -> None:
+        provider = RetrievalContextProvider(self.config)
+        locked = sqlite3.OperationalError("database is locked")
+
+        with patch("lilbot.retrieval.context.RepositoryIndex.search", side_effect=locked):
+            self.assertIsNone(provider("authenticate_user"))
+
+
+class LogChunkingTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tempdir.name)
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def test_events_keep_continuation_lines_and_windows_split_on_time(self) -> None:
+        text = (
+            "2024-05-01 10:00:00 INFO boot\n"
+            "2024-05-01 10:01:00 ERROR worker failed\n"
+            "Traceback (most recent call last):\n"
+            '  File "worker.py", line 3, in run\n'
+            "ValueError: bad input\n"
+            "2024-05-01 10:07:00 INFO recovered\n"
+        )
+        raw = text.encode("utf-8")
+
+        chunks = list(chunk_log_lines(raw.splitlines(keepends=True), "app.log", window_seconds=300))
+
+        self.assertEqual(len(chunks), 2)
+        first, second = chunks
+        self.assertEqual((first.start_line, first.end_line, first.event_count), (1, 5, 2))
+        self.assertIn("ValueError: bad input", first.text)
+        self.assertEqual(first.end_time, datetime(2024, 5, 1, 10, 1))
+        self.assertEqual(second.start_time, datetime(2024, 5, 1, 10, 7))
+        self.assertEqual(raw[second.start_offset : second.end_offset].decode().rstrip(), second.text)
+        self.assertEqual(first.as_chunk().name, "2024-05-01 10:00:00..10:01:00")
+        self.assertEqual(first.as_chunk().kind, "log")
+
+    def test_time_range_reads_seek_into_large_logs(self) -> None:
+        start = datetime(2024, 5, 1, 0, 0, 0)
+        path = self.root / "service.log"
+        with path.open("w", encoding="utf-8") as handle:
+            for index in range(20000):
+                stamp = start + timedelta(seconds=index)
+                handle.write(f"{stamp:%Y-%m-%dT%H:%M:%S}.250 INFO request {index} served\n")
+
+        since = start + timedelta(seconds=15000)
+        until = since + timedelta(seconds=600)
+        chunks = list(iter_log_chunks(path, "service.log", since=since, until=until))
+
+        self.assertEqual(chunks[0].start_line, 15001)
+        self.assertEqual(chunks[0].start_time, since.replace(microsecond=250000))
+        self.assertTrue(chunks[0].text.startswith(f"{since:%Y-%m-%dT%H:%M:%S}.250 INFO request 15000"))
+        self.assertTrue(all(chunk.start_time <= until for chunk in chunks))
+        self.assertGreaterEqual(chunks[-1].end_time, until - timedelta(seconds=300))
+
+        # Later seeks number lines from the cached line index instead of re-counting the file.
+        with patch("lilbot.tools.filesystem.LineIndex.build", side_effect=AssertionError("re-counted")):
+            later = next(iter_log_chunks(path, "service.log", since=start + timedelta(seconds=19000)))
+        self.assertEqual(later.start_line, 19001)
+
+    def test_seek_skips_long_runs_of_lines_without_stamps(self) -> None:
+        start = datetime(2024, 5, 1, 0, 0, 0)
+        path = self.root / "service.log"
+        with path.open("w", encoding="utf-8") as handle:
+            for index in range(2000):
+                stamp = start + timedelta(seconds=index)
+                handle.write(f"{stamp:%Y-%m-%dT%H:%M:%S} INFO request {index} served\n")
+                if index == 1000:
+                    handle.write("Traceback (most recent call last):\n")
+                    handle.writelines(f'  File "worker.py", line {line}, in run\n' for line in range(3000))
+
+        since = start + timedelta(seconds=900)
+        chunks = list(iter_log_chunks(path, "service.log", since=since, until=since + timedelta(seconds=60)))
+
+        self.assertEqual(chunks[0].start_line, 901)
+        self.assertEqual(chunks[0].start_time, since)
+
+    def test_syslog_stamps_use_the_given_year(self) -> None:
+        self.assertEqual(parse_log_timestamp("Jan  5 09:15:02 host sshd[12]: ok", year=2023), datetime(2023, 1, 5, 9, 15, 2))
+        self.assertIsNone(parse_log_timestamp("no timestamp here"))
+
+    def test_repository_chunks_index_logs_by_time_window(self) -> None:
+        (self.root / "app.log").write_text(
+            "2024-05-01 10:00:00 INFO boot\n2024-05-01 10:00:05 WARNING disk nearly full\n",
+            encoding="utf-8",
+        )
+        config = LilbotConfig.from_sources(workspace_root=str(self.root))
+
+        chunks = list(iter_repository_chunks(config))
+
+        self.assertEqual([(chunk.kind, chunk.name) for chunk in chunks], [("log", "2024-05-01 10:00:00..10:00:05")])
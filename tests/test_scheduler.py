@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+from pathlib import Path
+import tempfile
+import threading
+import time
+import unittest
+
+from lilbot.config import LilbotConfig
+from lilbot.memory.session import LilbotSession
+from lilbot.model.base import BaseModel, DecodeState, IncrementalModel
+from lilbot.scheduler import SessionScheduler
+from lilbot.tools import build_default_tool_registry
+
+
+class FakeIncrementalModel(IncrementalModel):
+    """Decodes scripted replies one character per step."""
+
+    def __init__(self, replies: dict[str, str]) -> None:
+        self.replies = replies
+        self.runtime_summary = "Loaded fake incremental model"
+        self.batch_sizes: list[int] = []
+
+    def generate(self, prompt: str, *, max_new_tokens: int | None = None) -> str:
+        raise AssertionError("the scheduler should use incremental decoding")
+
+    def start_sequence(self, prompt: str, *, max_new_tokens: int | None = None) -> DecodeState:
+        reply = next(text for query, text in self.replies.items() if query in prompt)
+        state = DecodeState(
+            prompt_tokens=len(prompt.split()),
+            max_new_tokens=max_new_tokens or 10_000,
+            backend_state=list(reply),
+        )
+        self._advance(state)
+        return state
+
+    def decode_batch(self, states) -> None:
+        self.batch_sizes.append(len(states))
+        time.sleep(0.001)
+        for state in states:
+            self._advance(state)
+
+    def finish_sequence(self, state: DecodeState) -> str:
+        return "".join(chr(token) for token in state.token_ids)
+
+    def _advance(self, state: DecodeState) -> None:
+        remaining = state.backend_state
+        state.token_ids.append(ord(remaining.pop(0)))
+        if not remaining or state.generated_tokens >= state.max_new_tokens:
+            state.finished = True
+
+
+class DecodeThreadCrash(BaseException):
+    """Escapes the scheduler's per-request ``except Exception`` handlers."""
+
+
+class CrashingModel(FakeIncrementalModel):
+    def start_sequence(self, prompt: str, *, max_new_tokens: int | None = None) -> DecodeState:
+        raise DecodeThreadCrash("decode thread died")
+
+
+class FakeSerialModel(BaseModel):
+    def __init__(self) -> None:
+        self.runtime_summary = "Loaded fake serial model"
+        self.active_calls = 0
+        self.max_active_calls = 0
+        self.lock = threading.Lock()
+
+    def generate(self, prompt: str, *, max_new_tokens: int | None = None) -> str:
+        with self.lock:
+            self.active_calls += 1
+            self.max_active_calls = max(self.max_active_calls, self.active_calls)
+        time.sleep(0.01)
+        with self.lock:
+            self.active_calls -= 1
+        return "THOUGHT: done\nFINAL: serial answer"
+
+
+class SessionSchedulerTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        (Path(self.tempdir.name) / "README.md").write_text("Lilbot fixture\n", encoding="utf-8")
+        self.config = LilbotConfig.from_sources(workspace_root=self.tempdir.name)
+        self.registry = build_default_tool_registry(self.config)
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def test_concurrent_sessions_share_batched_decode_steps(self) -> None:
+        queries = [f"question number {index}" for index in range(4)]
+        replies = {
+            query: f"THOUGHT: answer\nFINAL: answer {index} " + "x" * (60 + index * 20)
+            for index, query in enumerate(queries)
+        }
+        model = FakeIncrementalModel(replies)
+        sessions = [LilbotSession(user_query=query) for query in queries]
+
+        with SessionScheduler(model, self.registry, max_batch_size=4) as scheduler:
+            futures = [scheduler.submit(session) for session in sessions]
+            answers = [future.result(timeout=10) for future in futures]
+
+        for index, answer in enumerate(answers):
+            self.assertTrue(answer.startswith(f"answer {index} "))
+        self.assertGreater(max(model.batch_sizes), 1)
+        self.assertLessEqual(max(model.batch_sizes), 4)
+        self.assertEqual(len(scheduler.metrics.requests), 4)
+        self.assertGreater(scheduler.metrics.decode_steps, 0)
+        self.assertIn("queue_depth", scheduler.metrics.render())
+        self.assertGreater(sessions[0].steps[0].generated_tokens, 60)
+
+    def test_batch_size_limit_queues_extra_requests(self) -> None:
+        queries = [f"request {index}" for index in range(3)]
+        model = FakeIncrementalModel({query: "FINAL: " + "y" * 40 for query in queries})
+
+        with SessionScheduler(model, self.registry, max_batch_size=1) as scheduler:
+            futures = [scheduler.submit(LilbotSession(user_query=query)) for query in queries]
+            answers = [future.result(timeout=10) for future in futures]
+
+        self.assertEqual(answers, ["y" * 40] * 3)
+        self.assertEqual(max(model.batch_sizes), 1)
+
+    def test_models_without_incremental_decoding_are_served_one_at_a_time(self) -> None:
+        model = FakeSerialModel()
+
+        with SessionScheduler(model, self.registry, max_batch_size=4) as scheduler:
+            futures = [scheduler.submit(LilbotSession(user_query=f"q{index}")) for index in range(3)]
+            answers = [future.result(timeout=10) for future in futures]
+
+        self.assertEqual(answers, ["serial answer"] * 3)
+        self.assertEqual(model.max_active_calls, 1)
+        self.assertEqual(len(scheduler.metrics.requests), 3)
+
+    def test_decode_thread_failure_is_raised_in_waiting_sessions(self) -> None:
+        model = CrashingModel({})
+
+        with SessionScheduler(model, self.registry, max_batch_size=2) as scheduler:
+            first = scheduler.submit(LilbotSession(user_query="first"))
+            with self.assertRaises(DecodeThreadCrash):
+                first.result(timeout=10)
+            # The decode thread has exited; later requests fail instead of waiting forever.
+            second = scheduler.submit(LilbotSession(user_query="second"))
+            with self.assertRaises(DecodeThreadCrash):
+                second.result(timeout=10)
+
+    def test_submit_after_close_is_rejected(self) -> None:
+        scheduler = SessionScheduler(FakeSerialModel(), self.registry)
+        scheduler.close()
+
+        with self.assertRaises(RuntimeError):
+            scheduler.submit(LilbotSession(user_query="late"))
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+from pathlib import Path
+import tempfile
+import unittest
+
+from lilbot.memory.session import LilbotSession, SessionStep
+from lilbot.memory.store import SessionStore, StoredText
+from lilbot.prompts import rebuild_step_prompt
+
+
+def _build_session(query: str, observation: str) -> LilbotSession:
+    session = LilbotSession(user_query=query, final_answer=f"answer to {query}", total_seconds=1.5)
+    head_id = session.intern_prompt_head(f"SYSTEM\nUser request:\n{query}")
+    step = SessionStep(
+        number=1,
+        prompt_head=head_id,
+        raw_model_output="THOUGHT: look\nACTION: read_file",
+        thought="look",
+        action_name="read_file",
+        action_args={"path": "README.md"},
+        compact_observation="README.md (outline)",
+        prompt_tokens=120,
+        generated_tokens=8,
+    )
+    session.steps.append(step)
+    session.store_observation(step, observation)
+    session.steps.append(SessionStep(number=2, prompt_head=head_id, final_only=True))
+    return session
+
+
+class SessionStoreTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tempdir.name) / "nested" / "sessions.sqlite3"
+        self.store = SessionStore(self.path)
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self.tempdir.cleanup()
+
+    def test_turns_round_trip_with_lazy_observations(self) -> None:
+        chat_id = self.store.create_chat(workspace_root="/tmp/project")
+        large_observation = "line\n" * 2000
+        session = _build_session("what is in the readme?", large_observation)
+        self.store.append_turn(chat_id, user_message="what is in the readme?", session=session)
+        session.close()
+
+        loaded = self.store.load_session(chat_id, 0)
+
+        self.assertEqual(loaded.user_query, "what is in the readme?")
+        self.assertEqual(loaded.final_answer, "answer to what is in the readme?")
+        self.assertEqual(len(loaded.steps), 2)
+        first = loaded.steps[0]
+        self.assertIsInstance(first.observation_ref, StoredText)
+        self.assertEqual(first.observation_length, len(large_observation))
+        self.assertEqual(first.observation, large_observation)
+        self.assertEqual(first.action_args, {"path": "README.md"})
+        self.assertEqual(first.prompt_tokens, 120)
+        self.assertIsNone(loaded.steps[1].observation_ref)
+        self.assertIn("User request:\nwhat is in the readme?", rebuild_step_prompt(loaded, loaded.steps[1]))
+
+    def test_recent_turns_and_chat_listing(self) -> None:
+        chat_id = self.store.create_chat(workspace_root="/tmp/project")
+        for index in range(5):
+            query = f"question {index}"
+            self.store.append_turn(chat_id, user_message=query, session=_build_session(query, "ok"))
+
+        turns = self.store.recent_turns(chat_id, limit=3)
+        chats = self.store.list_chats()
+
+        self.assertEqual([turn.user_message for turn in turns], ["question 2", "question 3", "question 4"])
+        self.assertEqual(turns[-1].answer, "answer to question 4")
+        self.assertEqual(turns[-1].step_count, 2)
+        self.assertEqual(len(chats), 1)
+        self.assertEqual(chats[0].turn_count, 5)
+        self.assertEqual(chats[0].title, "question 0")
+
+    def test_memory_snapshot_is_saved_with_the_turn(self) -> None:
+        chat_id = self.store.create_chat(workspace_root="/tmp/project")
+        self.assertIsNone(self.store.load_memory(chat_id))
+
+        self.store.append_turn(
+            chat_id,
+            user_message="hello",
+            session=_build_session("hello", "hi"),
+            memory={"turn_count": 1},
+        )
+
+        self.assertEqual(self.store.load_memory(chat_id), {"turn_count": 1})
+
+    def test_find_chat_accepts_unique_prefix(self) -> None:
+        chat_id = self.store.create_chat(workspace_root="/tmp/project")
+
+        self.assertEqual(self.store.find_chat(chat_id[:5]).chat_id, chat_id)
+        self.assertIsNone(self.store.find_chat("zzzz-not-there"))
+
+    def test_store_reopens_existing_file(self) -> None:
+        chat_id = self.store.create_chat(workspace_root="/tmp/project")
+        self.store.append_turn(chat_id, user_message="hello", session=_build_session("hello", "hi"))
+        self.store.close()
+
+        self.store = SessionStore(self.path)
+
+        self.assertEqual(self.store.recent_turns(chat_id, limit=10)[0].user_message, "hello")
+        self.assertEqual(self.store.load_session(chat_id, 0).steps[0].observation, "hi")
+
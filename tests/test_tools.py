@@ -1,11 +1,25 @@
 from __future__ import annotations
 
+from dataclasses import replace
+import os
 from pathlib import Path
+import shutil
+import subprocess
 import tempfile
+import threading
 import unittest
+from unittest.mock import patch
 
 from lilbot.config import LilbotConfig
 from lilbot.tools import build_default_tool_registry
+from lilbot.tools.filesystem import (
+    MMAP_MIN_BYTES,
+    find_in_file,
+    is_probably_text,
+    iter_workspace_files,
+    list_workspace_files,
+)
+from lilbot.tools.repo import MAIN_GUARD_PATTERN, is_likely_entrypoint
 
 
 class ToolRegistryTests(unittest.TestCase):
@@ -23,7 +37,10 @@ class ToolRegistryTests(unittest.TestCase):
             "INFO boot\nWARNING disk nearly full\nERROR worker failed\n",
             encoding="utf-8",
         )
-        self.config = LilbotConfig.from_sources(workspace_root=self.tempdir.name)
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        with patch.dict(os.environ, {"LILBOT_CACHE_DIR": cache_dir.name}):
+            self.config = LilbotConfig.from_sources(workspace_root=self.tempdir.name)
         self.registry = build_default_tool_registry(self.config)
 
     def tearDown(self) -> None:
@@ -44,3 +61,397 @@ class ToolRegistryTests(unittest.TestCase):
         self.assertIn("likely_entrypoints", summary)
         self.assertIn("pkg/service.py:1", trace)
         self.assertIn("errors: 1", log_summary)
+
+    def test_summarize_repo_rebuilds_only_changed_directories(self) -> None:
+        from lilbot.retrieval.summaries import SummaryCache
+
+        (self.workspace / "pkg" / "util").mkdir()
+        (self.workspace / "pkg" / "util" / "text.py").write_text("WIDTH = 80\n", encoding="utf-8")
+        (self.workspace / "docs").mkdir()
+        (self.workspace / "docs" / "guide.md").write_text("Guide\n", encoding="utf-8")
+
+        with SummaryCache.for_workspace(self.config) as cache:
+            first = cache.summarize(self.config, self.workspace)
+            unchanged = cache.summarize(self.config, self.workspace)
+            (self.workspace / "pkg" / "service.py").write_text(
+                "if __name__ == '__main__':\n    print('serve')\n",
+                encoding="utf-8",
+            )
+            changed = cache.summarize(self.config, self.workspace)
+            scoped = cache.summarize(self.config, self.workspace / "pkg")
+
+        self.assertEqual(set(first.rebuilt), {"", "pkg", "pkg/util", "docs"})
+        self.assertEqual(unchanged.rebuilt, ())
+        self.assertEqual(changed.rebuilt, ("pkg", ""))
+        self.assertEqual(scoped.rebuilt, ())
+        self.assertEqual(scoped.digest.entrypoints, ("service.py",))
+        self.assertEqual(changed.digest.files, 6)
+
+        summary = self.registry.execute("summarize_repo", {"path": "."})
+        self.assertIn("- scanned_files: 6", summary)
+        self.assertIn("  cli.py\n  pkg/service.py", summary)
+        self.assertIn("  README.md: Lilbot fixture", summary)
+        self.assertIn("pkg/util (1)", summary)
+        self.assertTrue(self.registry.run("summarize_repo", {"path": "."}).cache_hit)
+        self.assertFalse(self.registry.run("list_directory", {"path": "."}).cache_hit)
+
+    def test_find_function_reports_class_qualified_and_heuristic_definitions(self) -> None:
+        (self.workspace / "pkg" / "models.py").write_text(
+            "class Session:\n    async def authenticate_user(self):\n        return True\n",
+            encoding="utf-8",
+        )
+        (self.workspace / "web.js").write_text(
+            "function authenticate_user(name) {\n  return !!name;\n}\n",
+            encoding="utf-8",
+        )
+        (self.workspace / "blob.dat").write_bytes(b"\x00authenticate_user")
+
+        trace = self.registry.execute("find_function", {"name": "authenticate_user", "path": "."})
+
+        self.assertIn("pkg/models.py:2 async definition Session.authenticate_user", trace)
+        self.assertIn("web.js:1 heuristic definition", trace)
+        self.assertNotIn("blob.dat", trace)
+
+    def test_find_function_uses_symbol_index_beyond_file_limit(self) -> None:
+        for index in range(8):
+            (self.workspace / f"caller_{index}.py").write_text(
+                "from pkg.service import authenticate_user\n",
+                encoding="utf-8",
+            )
+        registry = build_default_tool_registry(replace(self.config, repo_file_limit=2, repo_reference_limit=3))
+
+        trace = registry.execute("find_function", {"name": "authenticate_user", "path": "."})
+        scoped = registry.execute("find_function", {"name": "authenticate_user", "path": "pkg"})
+
+        self.assertIn("pkg/service.py:1 definition authenticate_user", trace)
+        self.assertIn("caller_0.py:1 from pkg.service import authenticate_user", trace)
+        self.assertIn("... (6 more lines in 9 files)", trace)
+        self.assertIn("service.py:1 definition authenticate_user", scoped)
+        self.assertNotIn("caller_0.py", scoped)
+
+    def test_parallel_function_scan_matches_serial_order(self) -> None:
+        from lilbot.tools import function_scan
+
+        for index in range(12):
+            (self.workspace / f"caller_{index:02d}.py").write_text(
+                f"from pkg.service import authenticate_user\n\nauthenticate_user('{index}')\n",
+                encoding="utf-8",
+            )
+        files = [
+            (path, path.relative_to(self.workspace).as_posix())
+            for path in sorted(self.workspace.rglob("*"))
+            if path.is_file()
+        ]
+
+        serial = list(function_scan.scan_files(files, "authenticate_user", workers=1))
+        with patch.object(function_scan, "PARALLEL_SCAN_MIN_FILES", 1), patch.object(
+            function_scan, "SCAN_BATCH_FILES", 3
+        ):
+            parallel = list(function_scan.scan_files(files, "authenticate_user", workers=2))
+
+        self.assertEqual(len(serial), 13)
+        self.assertEqual(parallel, serial)
+
+    def test_read_source_probes_large_files_through_one_open(self) -> None:
+        from lilbot.tools import function_scan
+
+        large = self.workspace / "tables.py"
+        large.write_bytes(b"x = 1\n" * (MMAP_MIN_BYTES // 6 + 10) + b"def authenticate_user():\n    pass\n")
+
+        with patch.object(Path, "open", autospec=True, side_effect=Path.open) as opened:
+            self.assertIsNone(function_scan.read_source(large, must_contain="missing_name"))
+            text = function_scan.read_source(large, must_contain="authenticate_user")
+
+        self.assertTrue(text.endswith("def authenticate_user():\n    pass\n"))
+        self.assertEqual(opened.call_count, 2)
+
+    def test_grep_workspace_filters_globs_skips_binaries_and_stops_at_limit(self) -> None:
+        (self.workspace / "pkg" / "store.py").write_text(
+            "TOKEN = 'a'  # token here\nother = TOKEN\n",
+            encoding="utf-8",
+        )
+        (self.workspace / "blob.dat").write_bytes(b"\x00\x01TOKEN\n")
+        (self.workspace / "notes.txt").write_text(
+            "x" * MMAP_MIN_BYTES + "\nlast TOKEN line\n",
+            encoding="utf-8",
+        )
+
+        everything = self.registry.execute("grep_workspace", {"pattern": r"TOKEN\b"})
+        python_only = self.registry.execute("grep_workspace", {"pattern": "(?i)token", "glob": "*.py"})
+        limited = self.registry.execute("grep_workspace", {"pattern": "TOKEN", "limit": 1})
+
+        self.assertIn("Matches for `TOKEN\\b` under .:", everything)
+        self.assertIn("  notes.txt:2 last TOKEN line", everything)
+        self.assertIn("  pkg/store.py:1 TOKEN = 'a'  # token here", everything)
+        self.assertIn("  pkg/store.py:2 other = TOKEN", everything)
+        self.assertNotIn("blob.dat", everything)
+        self.assertNotIn("notes.txt", python_only)
+        self.assertEqual(python_only.count("pkg/store.py:"), 2)
+        self.assertIn("  ... (stopped after 1 matches)", limited)
+        self.assertIn("Invalid pattern:", self.registry.execute("grep_workspace", {"pattern": "(["}))
+        self.assertIn("- matches: none found", self.registry.execute("grep_workspace", {"pattern": "absent"}))
+
+    def test_parallel_grep_matches_serial_order(self) -> None:
+        from lilbot.tools import grep
+
+        for index in range(12):
+            (self.workspace / f"caller_{index:02d}.py").write_text(
+                f"import pkg\n\npkg.authenticate_user('{index}')\n",
+                encoding="utf-8",
+            )
+        files = [
+            (str(path), path.relative_to(self.workspace).as_posix())
+            for path in sorted(self.workspace.rglob("*"))
+            if path.is_file()
+        ]
+        pattern = grep.compile_grep_pattern(r"authenticate_user\(")
+
+        serial = list(grep.grep_files(files, pattern, limit=50, workers=1))
+        with patch.object(grep, "PARALLEL_SCAN_MIN_FILES", 1), patch.object(grep, "SCAN_BATCH_FILES", 3):
+            parallel = list(grep.grep_files(files, pattern, limit=50, workers=2))
+            first = list(grep.grep_files(files, pattern, limit=4, workers=2))
+
+        self.assertEqual(len(serial), 13)
+        self.assertEqual(parallel, serial)
+        self.assertEqual(first[:4], serial[:4])
+
+    def test_read_file_compact_rendering_keeps_outline(self) -> None:
+        body = "\n".join(
+            ["import os", "", "class Service:", "    def run(self):", "        pass"]
+            + [f"VALUE_{index} = {index}" for index in range(40)]
+        )
+        (self.workspace / "big.py").write_text(body + "\n", encoding="utf-8")
+        observation = self.registry.execute("read_file", {"path": "big.py"})
+
+        compacted = self.registry.compact("read_file", observation)
+
+        self.assertIsNotNone(compacted)
+        self.assertLess(len(compacted), len(observation))
+        self.assertIn("3: class Service:", compacted)
+        self.assertIn("4: def run(self):", compacted)
+        self.assertNotIn("VALUE_30", compacted)
+
+    def test_read_file_seeks_line_and_byte_ranges(self) -> None:
+        target = self.workspace / "numbers.py"
+        target.write_text(
+            "".join(
+                f"def line_{number:05d}():\n" if number % 10 == 0 else f"    value = {number:05d}  # padding\n"
+                for number in range(1, 3001)
+            ),
+            encoding="utf-8",
+        )
+        self.assertGreater(target.stat().st_size, 64 * 1024)
+
+        middle = self.registry.execute("read_file", {"path": "numbers.py", "start_line": 2500, "end_line": 2501})
+        last = self.registry.execute("read_file", {"path": "numbers.py", "start_line": "-1"})
+        head = self.registry.execute("read_file", {"path": "numbers.py", "start_line": 1})
+        tail_bytes = self.registry.execute("read_file", {"path": "numbers.py", "offset": -22})
+
+        self.assertEqual(
+            middle,
+            "Lines 2500-2501 of 3000 in ./numbers.py:\n"
+            "def line_02500():\n    value = 02501  # padding",
+        )
+        self.assertIn("Lines 3000-3000 of 3000 in ./numbers.py:\ndef line_03000():", last)
+        self.assertIn("... (truncated; continue with start_line=", head)
+        self.assertTrue(tail_bytes.startswith("Bytes "))
+        self.assertTrue(tail_bytes.endswith("ing\ndef line_03000():\n"))
+        self.assertIn("2000: def line_02000():", self.registry.compact(
+            "read_file",
+            self.registry.execute("read_file", {"path": "numbers.py", "start_line": 1990, "end_line": 2030}),
+        ))
+        self.assertIn("not both", self.registry.execute("read_file", {"path": "numbers.py", "start_line": 1, "offset": 0}))
+
+        with target.open("a", encoding="utf-8") as handle:
+            handle.write("appended\n")
+        os.utime(target, ns=(1, 1))
+        self.assertIn("Lines 3001-3001 of 3001", self.registry.execute("read_file", {"path": "numbers.py", "start_line": -1}))
+
+    def test_read_file_line_range_across_a_line_index_block_boundary(self) -> None:
+        target = self.workspace / "fixed.txt"
+        target.write_text("".join(f"{number:05d}".ljust(99, ".") + "\n" for number in range(1, 1001)), encoding="utf-8")
+
+        # Line 656 spans bytes 65500-65599, across the 64 KiB boundary at 65536.
+        result = self.registry.execute("read_file", {"path": "fixed.txt", "start_line": 656, "end_line": 657})
+
+        self.assertEqual(
+            result,
+            "Lines 656-657 of 1000 in ./fixed.txt:\n" + "00656".ljust(99, ".") + "\n" + "00657".ljust(99, "."),
+        )
+
+    def test_read_file_continues_a_truncated_long_line_by_byte_offset(self) -> None:
+        limit = self.config.file_preview_chars
+        target = self.workspace / "minified.js"
+        target.write_text("short\n" + "a" * (limit + 50) + "b\nnext\n", encoding="utf-8")
+
+        head = self.registry.execute("read_file", {"path": "minified.js", "start_line": 2})
+        rest = self.registry.execute("read_file", {"path": "minified.js", "offset": 6 + limit})
+
+        self.assertEqual(
+            head,
+            f"Lines 2-2 of 3 in ./minified.js:\n{'a' * limit}\n... (truncated; continue with offset={6 + limit})",
+        )
+        self.assertTrue(rest.endswith(f"\n{'a' * 50}b\nnext\n"))
+
+    def test_compact_returns_none_for_short_observations(self) -> None:
+        observation = self.registry.execute("read_file", {"path": "README.md"})
+
+        self.assertIsNone(self.registry.compact("read_file", observation))
+
+
+class WorkspaceEnumerationTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.workspace = Path(self.tempdir.name) / "workspace"
+        (self.workspace / "src").mkdir(parents=True)
+        (self.workspace / "generated").mkdir()
+        (self.workspace / "src" / "app.py").write_text("print('app')\n", encoding="utf-8")
+        (self.workspace / "src" / "scratch.tmp").write_text("scratch\n", encoding="utf-8")
+        (self.workspace / "src" / "keep.tmp").write_text("keep\n", encoding="utf-8")
+        (self.workspace / "generated" / "out.py").write_text("x = 1\n", encoding="utf-8")
+        (self.workspace / "README.md").write_text("Fixture\n", encoding="utf-8")
+        (self.workspace / ".gitignore").write_text("generated/\n*.tmp\n!keep.tmp\n", encoding="utf-8")
+        self.config = LilbotConfig.from_sources(workspace_root=str(self.workspace))
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def listed(self, root: Path | None = None) -> list[str]:
+        root = root or self.workspace
+        return [path.relative_to(root).as_posix() for path in iter_workspace_files(self.config, root)]
+
+    def test_walker_applies_gitignore_files_outside_git(self) -> None:
+        (self.workspace / "src" / ".gitignore").write_text("/app.py\n", encoding="utf-8")
+
+        self.assertEqual(self.listed(), [".gitignore", "README.md", "src/.gitignore", "src/keep.tmp"])
+        self.assertEqual(self.listed(self.workspace / "src"), [".gitignore", "keep.tmp"])
+
+    def test_iteration_stops_walking_at_the_limit(self) -> None:
+        from lilbot.tools import filesystem
+
+        for index in range(5):
+            (self.workspace / f"pkg{index}").mkdir()
+            (self.workspace / f"pkg{index}" / "mod.py").write_text("x = 1\n", encoding="utf-8")
+
+        with patch.object(filesystem, "_scan_directory", wraps=filesystem._scan_directory) as scanned:
+            first = [
+                path.relative_to(self.workspace).as_posix()
+                for path in iter_workspace_files(self.config, self.workspace, limit=3)
+            ]
+
+        self.assertEqual(first, [".gitignore", "README.md", "pkg0/mod.py"])
+        self.assertEqual(scanned.call_count, 2)
+        self.assertEqual(self.listed(), [item.relative for item in list_workspace_files(self.config, self.workspace).files])
+
+    def test_listing_records_stat_data_and_samples_past_the_limit(self) -> None:
+        for index in range(30):
+            directory = self.workspace / f"pkg{index % 3}"
+            directory.mkdir(exist_ok=True)
+            (directory / f"mod{index:02d}.py").write_text("x = 1\n", encoding="utf-8")
+
+        listing = list_workspace_files(self.config, self.workspace)
+        readme = next(item for item in listing.files if item.relative == "README.md")
+        first = list_workspace_files(self.config, self.workspace, limit=6)
+        sampled = list_workspace_files(self.config, self.workspace, limit=6, sample=True)
+
+        self.assertEqual(listing.total, 34)
+        self.assertEqual((readme.size, readme.is_text), (8, True))
+        self.assertEqual(readme.mtime_ns, (self.workspace / "README.md").stat().st_mtime_ns)
+        self.assertEqual([item.relative for item in first.files][:3], [".gitignore", "README.md", "pkg0/mod00.py"])
+        self.assertFalse(first.sampled)
+        self.assertTrue(sampled.sampled)
+        self.assertEqual(len(sampled.files), 6)
+        self.assertEqual(sampled, list_workspace_files(self.config, self.workspace, limit=6, sample=True))
+        self.assertGreater(len({item.relative.split("/")[0] for item in sampled.files}), 1)
+
+    def test_find_in_file_searches_small_and_mapped_files_within_limit(self) -> None:
+        small = self.workspace / "src" / "app.py"
+        large = self.workspace / "src" / "tables.py"
+        guard = b"if __name__ == '__main__':\n    run()\n"
+        large.write_bytes(b"x = 1\n" * (MMAP_MIN_BYTES // 6 + 10) + guard)
+        blob = self.workspace / "src" / "blob.dat"
+        blob.write_bytes(b"header" + b"\x00" * 8)
+
+        self.assertEqual(find_in_file(small, b"app"), 7)
+        self.assertEqual(find_in_file(small, b"app", limit=8), -1)
+        self.assertEqual(find_in_file(large, MAIN_GUARD_PATTERN), large.stat().st_size - len(guard))
+        self.assertEqual(find_in_file(large, b"__main__", limit=MMAP_MIN_BYTES), -1)
+        self.assertTrue(is_likely_entrypoint(large))
+        self.assertFalse(is_likely_entrypoint(self.workspace / "generated" / "out.py"))
+        self.assertFalse(is_probably_text(blob))
+        with self.assertRaises(OSError):
+            find_in_file(self.workspace / "missing.py", b"x")
+
+    @unittest.skipUnless(shutil.which("git"), "git is not installed")
+    def test_git_work_trees_are_listed_by_git_in_walk_order(self) -> None:
+        subprocess.run(["git", "init", "-q", str(self.workspace)], check=True)
+        subprocess.run(["git", "-C", str(self.workspace), "add", "."], check=True)
+        (self.workspace / "README.md").unlink()
+        (self.workspace / "notes.txt").write_text("untracked\n", encoding="utf-8")
+
+        with patch("lilbot.tools.filesystem._walk_relative_paths") as walk:
+            listed = self.listed()
+
+        walk.assert_not_called()
+        self.assertEqual(listed, [".gitignore", "notes.txt", "src/app.py", "src/keep.tmp"])
+
+
+class SearchRepoToolTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.workspace = Path(self.tempdir.name) / "workspace"
+        (self.workspace / "pkg").mkdir(parents=True)
+        (self.workspace / "pkg" / "auth.py").write_text(
+            "import os\n\n\ndef authenticate_user(name):\n    return name == os.getenv('ADMIN')\n",
+            encoding="utf-8",
+        )
+        (self.workspace / "docs").mkdir()
+        (self.workspace / "docs" / "sessions.md").write_text(
+            "# Sessions\n\nSession tokens expire after an hour.\n",
+            encoding="utf-8",
+        )
+        with patch.dict(os.environ, {"LILBOT_CACHE_DIR": str(Path(self.tempdir.name) / "cache")}):
+            self.config = LilbotConfig.from_sources(workspace_root=str(self.workspace))
+        self.registry = build_default_tool_registry(self.config)
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def test_search_builds_index_lazily_and_returns_line_ranges(self) -> None:
+        self.assertFalse(self.config.index_dir.exists())
+
+        result = self.registry.execute("search_repo", {"query": "authenticate user"})
+
+        self.assertTrue(self.config.index_dir.exists())
+        self.assertIn("Search results for `authenticate user` under .:", result)
+        self.assertIn("./pkg/auth.py:4-5 (function authenticate_user)", result)
+        self.assertIn("    4: def authenticate_user(name):", result)
+
+    def test_search_can_be_scoped_to_a_directory(self) -> None:
+        scoped = self.registry.execute("search_repo", {"query": "session tokens", "path": "pkg"})
+        unscoped = self.registry.execute("search_repo", {"query": "session tokens"})
+
+        self.assertIn("- matches: none found", scoped)
+        self.assertIn("./docs/sessions.md:1-3", unscoped)
+
+    def test_search_works_from_several_threads(self) -> None:
+        results = [self.registry.execute("search_repo", {"query": "authenticate_user"})]
+        # The scheduler shares one registry across its session threads.
+        worker = threading.Thread(
+            target=lambda: results.append(self.registry.execute("search_repo", {"query": "authenticate_user"}))
+        )
+        worker.start()
+        worker.join()
+
+        self.assertEqual(len(results), 2)
+        self.assertIn("./pkg/auth.py:4-5", results[1])
+        self.assertNotIn("Search error", results[1])
+
+    def test_search_compact_rendering_drops_snippets(self) -> None:
+        tool = self.registry.get("search_repo")
+        result = self.registry.execute("search_repo", {"query": "authenticate_user"})
+
+        compacted = tool.compact(result)
+
+        self.assertIn("./pkg/auth.py:4-5", compacted)
+        self.assertNotIn("def authenticate_user", compacted)